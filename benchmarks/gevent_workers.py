@@ -0,0 +1,113 @@
+"""
+Sync versus gevent gunicorn workers under many concurrent clients, with a share of slow requests
+(streamed full listings) mixed into short reads and writes.
+
+    python -m benchmarks.gevent_workers [--workers 2] [--clients 200] [--seconds 10]
+        [--write-ratio 0.2] [--slow-ratio 0.05] [--worker-connections 1000] [--threadpool-size 10]
+
+Each worker class runs gunicorn_config.py against its own copy of core/store.sqlite3. With sync
+workers a client waits for a free worker; with gevent every connection is accepted and sqlite3
+calls queue on the worker's thread pool instead (see core/libs/cooperative.py).
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.storage_profiles import STUDENT, copy_database, summarize, wait_until_ready
+
+WORKER_CLASSES = ('sync', 'gevent')
+
+
+def next_request(rng, write_ratio, slow_ratio):
+    draw = rng.random()
+    if draw < slow_ratio:
+        return 'GET', '/student/assignments?stream=true', None
+    if draw < slow_ratio + write_ratio:
+        return 'POST', '/student/assignments', {'content': 'benchmark draft'}
+    return 'GET', '/student/assignments?limit=20', None
+
+
+def http_client(base_url, seed, deadline, args, latencies, errors, lock):
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        method, path, payload = next_request(rng, args.write_ratio, args.slow_ratio)
+        data = None if payload is None else json.dumps(payload).encode('utf8')
+        request = urllib.request.Request(base_url + path, data=data, method=method, headers={
+            'X-Principal': STUDENT, 'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        try:
+            urllib.request.urlopen(request, timeout=30).read()
+            elapsed, failed = time.perf_counter() - start, False
+        except (urllib.error.URLError, OSError):
+            elapsed, failed = None, True
+        with lock:
+            if failed:
+                errors.append(1)
+            else:
+                latencies.append(elapsed)
+
+
+def run(worker_class, database_url, args):
+    env = dict(os.environ, GUNICORN_WORKER_CLASS=worker_class, GUNICORN_PORT=str(args.port),
+               GUNICORN_NUMBER_WORKERS=str(args.workers), GUNICORN_NUMBER_WORKER_CONNECTIONS=str(args.worker_connections),
+               GUNICORN_BACKLOG=str(max(args.clients, 50)), GUNICORN_LOG_LEVEL='warning',
+               DB_THREADPOOL_SIZE=str(args.threadpool_size), DATABASE_URL=database_url)
+    server = subprocess.Popen(['gunicorn', '-c', 'gunicorn_config.py', 'core.server:app'],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = 'http://127.0.0.1:{0}'.format(args.port)
+    try:
+        wait_until_ready(base_url)
+        latencies, errors, lock = [], [], threading.Lock()
+        deadline = time.perf_counter() + args.seconds
+        clients = [
+            threading.Thread(target=http_client, args=(base_url, seed, deadline, args, latencies, errors, lock))
+            for seed in range(args.clients)
+        ]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        return summarize(latencies, len(errors), args.seconds)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--worker-classes', default=','.join(WORKER_CLASSES))
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--slow-ratio', type=float, default=0.05)
+    parser.add_argument('--worker-connections', type=int, default=1000)
+    parser.add_argument('--threadpool-size', type=int, default=10)
+    parser.add_argument('--port', type=int, default=7799)
+    args = parser.parse_args(argv)
+
+    if shutil.which('gunicorn') is None:
+        raise SystemExit('gunicorn is not installed')
+
+    directory = tempfile.mkdtemp(prefix='gevent-workers-')
+    print('{0:<8} {1:>10} {2:>8} {3:>10} {4:>10}'.format('worker', 'req/s', 'errors', 'p50 ms', 'p99 ms'))
+    try:
+        for worker_class in args.worker_classes.split(','):
+            result = run(worker_class, 'sqlite:///' + copy_database(directory), args)
+            print('{0:<8} {1:>10.1f} {2:>8} {3:>10.2f} {4:>10.2f}'.format(
+                worker_class, result['throughput'], result['errors'], result['p50_ms'] or 0, result['p99_ms'] or 0))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
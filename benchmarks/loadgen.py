@@ -0,0 +1,253 @@
+"""
+Scenario-based load generator: virtual users play students, teachers and principals against the
+routes in core/apis/assignments/ and per-endpoint throughput, error rate and latency percentiles
+are written out as JSON.
+
+    python -m benchmarks.loadgen [--target test_client|gunicorn] [--users 16] [--seconds 30]
+        [--mix student=5,teacher=3,principal=2] [--workers 4] [--output report.json]
+
+Every run works on a copy of core/store.sqlite3. Identities are the students, teachers and
+principals found in it. `test_client` runs the app in this process, one thread per virtual user;
+`gunicorn` starts gunicorn_config.py and drives it over HTTP.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+from benchmarks.storage_profiles import copy_database, wait_until_ready
+
+DEFAULT_MIX = 'student=5,teacher=3,principal=2'
+GRADES = ('A', 'B', 'C', 'D')
+
+
+class TestClientTarget:
+    def __init__(self):
+        # imported late: DATABASE_URL has to point at the copy first
+        from core.server import app
+        self.app = app
+
+    def session(self):
+        return self.app.test_client()
+
+    def request(self, session, method, path, payload, headers):
+        response = session.open(path, method=method, json=payload, headers=headers)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpTarget:
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def session(self):
+        return None
+
+    def request(self, session, method, path, payload, headers):
+        data = None if payload is None else json.dumps(payload).encode('utf8')
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers=dict(headers, **{'Content-Type': 'application/json'}))
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, json.loads(response.read() or b'null')
+        except urllib.error.HTTPError as err:
+            return err.code, None
+
+
+def load_identities(path):
+    """X-Principal headers of every student, teacher and principal in the database"""
+    connection = sqlite3.connect(path)
+    try:
+        return {
+            role: [json.dumps({'user_id': user_id, '{0}_id'.format(role): _id}) for _id, user_id in
+                   connection.execute('SELECT id, user_id FROM {0}s ORDER BY id'.format(role))]
+            for role in ('student', 'teacher', 'principal')
+        }
+    finally:
+        connection.close()
+
+
+class VirtualUser:
+    """One simulated client: runs scenarios back to back, recording every request under its route"""
+
+    def __init__(self, target, identities, rng, record):
+        self.target = target
+        self.session = target.session()
+        self.identities = identities
+        self.rng = rng
+        self.record = record
+
+    def call(self, endpoint, method, path, principal, payload=None):
+        start = time.perf_counter()
+        try:
+            status, body = self.target.request(self.session, method, path, payload, {'X-Principal': principal})
+        except OSError:
+            status, body = None, None
+        self.record(endpoint, time.perf_counter() - start, status)
+        return (body or {}).get('data') if status == 200 else None
+
+    def student(self):
+        principal = self.rng.choice(self.identities['student'])
+        self.call('GET /student/assignments', 'GET', '/student/assignments?limit=20', principal)
+        draft = self.call('POST /student/assignments', 'POST', '/student/assignments', principal,
+                          {'content': 'essay {0}'.format(self.rng.randrange(10 ** 6))})
+        if draft and self.rng.random() < 0.5:
+            draft = self.call('POST /student/assignments', 'POST', '/student/assignments', principal,
+                              {'id': draft['id'], 'content': draft['content'] + ', revised'})
+        if draft and self.identities['teacher']:
+            teacher_id = json.loads(self.rng.choice(self.identities['teacher']))['teacher_id']
+            self.call('POST /student/assignments/submit', 'POST', '/student/assignments/submit', principal,
+                      {'id': draft['id'], 'teacher_id': teacher_id})
+
+    def teacher(self):
+        principal = self.rng.choice(self.identities['teacher'])
+        assignments = self.call('GET /teacher/assignments', 'GET', '/teacher/assignments?limit=50', principal) or []
+        submitted = [assignment for assignment in assignments if assignment['state'] == 'SUBMITTED']
+        if submitted:
+            self.call('POST /teacher/assignments/grade', 'POST', '/teacher/assignments/grade', principal,
+                      {'id': self.rng.choice(submitted)['id'], 'grade': self.rng.choice(GRADES)})
+
+    def principal(self):
+        principal = self.rng.choice(self.identities['principal'])
+        assignments = self.call('GET /principal/assignments', 'GET', '/principal/assignments?limit=50',
+                                principal) or []
+        if self.rng.random() < 0.2:
+            self.call('GET /principal/teachers', 'GET', '/principal/teachers', principal)
+        graded = [assignment for assignment in assignments if assignment['state'] == 'GRADED']
+        if graded:
+            assignment_id = self.rng.choice(graded)['id']
+            self.call('PUT /principal/assignments/<id>/regrade', 'PUT',
+                      '/principal/assignments/{0}/regrade'.format(assignment_id), principal,
+                      {'id': assignment_id, 'grade': self.rng.choice(GRADES)})
+
+    def run(self, mix, deadline):
+        scenarios, weights = zip(*mix.items())
+        while time.perf_counter() < deadline:
+            getattr(self, self.rng.choices(scenarios, weights)[0])()
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('student', 'teacher', 'principal') or not weight.isdigit():
+            raise argparse.ArgumentTypeError('expected e.g. {0}, got {1!r}'.format(DEFAULT_MIX, part))
+        mix[name] = int(weight)
+    return {name: weight for name, weight in mix.items() if weight}
+
+
+def percentile(ordered, fraction):
+    # nearest rank
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def summarize(samples, seconds):
+    latencies = sorted(latency for latency, _ in samples)
+    errors = sum(1 for _, status in samples if status is None or status >= 500)
+    rejected = sum(1 for _, status in samples if status is not None and 400 <= status < 500)
+    return {
+        'requests': len(samples),
+        'throughput': len(samples) / seconds,
+        'errors': errors,
+        'error_rate': errors / len(samples),
+        # 4xx: e.g. an assignment someone else graded first; expected at some rate under concurrency
+        'rejected': rejected,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': latencies[-1] * 1000,
+    }
+
+
+def drive(target, identities, args):
+    samples, lock = defaultdict(list), threading.Lock()
+
+    def record(endpoint, latency, status):
+        with lock:
+            samples[endpoint].append((latency, status))
+
+    deadline = time.perf_counter() + args.seconds
+    users = [
+        threading.Thread(target=VirtualUser(target, identities, random.Random(args.seed + index), record).run,
+                         args=(args.mix, deadline))
+        for index in range(args.users)
+    ]
+    started = time.perf_counter()
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'target': args.target,
+        'users': args.users,
+        'seconds': elapsed,
+        'mix': args.mix,
+        'total': summarize([sample for endpoint in samples.values() for sample in endpoint], elapsed),
+        'endpoints': {endpoint: summarize(samples[endpoint], elapsed) for endpoint in sorted(samples)},
+    }
+
+
+def run_gunicorn(identities, database_url, args):
+    if shutil.which('gunicorn') is None:
+        raise SystemExit('gunicorn is not installed, use --target test_client')
+
+    env = dict(os.environ, GUNICORN_PORT=str(args.port), GUNICORN_NUMBER_WORKERS=str(args.workers),
+               GUNICORN_LOG_LEVEL='warning', DATABASE_URL=database_url)
+    server = subprocess.Popen(['gunicorn', '-c', 'gunicorn_config.py', 'core.server:app'],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = 'http://127.0.0.1:{0}'.format(args.port)
+    try:
+        wait_until_ready(base_url)
+        return drive(HttpTarget(base_url), identities, args)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--target', choices=('test_client', 'gunicorn'), default='test_client')
+    parser.add_argument('--users', type=int, default=16, help='concurrent virtual users')
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help='relative weights of the scenarios, default {0}'.format(DEFAULT_MIX))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers')
+    parser.add_argument('--port', type=int, default=7799)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix='loadgen-')
+    try:
+        database_path = copy_database(directory)
+        identities = load_identities(database_path)
+        database_url = 'sqlite:///' + database_path
+        if args.target == 'gunicorn':
+            report = run_gunicorn(identities, database_url, args)
+        else:
+            os.environ['DATABASE_URL'] = database_url
+            report = drive(TestClientTarget(), identities, args)
+    finally:
+        shutil.rmtree(directory)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as fo:
+            fo.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
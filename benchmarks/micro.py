@@ -0,0 +1,302 @@
+"""
+Microbenchmarks of the building blocks on the request path, with baselines kept in the repo.
+
+    python -m benchmarks.micro run [--sizes 10000,100000,1000000] [--filter queries.] [--output results.json]
+    python -m benchmarks.micro run --save-baseline
+    python -m benchmarks.micro compare [--baseline benchmarks/baselines.json] results.json [--threshold 0.15]
+
+Every case is warmed up, then timed over `--rounds` rounds of enough calls to last `--min-time`
+seconds. Comparisons use the fastest round, the least disturbed by everything else the machine
+does; median and spread are recorded for context. Query cases run against a scratch
+database migrated from core/migrations/ and grown to each of `--sizes` assignments in turn.
+`compare` exits with 1 when a case got slower than the baseline by more than the threshold.
+Baselines are only comparable on the machine that recorded them: re-record after hardware changes.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+DEFAULT_SIZES = (10000, 100000, 1000000)
+DEFAULT_THRESHOLD = 0.15
+
+STUDENTS = 200
+TEACHERS = 20
+STUDENT = json.dumps({'student_id': 1, 'user_id': 1})
+PAGE_ROWS = 100
+
+
+def create_database(path):
+    """Migrated scratch database; core is imported here, once DATABASE_URL points at it"""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    from flask_migrate import upgrade
+    from core import create_app
+
+    app = create_app(migrations=True)
+
+    with app.app_context():
+        upgrade(directory=os.path.join(app.root_path, 'migrations'))
+    return app
+
+
+def grow_assignments(app, path, total):
+    """Adds assignments with `flask seed`'s generator until there are `total`"""
+    from core import db
+    from core.libs import seeding
+
+    connection = sqlite3.connect(path)
+    students, existing = connection.execute(
+        'SELECT (SELECT count(*) FROM students), (SELECT count(*) FROM assignments)').fetchone()
+    with app.app_context():
+        seeding.seed(db.engine, total - existing, students=max(STUDENTS - students, 0),
+                     teachers=TEACHERS if students < STUDENTS else 0, seed=total)
+    connection.execute('ANALYZE')
+    connection.close()
+
+
+def core_cases(app):
+    """name -> (setup returning the callable to time, teardown or None)"""
+    from marshmallow import ValidationError
+    from werkzeug.exceptions import NotFound
+
+    from core.apis import decorators
+    from core.apis.assignments.schema import AssignmentSchema, assignment_serializer
+    from core.apis.responses import APIResponse
+    from core.libs.exceptions import FyleError
+    from core.models.assignments import Assignment
+    from core.apis.system import handle_error
+
+    from benchmarks.serializers import make_assignments
+
+    assignments = make_assignments(PAGE_ROWS)
+    rows = assignment_serializer.dump(assignments, many=True)
+
+    def request_context(func):
+        def setup():
+            context = app.test_request_context('/student/assignments', headers={'X-Principal': STUDENT})
+            context.push()
+            return func, context.pop
+        return setup
+
+    authenticated = decorators.authenticate_principal(lambda p: p)
+
+    def uncached():
+        decorators.principal_cache.clear()
+        return authenticated()
+
+    def handle(err):
+        return lambda: handle_error(err)
+
+    return {
+        'auth.authenticate_principal.cached': request_context(authenticated),
+        'auth.authenticate_principal.uncached': request_context(uncached),
+        'schema.AssignmentSchema.load': lambda: (
+            lambda: AssignmentSchema().load({'id': 1, 'content': 'essay'}), None),
+        'schema.AssignmentSchema.dump': lambda: (lambda: AssignmentSchema().dump(assignments[0]), None),
+        'schema.AssignmentSchema.dump_page': lambda: (
+            lambda: AssignmentSchema().dump(assignments, many=True), None),
+        'schema.assignment_serializer.dump_page': lambda: (
+            lambda: assignment_serializer.dump(assignments, many=True), None),
+        'responses.APIResponse.respond_page': request_context(lambda: APIResponse.respond(data=rows)),
+        'server.handle_error.FyleError': request_context(handle(FyleError(404, 'No assignment with this id'))),
+        'server.handle_error.ValidationError': request_context(
+            handle(ValidationError({'content': ['Missing data for required field.']}))),
+        'server.handle_error.HTTPException': request_context(handle(NotFound())),
+        'models.Assignment.build': lambda: (lambda: Assignment(student_id=1, content='essay'), None),
+    }
+
+
+def query_cases(app):
+    from core import db
+    from core.models.assignments import Assignment
+    from core.models.counters import AssignmentVersion
+
+    def per_request(func):
+        # a fresh session per call, as every request gets one
+        def setup():
+            context = app.app_context()
+            context.push()
+
+            def call():
+                func()
+                db.session.remove()
+
+            def teardown():
+                db.session.remove()
+                context.pop()
+            return call, teardown
+        return setup
+
+    return {
+        'queries.Assignment.get_by_id': per_request(lambda: Assignment.get_by_id(1)),
+        'queries.Assignment.get_version': per_request(lambda: Assignment.get_version(1)),
+        'queries.Assignment.get_assignments_by_student': per_request(
+            lambda: Assignment.get_assignments_by_student(1, PAGE_ROWS)),
+        'queries.Assignment.get_assignments_by_teacher': per_request(
+            lambda: Assignment.get_assignments_by_teacher(1, PAGE_ROWS)),
+        'queries.Assignment.get_all_graded_and_submitted_assignments': per_request(
+            lambda: Assignment.get_all_graded_and_submitted_assignments(PAGE_ROWS)),
+        'queries.Assignment.get_submitted_assignments_by_student': per_request(
+            lambda: Assignment.get_submitted_assignments_by_student(1, PAGE_ROWS)),
+        'queries.AssignmentVersion.get.teacher': per_request(
+            lambda: AssignmentVersion.get(AssignmentVersion.TEACHER, 1)),
+        'queries.AssignmentVersion.get.reviewable': per_request(
+            lambda: AssignmentVersion.get(AssignmentVersion.REVIEWABLE)),
+    }
+
+
+def time_calls(func, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return time.perf_counter() - start
+
+
+def measure(func, rounds, min_time):
+    """Seconds per call: warms up while calibrating how many calls make a round last `min_time`"""
+    number = 1
+    while True:
+        elapsed = time_calls(func, number)
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+
+    samples = [time_calls(func, number) / number for _ in range(rounds)]
+    return {
+        'median': statistics.median(samples),
+        'mean': statistics.mean(samples),
+        'min': min(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'rounds': rounds,
+        'calls_per_round': number,
+    }
+
+
+def run_cases(cases, args, suffix=''):
+    results = {}
+    for name, setup in cases.items():
+        if args.filter and args.filter not in name:
+            continue
+        func, teardown = setup()
+        try:
+            results[name + suffix] = stats = measure(func, args.rounds, args.min_time)
+        finally:
+            if teardown is not None:
+                teardown()
+        print('{0:<70} {1:>12.2f} us  +-{2:.1f}%'.format(
+            name + suffix, stats['min'] * 1e6, 100 * stats['stdev'] / stats['mean']), file=sys.stderr)
+    return results
+
+
+def run(args):
+    directory = tempfile.mkdtemp(prefix='micro-')
+    path = os.path.join(directory, 'bench.sqlite3')
+    try:
+        app = create_database(path)
+        results = run_cases(core_cases(app), args)
+        for size in sorted(args.sizes):
+            grow_assignments(app, path, size)
+            results.update(run_cases(query_cases(app), args, '[{0}]'.format(size)))
+    finally:
+        shutil.rmtree(directory)
+
+    return {
+        'meta': {
+            'recorded_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Rows of (name, baseline seconds per call, current seconds per call, relative change, verdict)"""
+    rows = []
+    for name in sorted(set(baseline['results']) | set(current['results'])):
+        before, after = baseline['results'].get(name), current['results'].get(name)
+        if before is None or after is None:
+            rows.append((name, before and before['min'], after and after['min'], None,
+                         'new' if before is None else 'missing'))
+            continue
+
+        change = after['min'] / before['min'] - 1
+        verdict = 'SLOWER' if change > threshold else 'faster' if change < -threshold else 'ok'
+        rows.append((name, before['min'], after['min'], change, verdict))
+    return rows
+
+
+def print_comparison(rows, threshold):
+    print('{0:<70} {1:>12} {2:>12} {3:>8}  {4}'.format('case', 'baseline us', 'current us', 'change', ''))
+    for name, before, after, change, verdict in rows:
+        print('{0:<70} {1:>12} {2:>12} {3:>8}  {4}'.format(
+            name,
+            '-' if before is None else '{0:.2f}'.format(before * 1e6),
+            '-' if after is None else '{0:.2f}'.format(after * 1e6),
+            '-' if change is None else '{0:+.1%}'.format(change),
+            verdict))
+    slower = sum(1 for row in rows if row[4] == 'SLOWER')
+    print('{0} of {1} cases slower than the baseline by more than {2:.0%}'.format(slower, len(rows), threshold))
+    return slower
+
+
+def read_json(path):
+    with open(path, encoding='utf8') as fo:
+        return json.load(fo)
+
+
+def write_json(path, data):
+    with open(path, 'w', encoding='utf8') as fo:
+        json.dump(data, fo, indent=2, sort_keys=True)
+        fo.write('\n')
+
+
+def parse_sizes(value):
+    return [int(size) for size in value.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the suite')
+    run_parser.add_argument('--sizes', type=parse_sizes, default=list(DEFAULT_SIZES))
+    run_parser.add_argument('--filter', help='only cases whose name contains this')
+    run_parser.add_argument('--rounds', type=int, default=7)
+    run_parser.add_argument('--min-time', type=float, default=0.05, help='seconds per round')
+    run_parser.add_argument('--output', help='write results here instead of stdout')
+    run_parser.add_argument('--save-baseline', action='store_true', help='write results to ' + BASELINE_PATH)
+
+    compare_parser = commands.add_parser('compare', help='compare results against the baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--baseline', default=BASELINE_PATH)
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+    args = parser.parse_args(argv)
+    if args.command == 'compare':
+        slower = print_comparison(compare(read_json(args.baseline), read_json(args.current), args.threshold),
+                                  args.threshold)
+        return 1 if slower else 0
+
+    results = run(args)
+    if args.save_baseline:
+        write_json(BASELINE_PATH, results)
+    elif args.output:
+        write_json(args.output, results)
+    else:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,53 @@
+"""
+Compares the compiled assignment serializer against AssignmentSchema().dump.
+
+    python -m benchmarks.serializers [rows] [repeat]
+"""
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+from core.apis.assignments.schema import AssignmentSchema, assignment_serializer
+from core.models.assignments import Assignment, AssignmentStateEnum, GradeEnum
+
+
+def make_assignments(count):
+    created_at = datetime(2024, 1, 1)
+    states = list(AssignmentStateEnum)
+    grades = list(GradeEnum)
+    assignments = []
+    for i in range(count):
+        state = states[i % len(states)]
+        assignments.append(Assignment(
+            id=i + 1,
+            student_id=i % 50 + 1,
+            teacher_id=None if state == AssignmentStateEnum.DRAFT else i % 7 + 1,
+            content='content of assignment {0}'.format(i),
+            grade=grades[i % len(grades)] if state == AssignmentStateEnum.GRADED else None,
+            state=state,
+            created_at=created_at + timedelta(seconds=i),
+            updated_at=created_at + timedelta(seconds=i, microseconds=i),
+        ))
+    return assignments
+
+
+def run(rows=10000, repeat=5):
+    assignments = make_assignments(rows)
+    cases = {
+        'marshmallow': lambda: AssignmentSchema().dump(assignments, many=True),
+        'compiled': lambda: assignment_serializer.dump(assignments, many=True),
+    }
+
+    results = {}
+    for name, case in cases.items():
+        case()  # warmup
+        best = min(timeit.repeat(case, number=1, repeat=repeat))
+        results[name] = best
+        print('{0:<12} {1:>9.2f} ms  {2:>9.2f} us/row'.format(name, best * 1000, best * 1e6 / rows))
+
+    print('speedup      {0:>9.1f}x'.format(results['marshmallow'] / results['compiled']))
+    return results
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
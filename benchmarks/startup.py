@@ -0,0 +1,134 @@
+"""
+Startup time of a worker: importing core, building the app and serving the first request.
+
+    python -m benchmarks.startup [--runs 10] [--output results.json]
+    python -m benchmarks.startup --check
+    python -m benchmarks.startup --record 1.4.0
+
+Every run is a fresh interpreter against a copy of core/store.sqlite3, as a gunicorn worker
+without preload_app starts. Medians are reported per phase. benchmarks/startup.json holds the
+target for the total and the results recorded for past releases: `--check` exits with 1 when the
+median total is over the target, `--record` adds this run to the history under a release name.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.loadgen import load_identities
+from benchmarks.storage_profiles import copy_database
+
+HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup.json')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PHASES = ('import', 'create_app', 'first_request')
+
+# runs in the child; prints seconds per phase as JSON
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import core
+imported = time.perf_counter()
+app = core.create_app()
+created = time.perf_counter()
+response = app.test_client().get('/student/assignments', headers={'X-Principal': sys.argv[1]})
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import': imported - started, 'create_app': created - imported, 'first_request': served - created}))
+'''
+
+
+def run_once(env, principal):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD, principal], env=env, cwd=ROOT, check=True,
+                            stdout=subprocess.PIPE).stdout
+    process = time.perf_counter() - started
+    phases = json.loads(output)
+    phases['total'] = sum(phases[name] for name in PHASES)
+    # interpreter startup and exit on top of the phases
+    phases['process'] = process
+    return phases
+
+
+def run(runs):
+    directory = tempfile.mkdtemp(prefix='startup-')
+    try:
+        database_path = copy_database(directory)
+        env = dict(os.environ, DATABASE_URL='sqlite:///' + database_path, METRICS_DIR=os.path.join(directory, 'metrics'))
+        # the flask command sets this, and with it Flask-Migrate is loaded; workers do not have it
+        env.pop('FLASK_RUN_FROM_CLI', None)
+        principal = load_identities(database_path)['student'][0]
+        # the first run also pays for compiling bytecode and a cold page cache
+        run_once(env, principal)
+        samples = [run_once(env, principal) for _ in range(runs)]
+    finally:
+        shutil.rmtree(directory)
+
+    return {
+        'recorded_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'runs': runs,
+        'median_ms': {name: statistics.median(sample[name] for sample in samples) * 1000 for name in samples[0]},
+        'max_ms': {name: max(sample[name] for sample in samples) * 1000 for name in samples[0]},
+    }
+
+
+def read_history():
+    with open(HISTORY_PATH, encoding='utf8') as fo:
+        return json.load(fo)
+
+
+def write_history(history):
+    with open(HISTORY_PATH, 'w', encoding='utf8') as fo:
+        json.dump(history, fo, indent=2, sort_keys=True)
+        fo.write('\n')
+
+
+def print_results(results, history):
+    print('{0:<16} {1:>10} {2:>10}'.format('phase', 'median ms', 'max ms'), file=sys.stderr)
+    for name, median in results['median_ms'].items():
+        print('{0:<16} {1:>10.1f} {2:>10.1f}'.format(name, median, results['max_ms'][name]), file=sys.stderr)
+    for release in history['releases'][-3:]:
+        print('{0:<16} {1:>10.1f}  (release {2})'.format('total', release['median_ms']['total'], release['release']),
+              file=sys.stderr)
+    print('target total {0:.0f} ms'.format(history['target_ms']['total']), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output', help='write results here instead of stdout')
+    parser.add_argument('--check', action='store_true', help='exit with 1 when the median total is over the target')
+    parser.add_argument('--record', metavar='RELEASE', help='add the results to ' + HISTORY_PATH)
+    args = parser.parse_args(argv)
+
+    results = run(args.runs)
+    history = read_history()
+    print_results(results, history)
+
+    if args.record:
+        history['releases'].append(dict(results, release=args.record))
+        write_history(history)
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as fo:
+            json.dump(results, fo, indent=2, sort_keys=True)
+            fo.write('\n')
+    elif not args.record:
+        print(json.dumps(results, indent=2, sort_keys=True))
+
+    if args.check and results['median_ms']['total'] > history['target_ms']['total']:
+        print('over the startup target', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,185 @@
+"""
+Throughput of a mixed read/write load against each storage profile in core/config.py, with several
+worker processes sharing one SQLite file the way gunicorn workers do.
+
+    python -m benchmarks.storage_profiles [--server gunicorn|processes] [--workers 4]
+        [--clients 8] [--seconds 10] [--write-ratio 0.3] [--profiles wal,legacy]
+
+`gunicorn` starts gunicorn_config.py against a copy of core/store.sqlite3 and drives it over HTTP.
+`processes` needs no server: each worker process runs the app through its test client.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from core.config import PROFILES
+
+SOURCE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'core', 'store.sqlite3')
+STUDENT = json.dumps({'student_id': 1, 'user_id': 1})
+
+
+def copy_database(directory):
+    """Fresh copy of the migrated database, so every profile starts from the same data"""
+    path = os.path.join(directory, 'bench.sqlite3')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    source, target = sqlite3.connect(SOURCE_DB), sqlite3.connect(path)
+    source.backup(target)
+    source.close()
+    target.close()
+    return path
+
+
+def next_request(rng, write_ratio):
+    if rng.random() < write_ratio:
+        return 'POST', '/student/assignments', {'content': 'benchmark draft'}
+    return 'GET', '/student/assignments?limit=20', None
+
+
+def summarize(latencies, errors, seconds):
+    latencies.sort()
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'throughput': count / seconds,
+        'p50_ms': latencies[count // 2] * 1000 if count else None,
+        'p99_ms': latencies[min(count - 1, int(count * 0.99))] * 1000 if count else None,
+    }
+
+
+def run_test_client_worker(seed, seconds, write_ratio, results):
+    from core.server import app
+
+    client, rng = app.test_client(), random.Random(seed)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        method, path, payload = next_request(rng, write_ratio)
+        start = time.perf_counter()
+        response = client.open(path, method=method, json=payload, headers={'X-Principal': STUDENT})
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors += 1
+    results.put((latencies, errors))
+
+
+def run_processes(args):
+    # spawned workers import core afresh and pick the profile up from the environment
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    workers = [
+        context.Process(target=run_test_client_worker, args=(seed, args.seconds, args.write_ratio, results))
+        for seed in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    latencies, errors = [], 0
+    for _ in workers:
+        worker_latencies, worker_errors = results.get()
+        latencies.extend(worker_latencies)
+        errors += worker_errors
+    for worker in workers:
+        worker.join()
+    return summarize(latencies, errors, args.seconds)
+
+
+def http_client(base_url, seed, deadline, write_ratio, latencies, errors, lock):
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        method, path, payload = next_request(rng, write_ratio)
+        data = None if payload is None else json.dumps(payload).encode('utf8')
+        request = urllib.request.Request(base_url + path, data=data, method=method, headers={
+            'X-Principal': STUDENT, 'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        try:
+            urllib.request.urlopen(request, timeout=30).read()
+            elapsed, failed = time.perf_counter() - start, False
+        except (urllib.error.URLError, OSError):
+            elapsed, failed = None, True
+        with lock:
+            if failed:
+                errors.append(1)
+            else:
+                latencies.append(elapsed)
+
+
+def wait_until_ready(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/', timeout=1).read()
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not come up on {0}'.format(base_url))
+
+
+def run_gunicorn(args):
+    if shutil.which('gunicorn') is None:
+        raise SystemExit('gunicorn is not installed, use --server processes')
+
+    env = dict(os.environ, GUNICORN_PORT=str(args.port), GUNICORN_NUMBER_WORKERS=str(args.workers),
+               GUNICORN_LOG_LEVEL='warning')
+    server = subprocess.Popen(['gunicorn', '-c', 'gunicorn_config.py', 'core.server:app'],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = 'http://127.0.0.1:{0}'.format(args.port)
+    try:
+        wait_until_ready(base_url)
+        latencies, errors, lock = [], [], threading.Lock()
+        deadline = time.perf_counter() + args.seconds
+        clients = [
+            threading.Thread(target=http_client, args=(base_url, seed, deadline, args.write_ratio, latencies, errors, lock))
+            for seed in range(args.clients)
+        ]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        return summarize(latencies, len(errors), args.seconds)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--server', choices=('gunicorn', 'processes'), default='gunicorn')
+    parser.add_argument('--profiles', default=','.join(PROFILES))
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent HTTP clients, gunicorn only')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.3)
+    parser.add_argument('--port', type=int, default=7799)
+    args = parser.parse_args(argv)
+
+    run = run_gunicorn if args.server == 'gunicorn' else run_processes
+    directory = tempfile.mkdtemp(prefix='storage-profiles-')
+    print('{0:<12} {1:>10} {2:>8} {3:>10} {4:>10}'.format('profile', 'req/s', 'errors', 'p50 ms', 'p99 ms'))
+    try:
+        for profile in args.profiles.split(','):
+            os.environ['APP_DB_PROFILE'] = profile
+            os.environ['DATABASE_URL'] = 'sqlite:///' + copy_database(directory)
+            result = run(args)
+            print('{0:<12} {1:>10.1f} {2:>8} {3:>10.2f} {4:>10.2f}'.format(
+                profile, result['throughput'], result['errors'], result['p50_ms'] or 0, result['p99_ms'] or 0))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
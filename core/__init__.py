@@ -1,23 +1,80 @@
+"""
+Importing core only declares `db`, which the models are defined on; `create_app` builds an app.
+Blueprints, and with them the marshmallow schemas that reflect the models, are imported when an
+app registers them, and Flask-Migrate (alembic is the slowest import of all) only for the flask
+command. core/server.py holds the app that is served.
+"""
+import os
+from functools import partial
+from sqlite3 import Connection as SQLite3Connection
+
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from sqlalchemy import event
-from sqlalchemy.engine import Engine
-from sqlite3 import Connection as SQLite3Connection
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///./store.sqlite3'
-app.config['SQLALCHEMY_ECHO'] = False
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-app.test_client()
+from core import config
+from core.libs import cooperative, sql_profiler
+from core.libs.replication import RoutingSQLAlchemy
+
+# sessions are per greenlet when gunicorn_config.py patched the process, see core/libs/cooperative.py
+db = RoutingSQLAlchemy(session_options=cooperative.session_options())
 
 
-# this is to enforce fk (not done by default in sqlite3)
-@event.listens_for(Engine, "connect")
-def _set_sqlite_pragma(dbapi_connection, connection_record):
+# storage profile pragmas, see core/config.py; foreign keys are always enforced (not done by default in sqlite3)
+def set_sqlite_pragmas(pragmas, dbapi_connection, connection_record):
     if isinstance(dbapi_connection, SQLite3Connection):
         cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON;")
+        for pragma in pragmas:
+            cursor.execute(pragma)
         cursor.close()
+
+
+def register_blueprints(app):
+    from core.apis.assignments import student_assignments_resources, teacher_assignments_resources, \
+        principal_assignments_resources
+
+    app.register_blueprint(student_assignments_resources, url_prefix='/student')
+    app.register_blueprint(teacher_assignments_resources, url_prefix='/teacher')
+    app.register_blueprint(principal_assignments_resources, url_prefix='/principal')
+
+
+def create_app(migrations=None):
+    """
+    A configured app with every route, hook and command. `migrations` sets up Flask-Migrate; by
+    default only when running under the flask command, which `flask db` needs.
+    """
+    from core import cli
+    from core.apis import decorators, system
+    from core.libs import compression, lifecycle, metrics, query_accounting, replication
+
+    app = Flask(__name__)
+    app.config.update(config.load())
+    # sqlite3 calls off the gevent hub when gunicorn_config.py patched the process, see core/libs/cooperative.py
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = cooperative.engine_options(app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    app.config['SQLALCHEMY_ECHO'] = False
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    db.init_app(app)
+    if db.app is None:
+        # what code outside an app context uses: replication threads, scripts, tests
+        db.app = app
+    event.listen(db.get_engine(app), 'connect', partial(set_sqlite_pragmas, app.config['SQLITE_PRAGMAS']))
+    # per-template statement stats and the slow query log, see core/libs/sql_profiler.py
+    sql_profiler.init_app(app)
+
+    if migrations if migrations is not None else os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    register_blueprints(app)
+    decorators.init_app(app)
+    query_accounting.init_app(app)
+    metrics.init_app(app)
+    replication.init_app(app, db)
+    lifecycle.init_app(app)
+    system.init_app(app)
+    app.cli.add_command(cli.counters_cli)
+    app.cli.add_command(cli.seed_command)
+    if app.config['COMPRESSION_ENABLED']:
+        app.wsgi_app = compression.GzipMiddleware(app.wsgi_app, minimum_size=app.config['COMPRESSION_MIN_SIZE'],
+                                                  level=app.config['COMPRESSION_LEVEL'])
+    return app
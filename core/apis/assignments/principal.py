@@ -1,23 +1,54 @@
-from flask import Blueprint
+from flask import Blueprint, request
 from core import db
 from core.apis import decorators
 from core.apis.responses import APIResponse
-from core.models.assignments import Assignment, AssignmentStateEnum
-from core.models.teachers import Teacher
+from core.libs import assertions, etags, pagination, serializers
+from core.models.assignments import Assignment
+from core.models.counters import AssignmentCounter, AssignmentVersion
+from core.models.directory import directory
+from core.models.reports import assignment_snapshot
+from core.libs.exceptions import FyleError
 from marshmallow import ValidationError
-from .schema import AssignmentSchema, AssignmentGradeSchema, TeacherSchema
+from .schema import AssignmentGradeSchema, TeacherSchema, assignment_serializer, \
+    ASSIGNMENT_SUMMARY_FIELDS, load_bulk_items, dump_bulk_results, is_atomic_requested, bulk_status_code
 
 principal_assignments_resources = Blueprint('principal_assignments_resources', __name__)
 
 @principal_assignments_resources.route('/assignments', methods=['GET'], strict_slashes=False)
+@decorators.query_budget(3)
 @decorators.authenticate_principal
 def list_assignments(p):
     """Returns list of assignments"""
-    principal_assignments = Assignment.get_all_graded_and_submitted_assignments()
-    principal_assignments_dump = AssignmentSchema().dump(principal_assignments, many=True)
-    return APIResponse.respond(data=principal_assignments_dump)
+    limit, cursor = pagination.get_page_args(request.args)
+    fields = serializers.get_fields_arg(request.args, assignment_serializer.fields, ASSIGNMENT_SUMMARY_FIELDS)
+    if pagination.is_stream_requested(request.args):
+        principal_assignments = Assignment.stream(Assignment.filter_graded_and_submitted(fields), cursor)
+        return APIResponse.stream(principal_assignments, assignment_serializer.only(fields).dump)
+
+    # every principal sees the same listing, so the scope is just the data
+    etag = etags.make_etag(AssignmentVersion.get(AssignmentVersion.REVIEWABLE))
+    if etags.is_fresh(etag):
+        return APIResponse.not_modified(etag)
+
+    principal_assignments, next_cursor = Assignment.get_all_graded_and_submitted_assignments(limit, cursor, fields)
+    principal_assignments_dump = assignment_serializer.only(fields).dump(principal_assignments, many=True)
+    return APIResponse.respond_page(data=principal_assignments_dump, next_cursor=next_cursor, etag=etag)
+
+@principal_assignments_resources.route('/assignments/counts', methods=['GET'], strict_slashes=False)
+@decorators.query_budget(2)
+@decorators.authenticate_principal
+def count_assignments(p):
+    """Number of submitted and graded assignments by state and by grade, optionally of one teacher and/or student"""
+    keys = {}
+    for key in ('teacher_id', 'student_id'):
+        value = request.args.get(key)
+        if value is not None:
+            assertions.assert_valid(value.isdigit(), '{0} should be an integer'.format(key))
+            keys[key] = int(value)
+    return APIResponse.respond(data=AssignmentCounter.summarize(**keys))
 
 @principal_assignments_resources.route('/assignments/grade', methods=['POST'], strict_slashes=False)
+@decorators.query_budget(3)
 @decorators.accept_payload
 @decorators.authenticate_principal
 def grade_assignment(p, incoming_payload):
@@ -27,14 +58,6 @@ def grade_assignment(p, incoming_payload):
             return APIResponse.error(message="Payload not found", status_code=400)
         
         grade_assignment_payload = AssignmentGradeSchema().load(incoming_payload)
-        assignment = Assignment.get_by_id(grade_assignment_payload.id)
-
-        if not assignment:
-            return APIResponse.error(message="Assignment not found", status_code=404)
-
-        if assignment.state == AssignmentStateEnum.DRAFT:
-            return APIResponse.error(message="Draft assignment cannot be graded", status_code=400)
-
         graded_assignment = Assignment.mark_grade(
             _id=grade_assignment_payload.id,
             grade=grade_assignment_payload.grade,
@@ -42,23 +65,64 @@ def grade_assignment(p, incoming_payload):
         )
 
         db.session.commit()
-        graded_assignment_dump = AssignmentSchema().dump(graded_assignment)
+        graded_assignment_dump = assignment_serializer.dump(graded_assignment)
         return APIResponse.respond(data=graded_assignment_dump)
 
     except ValidationError as err:
         return APIResponse.error(message=err.messages, status_code=400, error="ValidationError")
+    except FyleError:
+        raise
     except Exception as e:
         return APIResponse.error(message=str(e), status_code=500, error="ServerError")
 
+@principal_assignments_resources.route('/assignments/grade/bulk', methods=['POST'], strict_slashes=False)
+@decorators.query_budget(4)
+@decorators.accept_payload
+@decorators.authenticate_principal
+def bulk_grade_assignments(p, incoming_payload):
+    """Grade or re-grade many assignments in one transaction, reporting the outcome of each"""
+    atomic = is_atomic_requested(request.args)
+    grade_assignment_payloads, refusals = load_bulk_items(AssignmentGradeSchema, incoming_payload)
+
+    results = Assignment.bulk_mark_grade(
+        [(None, None) if payload is None else (payload.id, payload.grade) for payload in grade_assignment_payloads],
+        auth_principal=p, atomic=atomic, refusals=refusals
+    )
+    db.session.commit()
+    return APIResponse.respond(data=dump_bulk_results(results), status_code=bulk_status_code(results, atomic))
+
 @principal_assignments_resources.route('/teachers', methods=['GET'], strict_slashes=False)
+@decorators.query_budget(2)
 @decorators.authenticate_principal
 def list_teachers(p):
     """Returns list of all teachers"""
-    teachers = Teacher.query.all()
+    teachers = directory.get_teachers()
     teachers_dump = TeacherSchema().dump(teachers, many=True)
     return APIResponse.respond(data=teachers_dump)
 
+@principal_assignments_resources.route('/reports/graded-per-student', methods=['GET'], strict_slashes=False)
+@decorators.query_budget(2)
+@decorators.authenticate_principal
+def graded_per_student_report(p):
+    """Number of graded assignments of each student, from the report snapshot"""
+    report = [
+        {'student_id': student_id, 'graded_assignments_count': count}
+        for student_id, count in assignment_snapshot.graded_per_student()
+    ]
+    return APIResponse.respond(data=report)
+
+@principal_assignments_resources.route('/reports/top-grader', methods=['GET'], strict_slashes=False)
+@decorators.query_budget(2)
+@decorators.authenticate_principal
+def top_grader_report(p):
+    """Grade A count of the teacher who graded the most assignments, from the report snapshot"""
+    teacher_id, graded_count, grade_a_count = assignment_snapshot.grade_a_for_top_grader()
+    return APIResponse.respond(data={
+        'teacher_id': teacher_id, 'graded_assignments_count': graded_count, 'grade_a_count': grade_a_count
+    })
+
 @principal_assignments_resources.route('/assignments/<int:assignment_id>/regrade', methods=['PUT'], strict_slashes=False)
+@decorators.query_budget(3)
 @decorators.accept_payload
 @decorators.authenticate_principal
 def regrade_assignment(p, incoming_payload, assignment_id):
@@ -68,14 +132,6 @@ def regrade_assignment(p, incoming_payload, assignment_id):
             return APIResponse.error(message="Payload not found", status_code=400)
         
         grade_assignment_payload = AssignmentGradeSchema().load(incoming_payload)
-        assignment = Assignment.get_by_id(assignment_id)
-
-        if not assignment:
-            return APIResponse.error(message="Assignment not found", status_code=404)
-
-        if assignment.state == AssignmentStateEnum.DRAFT:
-            return APIResponse.error(message="Draft assignment cannot be graded", status_code=400)
-
         graded_assignment = Assignment.mark_grade(
             _id=assignment_id,
             grade=grade_assignment_payload.grade,
@@ -83,10 +139,12 @@ def regrade_assignment(p, incoming_payload, assignment_id):
         )
         
         db.session.commit()
-        graded_assignment_dump = AssignmentSchema().dump(graded_assignment)
+        graded_assignment_dump = assignment_serializer.dump(graded_assignment)
         return APIResponse.respond(data=graded_assignment_dump)
 
     except ValidationError as err:
         return APIResponse.error(message=err.messages, status_code=400, error="ValidationError")
+    except FyleError:
+        raise
     except Exception as e:
         return APIResponse.error(message=str(e), status_code=500, error="ServerError")
\ No newline at end of file
@@ -2,10 +2,24 @@ from marshmallow import Schema, EXCLUDE, fields, post_load, ValidationError, val
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema, auto_field
 from marshmallow_enum import EnumField
 from core.models.assignments import Assignment, GradeEnum
+from core.libs import assertions, metrics
 from core.libs.helpers import GeneralObject
+from core.libs.serializers import CompiledSerializer
 from core.models.teachers import Teacher
 
-class AssignmentSchema(SQLAlchemyAutoSchema):
+class TimedSchemaMixin:
+    """Times loads and dumps as the validation and serialization phases of the request, see core/libs/metrics.py"""
+
+    def load(self, *args, **kwargs):
+        with metrics.phase('validation'):
+            return super().load(*args, **kwargs)
+
+    def dump(self, *args, **kwargs):
+        with metrics.phase('serialization'):
+            return super().dump(*args, **kwargs)
+
+
+class AssignmentSchema(TimedSchemaMixin, SQLAlchemyAutoSchema):
     class Meta:
         model = Assignment
         unknown = EXCLUDE
@@ -29,7 +43,62 @@ class AssignmentSchema(SQLAlchemyAutoSchema):
             raise ValidationError("Content cannot be null.")
 
 
-class AssignmentSubmitSchema(Schema):
+# read-path stand-in for AssignmentSchema().dump, built once from the column metadata
+assignment_serializer = CompiledSerializer(Assignment)
+
+# what list endpoints return for an empty `fields=`, everything but the unbounded content
+ASSIGNMENT_SUMMARY_FIELDS = tuple(field for field in assignment_serializer.fields if field != 'content')
+
+MAX_BULK_ITEMS = 1000
+
+
+def load_bulk_payload(schema_class, incoming_payload):
+    """Validates a JSON array of items in one pass, raising ValidationError keyed by item index"""
+    assertions.assert_valid(isinstance(incoming_payload, list) and 0 < len(incoming_payload) <= MAX_BULK_ITEMS,
+                            'payload should be a list of 1 to {0} items'.format(MAX_BULK_ITEMS))
+    return schema_class(many=True).load(incoming_payload)
+
+
+def load_bulk_items(schema_class, incoming_payload):
+    """
+    `load_bulk_payload` where an invalid item only fails itself: returns the loaded items, None in
+    place of the invalid ones, and the refusal of each invalid item keyed by its index
+    """
+    try:
+        return load_bulk_payload(schema_class, incoming_payload), {}
+    except ValidationError as err:
+        errors = err.messages
+
+    schema = schema_class()
+    items = [None if index in errors else schema.load(item) for index, item in enumerate(incoming_payload)]
+    return items, {index: (400, messages) for index, messages in errors.items()}
+
+
+def is_atomic_requested(args):
+    """`?atomic=true` applies a bulk payload all or nothing"""
+    return args.get('atomic', '').lower() in ('1', 'true')
+
+
+def bulk_status_code(results, atomic):
+    """An atomic batch that was held back is a failed request; otherwise outcomes are per item"""
+    if atomic and any(result.status_code != 200 for result in results):
+        return 400
+    return 200
+
+
+def dump_bulk_results(results):
+    return [
+        {
+            'id': result.id,
+            'status_code': result.status_code,
+            'message': result.message,
+            'data': None if result.assignment is None else assignment_serializer.dump(result.assignment)
+        }
+        for result in results
+    ]
+
+
+class AssignmentSubmitSchema(TimedSchemaMixin, Schema):
     class Meta:
         unknown = EXCLUDE
 
@@ -41,7 +110,7 @@ class AssignmentSubmitSchema(Schema):
         return GeneralObject(**data_dict)
 
 
-class AssignmentGradeSchema(Schema):
+class AssignmentGradeSchema(TimedSchemaMixin, Schema):
     class Meta:
         unknown = EXCLUDE
 
@@ -53,7 +122,7 @@ class AssignmentGradeSchema(Schema):
         return GeneralObject(**data_dict)
 
 
-class TeacherSchema(SQLAlchemyAutoSchema):
+class TeacherSchema(TimedSchemaMixin, SQLAlchemyAutoSchema):
     class Meta:
         model = Teacher
         unknown = EXCLUDE
@@ -1,27 +1,43 @@
-from flask import Blueprint
+from flask import Blueprint, request
 from core import db
 from core.apis import decorators
 from core.apis.responses import APIResponse
+from core.libs import etags, pagination, serializers
 from core.models.assignments import Assignment
+from core.models.directory import directory
+from core.models.counters import AssignmentVersion
 from marshmallow import ValidationError
-from core.models.teachers import Teacher
+from sqlalchemy.exc import IntegrityError
 from core.models.assignments import Assignment, AssignmentStateEnum
 
 
-from .schema import AssignmentSchema, AssignmentSubmitSchema
+from .schema import AssignmentSchema, AssignmentSubmitSchema, assignment_serializer, ASSIGNMENT_SUMMARY_FIELDS, \
+    load_bulk_items, is_atomic_requested, bulk_status_code, dump_bulk_results
 student_assignments_resources = Blueprint('student_assignments_resources', __name__)
 
 
 @student_assignments_resources.route('/assignments', methods=['GET'], strict_slashes=False)
+@decorators.query_budget(3)
 @decorators.authenticate_principal
 def list_assignments(p):
     """Returns list of assignments"""
-    students_assignments = Assignment.get_assignments_by_student(p.student_id)
-    students_assignments_dump = AssignmentSchema().dump(students_assignments, many=True)
-    return APIResponse.respond(data=students_assignments_dump)
+    limit, cursor = pagination.get_page_args(request.args)
+    fields = serializers.get_fields_arg(request.args, assignment_serializer.fields, ASSIGNMENT_SUMMARY_FIELDS)
+    if pagination.is_stream_requested(request.args):
+        students_assignments = Assignment.stream(Assignment.filter_by_student(p.student_id, fields), cursor)
+        return APIResponse.stream(students_assignments, assignment_serializer.only(fields).dump)
+
+    etag = etags.make_etag(p.student_id, AssignmentVersion.get(AssignmentVersion.STUDENT, p.student_id))
+    if etags.is_fresh(etag):
+        return APIResponse.not_modified(etag)
+
+    students_assignments, next_cursor = Assignment.get_assignments_by_student(p.student_id, limit, cursor, fields)
+    students_assignments_dump = assignment_serializer.only(fields).dump(students_assignments, many=True)
+    return APIResponse.respond_page(data=students_assignments_dump, next_cursor=next_cursor, etag=etag)
 
 
 @student_assignments_resources.route('/assignments', methods=['POST'], strict_slashes=False)
+@decorators.query_budget(3)
 @decorators.accept_payload
 @decorators.authenticate_principal
 def upsert_assignment(p, incoming_payload):
@@ -36,16 +52,29 @@ def upsert_assignment(p, incoming_payload):
         return APIResponse.error(message=err.messages, status_code=400)
 
     assignment.student_id = p.student_id
-    assignment.state = "DRAFT"  # Default state for a new or updated assignment
-    assignment.teacher_id = None  # Default teacher_id should be None
-    
+
     upserted_assignment = Assignment.upsert(assignment)
     db.session.commit()
-    upserted_assignment_dump = AssignmentSchema().dump(upserted_assignment)
+    upserted_assignment_dump = assignment_serializer.dump(upserted_assignment)
     return APIResponse.respond(data=upserted_assignment_dump)
 
 
+@student_assignments_resources.route('/assignments/bulk', methods=['POST'], strict_slashes=False)
+@decorators.query_budget(6)
+@decorators.accept_payload
+@decorators.authenticate_principal
+def bulk_upsert_assignments(p, incoming_payload):
+    """Create or edit many drafts in one transaction, reporting the outcome of each"""
+    atomic = is_atomic_requested(request.args)
+    assignments, refusals = load_bulk_items(AssignmentSchema, incoming_payload)
+
+    results = Assignment.bulk_upsert(assignments, p.student_id, atomic=atomic, refusals=refusals)
+    db.session.commit()
+    return APIResponse.respond(data=dump_bulk_results(results), status_code=bulk_status_code(results, atomic))
+
+
 @student_assignments_resources.route('/assignments/submit', methods=['POST'], strict_slashes=False)
+@decorators.query_budget(4)
 @decorators.accept_payload
 @decorators.authenticate_principal  # Change to `@decorators.authenticate_student` if necessary
 def submit_assignment(p, incoming_payload):
@@ -56,58 +85,88 @@ def submit_assignment(p, incoming_payload):
     except ValidationError as err:
         return APIResponse.error(message=err.messages, status_code=400)
 
-    # Fetch the assignment by ID
-    assignment = Assignment.get_by_id(submit_assignment_payload.id)
-
-    # Ensure the assignment exists and belongs to the authenticated student
-    if assignment is None or assignment.student_id != p.student_id:
-        return APIResponse.error(message="Assignment not found or access denied.", status_code=404)
-
-    # Validate that the teacher exists
-    teacher = Teacher.query.filter_by(id=submit_assignment_payload.teacher_id).first()
-    if not teacher:
+    if directory.get_teacher(submit_assignment_payload.teacher_id) is None:
         return APIResponse.error(message="Teacher not found", status_code=404)
 
-    # Check if the assignment is in the correct state to be submitted
-    if assignment.state != AssignmentStateEnum.DRAFT:
-        return APIResponse.error(message="only a draft assignment can be submitted", status_code=400, error="FyleError")
-
-    # Mark the assignment as submitted
-    assignment.state = AssignmentStateEnum.SUBMITTED
-    assignment.teacher_id = submit_assignment_payload.teacher_id
+    try:
+        submitted_assignment = Assignment.submit(
+            _id=submit_assignment_payload.id,
+            teacher_id=submit_assignment_payload.teacher_id,
+            auth_principal=p
+        )
+    except IntegrityError:
+        # the teacher was deleted after the directory check; the foreign key still catches it
+        db.session.rollback()
+        return APIResponse.error(message="Teacher not found", status_code=404)
 
     db.session.commit()
-    submitted_assignment_dump = AssignmentSchema().dump(assignment)
+    submitted_assignment_dump = assignment_serializer.dump(submitted_assignment)
     return APIResponse.respond(data=submitted_assignment_dump)
 
 
+@student_assignments_resources.route('/assignments/submit/bulk', methods=['POST'], strict_slashes=False)
+@decorators.query_budget(5)
+@decorators.accept_payload
+@decorators.authenticate_principal
+def bulk_submit_assignments(p, incoming_payload):
+    """Submit many drafts in one transaction, reporting the outcome of each"""
+    atomic = is_atomic_requested(request.args)
+    submissions, refusals = load_bulk_items(AssignmentSubmitSchema, incoming_payload)
+
+    results = Assignment.bulk_submit(
+        [(None, None) if payload is None else (payload.id, payload.teacher_id) for payload in submissions],
+        auth_principal=p, atomic=atomic, refusals=refusals
+    )
+    db.session.commit()
+    return APIResponse.respond(data=dump_bulk_results(results), status_code=bulk_status_code(results, atomic))
+
 
 @student_assignments_resources.route('/assignments/<int:assignment_id>', methods=['GET'], strict_slashes=False)
+@decorators.query_budget(3)
 @decorators.authenticate_principal
 def view_assignment(p, assignment_id):
     """View a specific assignment"""
+    version = Assignment.get_version(assignment_id)
+    if version and version.student_id == p.student_id:
+        etag = etags.make_etag(p.student_id, version.updated_at)
+        if etags.is_fresh(etag):
+            return APIResponse.not_modified(etag)
+
     assignment = Assignment.get_by_id(assignment_id)
     
     # Ensure assignment belongs to the student
     if not assignment or assignment.student_id != p.student_id:
         return APIResponse.error(message="Assignment not found", status_code=404)
 
-    assignment_dump = AssignmentSchema().dump(assignment)
-    return APIResponse.respond(data=assignment_dump)
+    assignment_dump = assignment_serializer.dump(assignment)
+    return APIResponse.respond(data=assignment_dump, etag=etags.make_etag(p.student_id, assignment.updated_at))
 
 
 
 @student_assignments_resources.route('/assignments/submitted', methods=['GET'], strict_slashes=False)
+@decorators.query_budget(3)
 @decorators.authenticate_principal
 def list_submitted_assignments(p):
     """List all submitted assignments"""
-    submitted_assignments = Assignment.get_submitted_assignments_by_student(p.student_id)
-    submitted_assignments_dump = AssignmentSchema().dump(submitted_assignments, many=True)
-    return APIResponse.respond(data=submitted_assignments_dump)
+    limit, cursor = pagination.get_page_args(request.args)
+    fields = serializers.get_fields_arg(request.args, assignment_serializer.fields, ASSIGNMENT_SUMMARY_FIELDS)
+    if pagination.is_stream_requested(request.args):
+        submitted_assignments = Assignment.stream(Assignment.filter_submitted_by_student(p.student_id, fields), cursor)
+        return APIResponse.stream(submitted_assignments, assignment_serializer.only(fields).dump)
+
+    # the version of all of the student's assignments, which covers the submitted ones
+    etag = etags.make_etag(p.student_id, AssignmentVersion.get(AssignmentVersion.STUDENT, p.student_id))
+    if etags.is_fresh(etag):
+        return APIResponse.not_modified(etag)
+
+    submitted_assignments, next_cursor = Assignment.get_submitted_assignments_by_student(p.student_id, limit, cursor, fields)
+    submitted_assignments_dump = assignment_serializer.only(fields).dump(submitted_assignments, many=True)
+    return APIResponse.respond_page(data=submitted_assignments_dump, next_cursor=next_cursor, etag=etag)
 
 
 
 @student_assignments_resources.route('/assignments/<int:assignment_id>', methods=['DELETE'], strict_slashes=False)
+@decorators.query_budget(4)
 @decorators.authenticate_principal  # This should be `@decorators.authenticate_student`
 def delete_draft_assignment(p, assignment_id):
     """Delete a draft assignment"""
@@ -2,24 +2,44 @@ from flask import Blueprint, request
 from core import db
 from core.apis import decorators
 from core.apis.responses import APIResponse
-from core.models.assignments import Assignment, AssignmentStateEnum
+from core.libs import etags, pagination, serializers
+from core.models.assignments import Assignment
+from core.models.counters import AssignmentCounter, AssignmentVersion
 from marshmallow import ValidationError
 
-from .schema import AssignmentSchema, AssignmentGradeSchema
+from .schema import AssignmentGradeSchema, assignment_serializer, ASSIGNMENT_SUMMARY_FIELDS, \
+    load_bulk_items, dump_bulk_results, is_atomic_requested, bulk_status_code
 
 teacher_assignments_resources = Blueprint('teacher_assignments_resources', __name__)
 
 @teacher_assignments_resources.route('/assignments', methods=['GET'], strict_slashes=False)
+@decorators.query_budget(3)
 @decorators.authenticate_principal
 def list_assignments(p):
     """Returns a list of assignments submitted to the teacher."""
-    teachers_assignments = Assignment.get_assignments_by_teacher(p.teacher_id)
-    if not teachers_assignments:  # Check if there are no assignments
-        return APIResponse.respond(data=[], status_code=200)
-    teachers_assignments_dump = AssignmentSchema().dump(teachers_assignments, many=True)
-    return APIResponse.respond(data=teachers_assignments_dump)
+    limit, cursor = pagination.get_page_args(request.args)
+    fields = serializers.get_fields_arg(request.args, assignment_serializer.fields, ASSIGNMENT_SUMMARY_FIELDS)
+    if pagination.is_stream_requested(request.args):
+        teachers_assignments = Assignment.stream(Assignment.filter_by_teacher(p.teacher_id, fields), cursor)
+        return APIResponse.stream(teachers_assignments, assignment_serializer.only(fields).dump)
+
+    etag = etags.make_etag(p.teacher_id, AssignmentVersion.get(AssignmentVersion.TEACHER, p.teacher_id))
+    if etags.is_fresh(etag):
+        return APIResponse.not_modified(etag)
+
+    teachers_assignments, next_cursor = Assignment.get_assignments_by_teacher(p.teacher_id, limit, cursor, fields)
+    teachers_assignments_dump = assignment_serializer.only(fields).dump(teachers_assignments, many=True)
+    return APIResponse.respond_page(data=teachers_assignments_dump, next_cursor=next_cursor, etag=etag)
+
+@teacher_assignments_resources.route('/assignments/counts', methods=['GET'], strict_slashes=False)
+@decorators.query_budget(2)
+@decorators.authenticate_principal
+def count_assignments(p):
+    """Number of assignments submitted to the teacher, by state and by grade"""
+    return APIResponse.respond(data=AssignmentCounter.summarize(teacher_id=p.teacher_id))
 
 @teacher_assignments_resources.route('/assignments/grade', methods=['POST'], strict_slashes=False)
+@decorators.query_budget(3)
 @decorators.accept_payload
 @decorators.authenticate_principal
 def grade_assignment(p, incoming_payload):
@@ -27,35 +47,46 @@ def grade_assignment(p, incoming_payload):
     try:
         grade_assignment_payload = AssignmentGradeSchema().load(incoming_payload)
 
-        assignment = Assignment.get_by_id(grade_assignment_payload.id)
-
-        if assignment is None:
-            return APIResponse.error(message="Assignment not found", status_code=404, error="FyleError")
-
-        # Check if the assignment belongs to the same teacher
-        if assignment.teacher_id == p.teacher_id:
-            return APIResponse.error(message="You cannot grade your own assignment", status_code=400, error="FyleError")
-
-        if assignment.state == AssignmentStateEnum.DRAFT:
-            return APIResponse.error(message="Draft assignment cannot be graded", status_code=400, error="FyleError")
-
         graded_assignment = Assignment.mark_grade(
             _id=grade_assignment_payload.id,
             grade=grade_assignment_payload.grade,
             auth_principal=p
         )
         db.session.commit()
-        graded_assignment_dump = AssignmentSchema().dump(graded_assignment)
+        graded_assignment_dump = assignment_serializer.dump(graded_assignment)
         return APIResponse.respond(data=graded_assignment_dump)
     except ValidationError as err:
         return APIResponse.error(message=err.messages, status_code=400, error="ValidationError")
 
+@teacher_assignments_resources.route('/assignments/grade/bulk', methods=['POST'], strict_slashes=False)
+@decorators.query_budget(4)
+@decorators.accept_payload
+@decorators.authenticate_principal
+def bulk_grade_assignments(p, incoming_payload):
+    """Grade many assignments in one transaction, reporting the outcome of each."""
+    atomic = is_atomic_requested(request.args)
+    grade_assignment_payloads, refusals = load_bulk_items(AssignmentGradeSchema, incoming_payload)
+
+    results = Assignment.bulk_mark_grade(
+        [(None, None) if payload is None else (payload.id, payload.grade) for payload in grade_assignment_payloads],
+        auth_principal=p, atomic=atomic, refusals=refusals
+    )
+    db.session.commit()
+    return APIResponse.respond(data=dump_bulk_results(results), status_code=bulk_status_code(results, atomic))
+
 # Additional APIs to be added
 
 @teacher_assignments_resources.route('/assignments/<int:assignment_id>', methods=['GET'], strict_slashes=False)
+@decorators.query_budget(3)
 @decorators.authenticate_principal
 def get_assignment_detail(p, assignment_id):
     """Get details of a specific assignment submitted to the teacher."""
+    version = Assignment.get_version(assignment_id)
+    if version and version.teacher_id == p.teacher_id:
+        etag = etags.make_etag(p.teacher_id, version.updated_at)
+        if etags.is_fresh(etag):
+            return APIResponse.not_modified(etag)
+
     assignment = Assignment.get_by_id(assignment_id)
     
     if assignment is None:
@@ -64,10 +95,11 @@ def get_assignment_detail(p, assignment_id):
     if assignment.teacher_id != p.teacher_id:
         return APIResponse.error(message="You do not have permission to view this assignment", status_code=403, error="FyleError")
 
-    assignment_dump = AssignmentSchema().dump(assignment)
-    return APIResponse.respond(data=assignment_dump)
+    assignment_dump = assignment_serializer.dump(assignment)
+    return APIResponse.respond(data=assignment_dump, etag=etags.make_etag(p.teacher_id, assignment.updated_at))
 
 @teacher_assignments_resources.route('/assignments/<int:assignment_id>/grade', methods=['POST'], strict_slashes=False)
+@decorators.query_budget(3)
 @decorators.accept_payload
 @decorators.authenticate_principal
 def update_assignment_grade(p, assignment_id, incoming_payload):
@@ -75,24 +107,13 @@ def update_assignment_grade(p, assignment_id, incoming_payload):
     try:
         grade_assignment_payload = AssignmentGradeSchema().load(incoming_payload)
 
-        assignment = Assignment.get_by_id(assignment_id)
-
-        if assignment is None:
-            return APIResponse.error(message="Assignment not found", status_code=404, error="FyleError")
-
-        if assignment.teacher_id != p.teacher_id:
-            return APIResponse.error(message="You cannot grade this assignment", status_code=400, error="FyleError")
-
-        if assignment.state == AssignmentStateEnum.DRAFT:
-            return APIResponse.error(message="Draft assignment cannot be graded", status_code=400)
-
         graded_assignment = Assignment.mark_grade(
             _id=assignment_id,
             grade=grade_assignment_payload.grade,
             auth_principal=p
         )
         db.session.commit()
-        graded_assignment_dump = AssignmentSchema().dump(graded_assignment)
+        graded_assignment_dump = assignment_serializer.dump(graded_assignment)
         return APIResponse.respond(data=graded_assignment_dump)
     except ValidationError as err:
         return APIResponse.error(message=err.messages, status_code=400, error="ValidationError")
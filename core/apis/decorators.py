@@ -1,21 +1,50 @@
 import json
-from flask import request
-from core.libs import assertions
+from flask import current_app, request
+from core.libs import assertions, metrics
+from core.libs.cache import MISSING, TTLCache
 from functools import wraps
 
+# longer headers are rejected outright rather than used as cache keys
+MAX_PRINCIPAL_HEADER_LENGTH = 1024
+
+# raw X-Principal header -> resolved AuthPrincipal, or None for identities that do not exist;
+# sized from the PRINCIPAL_CACHE_* settings by `init_app`
+principal_cache = TTLCache(maxsize=10000, ttl=60)
+
 
 class AuthPrincipal:
-    def __init__(self, user_id, student_id=None, teacher_id=None, principal_id=None):
+    def __init__(self, user_id, student_id=None, teacher_id=None, principal_id=None, username=None):
         self.user_id = user_id
         self.student_id = student_id
         self.teacher_id = teacher_id
         self.principal_id = principal_id
+        self.username = username
+
+
+def resolve_principal(p_str):
+    """AuthPrincipal for the X-Principal header if the user and every role id it claims exist, else None"""
+    from core.models.users import User
+
+    try:
+        p_dict = json.loads(p_str)
+        claimed = {key: p_dict.get(key) for key in ('student_id', 'teacher_id', 'principal_id')}
+        if not all(isinstance(value, int) for value in [p_dict['user_id'], *claimed.values()] if value is not None):
+            return None
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None
+
+    row = User.resolve_principal(p_dict['user_id'], **claimed)
+    if row is None or any(value is not None and row._mapping[key] is None for key, value in claimed.items()):
+        return None
+
+    return AuthPrincipal(**row._mapping)
 
 
 def accept_payload(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        incoming_payload = request.json
+        with metrics.phase('validation'):
+            incoming_payload = request.json
         return func(incoming_payload, *args, **kwargs)
     return wrapper
 
@@ -24,14 +53,15 @@ def authenticate_principal(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
         p_str = request.headers.get('X-Principal')
-        assertions.assert_auth(p_str is not None, 'principal not found')
-        p_dict = json.loads(p_str)
-        p = AuthPrincipal(
-            user_id=p_dict['user_id'],
-            student_id=p_dict.get('student_id'),
-            teacher_id=p_dict.get('teacher_id'),
-            principal_id=p_dict.get('principal_id')
-        )
+        assertions.assert_auth(p_str is not None and len(p_str) <= MAX_PRINCIPAL_HEADER_LENGTH,
+                               'principal not found')
+        p = principal_cache.get(p_str)
+        if p is MISSING:
+            # only a lookup is worth an auth timing, a cache hit costs less than timing it would
+            with metrics.phase('auth'):
+                p = resolve_principal(p_str)
+                principal_cache.set(p_str, p, ttl=None if p else current_app.config['PRINCIPAL_CACHE_NEGATIVE_TTL'])
+        assertions.assert_auth(p is not None, 'principal not found')
 
         if request.path.startswith('/student'):
             assertions.assert_true(p.student_id is not None, 'requester should be a student')
@@ -44,3 +74,20 @@ def authenticate_principal(func):
 
         return func(p, *args, **kwargs)
     return wrapper
+
+
+def query_budget(max_queries):
+    """
+    Declares how many SQL statements a route may issue, counting the lookup of a principal that is
+    not cached yet. Place it under the route decorator; enforced by `query_accounting` when
+    QUERY_BUDGET_STRICT is on.
+    """
+    def decorator(func):
+        func.query_budget = max_queries
+        return func
+    return decorator
+
+
+def init_app(app):
+    """Sizes the principal cache from the PRINCIPAL_CACHE_* settings of `app`"""
+    principal_cache.configure(maxsize=app.config['PRINCIPAL_CACHE_SIZE'], ttl=app.config['PRINCIPAL_CACHE_TTL'])
@@ -1,14 +1,66 @@
-from flask import jsonify, make_response
+from itertools import islice
+
+from flask import Response, json, jsonify, make_response, stream_with_context
+
+from core.libs import metrics
 
 class APIResponse:
     @classmethod
-    def respond(cls, data=None, message=None, status_code=200):
+    def respond(cls, data=None, message=None, status_code=200, etag=None):
         response_data = {
             "status_code": status_code,
             "data": data,
             "message": message  # Include a message for all responses
         }
-        return make_response(jsonify(response_data), status_code)
+        return cls.tag(cls.encode(response_data, status_code), etag)
+
+    @classmethod
+    def respond_page(cls, data, next_cursor, message=None, status_code=200, etag=None):
+        response_data = {
+            "status_code": status_code,
+            "data": data,
+            "next_cursor": next_cursor,  # None once the last page has been served
+            "message": message
+        }
+        return cls.tag(cls.encode(response_data, status_code), etag)
+
+    @classmethod
+    def not_modified(cls, etag):
+        """304 for a conditional GET whose If-None-Match matched, see core/libs/etags.py"""
+        return cls.tag(make_response('', 304), etag)
+
+    @staticmethod
+    def encode(response_data, status_code):
+        """JSON response for `response_data`, timed as the request's encoding phase"""
+        with metrics.phase('encoding'):
+            return make_response(jsonify(response_data), status_code)
+
+    @staticmethod
+    def tag(response, etag):
+        if etag is not None:
+            response.set_etag(etag)
+        return response
+
+    @classmethod
+    def stream(cls, rows, dump, message=None, status_code=200, batch_size=500):
+        """
+        Writes the same envelope as `respond`, one batch of dumped rows at a time, so memory
+        stays flat regardless of the size of `rows`.
+        """
+        def generate():
+            yield '{{"status_code": {0}, "data": ['.format(status_code)
+            rows_iter = iter(rows)
+            separator = ''
+            while True:
+                batch = list(islice(rows_iter, batch_size))
+                if not batch:
+                    break
+                yield separator + ', '.join(json.dumps(dump(row)) for row in batch)
+                separator = ', '
+            yield '], "message": {0}}}'.format(json.dumps(message))
+
+        return Response(stream_with_context(generate()), status=status_code, mimetype='application/json')
+
     @classmethod
     def error(cls, message, status_code=400, error=None):
         response_data = {
@@ -17,4 +69,4 @@ class APIResponse:
         }
         if error is not None:
             response_data["error"] = error
-        return make_response(jsonify(response_data), status_code)
+        return cls.encode(response_data, status_code)
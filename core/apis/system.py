@@ -0,0 +1,61 @@
+"""Routes outside the role blueprints, and the error handler every route shares"""
+from flask import Response, current_app, jsonify
+from marshmallow.exceptions import ValidationError
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import HTTPException
+
+from core.apis import decorators
+from core.libs import helpers, lifecycle, metrics
+from core.libs.exceptions import FyleError
+from core.libs.sql_profiler import sql_profiler
+
+
+def ready():
+    warmup = lifecycle.get_warmup(current_app)
+    if not warmup.ready:
+        return jsonify(status='warming', time=helpers.get_utc_now()), 503
+
+    response = jsonify({
+        'status': 'ready',
+        'time': helpers.get_utc_now(),
+        'principal_cache': decorators.principal_cache.stats()
+    })
+
+    return response
+
+
+def export_metrics():
+    return Response(metrics.render(current_app), content_type=metrics.CONTENT_TYPE)
+
+
+def sql_profile():
+    """Statement templates with the most time in this worker, and its recent slow statements"""
+    return jsonify(sql_profiler.report())
+
+
+def handle_error(err):
+    if isinstance(err, FyleError):
+        return jsonify(
+            error=err.__class__.__name__, message=err.message
+        ), err.status_code
+    elif isinstance(err, ValidationError):
+        return jsonify(
+            error=err.__class__.__name__, message=err.messages
+        ), 400
+    elif isinstance(err, IntegrityError):
+        return jsonify(
+            error=err.__class__.__name__, message=str(err.orig)
+        ), 400
+    elif isinstance(err, HTTPException):
+        return jsonify(
+            error=err.__class__.__name__, message=str(err)
+        ), err.code
+
+    raise err
+
+
+def init_app(app):
+    app.add_url_rule('/', 'ready', ready)
+    app.add_url_rule('/metrics', 'metrics', export_metrics)
+    app.add_url_rule('/sql-profile', 'sql_profile', sql_profile)
+    app.register_error_handler(Exception, handle_error)
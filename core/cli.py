@@ -0,0 +1,86 @@
+"""flask subcommands, registered by `create_app` in core/__init__.py"""
+import time
+
+import click
+from flask.cli import AppGroup
+
+from core import db
+from core.libs import seeding
+from core.models.counters import AssignmentCounter
+
+counters_cli = AppGroup('counters', help='Assignment counters kept by triggers on the assignments table.')
+
+
+@counters_cli.command('check')
+def check_counters():
+    """Recounts assignments and reports every counter that differs; exits 1 if any does."""
+    mismatches = AssignmentCounter.find_mismatches()
+    for (teacher_id, state, grade, student_id), stored, counted in mismatches:
+        click.echo('teacher_id={0} state={1} grade={2} student_id={3}: stored {4}, counted {5}'.format(
+            teacher_id, state, grade or '-', student_id, stored, counted))
+
+    if mismatches:
+        raise click.exceptions.Exit(1)
+    click.echo('assignment counters are consistent')
+
+
+@counters_cli.command('rebuild')
+def rebuild_counters():
+    """Recounts every counter from the assignments table."""
+    AssignmentCounter.rebuild()
+    db.session.commit()
+    click.echo('assignment counters rebuilt')
+
+
+def distribution_option(allowed):
+    def callback(ctx, param, value):
+        try:
+            return seeding.parse_distribution(value, allowed)
+        except ValueError as err:
+            raise click.BadParameter(str(err))
+    return callback
+
+
+def format_distribution(distribution):
+    return ','.join('{0}={1}'.format(key, weight) for key, weight in distribution.items())
+
+
+@click.command('seed')
+@click.option('--assignments', default=100000, show_default=True, help='Assignments to add.')
+@click.option('--students', default=1000, show_default=True, help='Students to add.')
+@click.option('--teachers', default=50, show_default=True, help='Teachers to add.')
+@click.option('--principals', default=2, show_default=True, help='Principals to add.')
+@click.option('--states', default=format_distribution(seeding.DEFAULT_STATES), show_default=True,
+              callback=distribution_option(seeding.VALID_STATES), help='Relative weights of the states.')
+@click.option('--grades', default=format_distribution(seeding.DEFAULT_GRADES), show_default=True,
+              callback=distribution_option(seeding.VALID_GRADES), help='Relative weights of the grades.')
+@click.option('--start', type=click.DateTime(['%Y-%m-%d']), help='Earliest created_at, default 300 days before --end.')
+@click.option('--end', type=click.DateTime(['%Y-%m-%d']), default='2025-06-30', show_default=True,
+              help='Latest created_at / updated_at.')
+@click.option('--student-skew', default=0.0, show_default=True,
+              help='Zipf exponent of assignments per student, 0 for uniform.')
+@click.option('--teacher-skew', default=0.0, show_default=True,
+              help='Zipf exponent of assignments per teacher, 0 for uniform.')
+@click.option('--chunk-size', default=10000, show_default=True, help='Rows per executemany.')
+@click.option('--transaction-size', default=200000, show_default=True, help='Rows per transaction.')
+@click.option('--seed', 'random_seed', default=0, show_default=True, help='Same seed, same rows.')
+def seed_command(assignments, students, teachers, principals, states, grades, start, end, student_skew,
+                 teacher_skew, chunk_size, transaction_size, random_seed):
+    """Adds synthetic users and assignments for capacity tests."""
+    started = time.perf_counter()
+
+    def progress(done):
+        if done % transaction_size < chunk_size or done == assignments:
+            click.echo('{0}/{1} assignments'.format(done, assignments))
+
+    try:
+        created = seeding.seed(
+            db.engine, assignments, students=students, teachers=teachers, principals=principals, states=states,
+            grades=grades, start=start, end=end, student_skew=student_skew, teacher_skew=teacher_skew,
+            chunk_size=chunk_size, transaction_size=transaction_size, seed=random_seed, progress=progress)
+    except ValueError as err:
+        raise click.UsageError(str(err))
+
+    elapsed = time.perf_counter() - started
+    click.echo('added {0} students, {1} teachers, {2} principals and {3} assignments in {4:.1f}s'.format(
+        *(len(created[role]) for role in seeding.ROLES), assignments, elapsed))
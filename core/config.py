@@ -0,0 +1,197 @@
+"""
+Storage configuration. A profile (APP_DB_PROFILE) picks the SQLite pragmas and pool settings; any
+single setting can then be overridden from the environment, e.g. SQLITE_SYNCHRONOUS=FULL.
+"""
+import os
+
+from sqlalchemy.pool import NullPool, QueuePool
+
+DEFAULT_DATABASE_URL = 'sqlite:///./store.sqlite3'
+DEFAULT_PROFILE = 'wal'
+
+PROFILES = {
+    # what the app ran with before profiles existed: rollback journal, a connection per checkout
+    'legacy': {
+        'pool_size': 0, 'max_overflow': 0, 'pool_timeout': 30, 'pool_recycle': -1,
+        'journal_mode': 'DELETE', 'synchronous': 'FULL', 'busy_timeout': 5000,
+        'mmap_size': 0, 'cache_size': -2000, 'temp_store': 'DEFAULT',
+    },
+    # readers never block behind the writer; a crash can lose the last transactions, not corrupt the file
+    'wal': {
+        'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 30, 'pool_recycle': -1,
+        'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024, 'cache_size': -16000, 'temp_store': 'MEMORY',
+    },
+    # WAL with an fsync on every commit, and more patience with concurrent writers
+    'durable': {
+        'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 30, 'pool_recycle': -1,
+        'journal_mode': 'WAL', 'synchronous': 'FULL', 'busy_timeout': 15000,
+        'mmap_size': 256 * 1024 * 1024, 'cache_size': -16000, 'temp_store': 'MEMORY',
+    },
+    # read heavy workers: the whole database mapped and a large page cache
+    'read_heavy': {
+        'pool_size': 10, 'max_overflow': 20, 'pool_timeout': 30, 'pool_recycle': -1,
+        'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 5000,
+        'mmap_size': 1024 * 1024 * 1024, 'cache_size': -64000, 'temp_store': 'MEMORY',
+    },
+}
+
+# pragma -> allowed values, None for integers. Ordered: busy_timeout has to be in place before
+# journal_mode, which takes a lock when switching.
+SQLITE_PRAGMAS = {
+    'busy_timeout': None,
+    'journal_mode': ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'),
+    'synchronous': ('OFF', 'NORMAL', 'FULL', 'EXTRA'),
+    'cache_size': None,
+    'mmap_size': None,
+    'temp_store': ('DEFAULT', 'FILE', 'MEMORY'),
+}
+
+POOL_SETTINGS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle')
+
+
+def _override(settings, key, environ):
+    value = environ.get('DB_' + key.upper()) if key in POOL_SETTINGS else environ.get('SQLITE_' + key.upper())
+    if value is None:
+        return settings[key]
+
+    allowed = SQLITE_PRAGMAS.get(key)
+    if allowed is not None:
+        if value.upper() not in allowed:
+            raise ValueError('{0} should be one of {1}, got {2!r}'.format(key, ', '.join(allowed), value))
+        return value.upper()
+
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError('{0} should be an integer, got {1!r}'.format(key, value))
+
+
+def get_settings(environ=os.environ):
+    """Settings of the selected profile with environment overrides applied"""
+    name = environ.get('APP_DB_PROFILE', DEFAULT_PROFILE)
+    if name not in PROFILES:
+        raise ValueError('unknown APP_DB_PROFILE {0!r}, expected one of {1}'.format(name, ', '.join(PROFILES)))
+
+    profile = PROFILES[name]
+    settings = {key: _override(profile, key, environ) for key in profile}
+    settings['profile'] = name
+    settings['database_url'] = environ.get('DATABASE_URL', DEFAULT_DATABASE_URL)
+    return settings
+
+
+def get_engine_options(settings):
+    if not settings['database_url'].startswith('sqlite'):
+        return {key: settings[key] for key in POOL_SETTINGS}
+
+    if not settings['pool_size']:
+        return {'poolclass': NullPool, 'connect_args': {'timeout': settings['busy_timeout'] / 1000}}
+
+    # pooled sqlite connections are handed to whichever thread checks them out next
+    return {
+        'poolclass': QueuePool,
+        'connect_args': {'timeout': settings['busy_timeout'] / 1000, 'check_same_thread': False},
+        **{key: settings[key] for key in POOL_SETTINGS},
+    }
+
+
+def get_sqlite_pragmas(settings):
+    """PRAGMA statements to run on every new SQLite connection"""
+    pragmas = ['PRAGMA {0}={1};'.format(key, settings[key]) for key in SQLITE_PRAGMAS]
+    # not part of any profile: the schema relies on it
+    pragmas.append('PRAGMA foreign_keys=ON;')
+    return pragmas
+
+
+def get_replication_settings(environ=os.environ):
+    """Follower files (comma separated in REPLICATION_FOLLOWERS, relative to core/) and their freshness"""
+    return {
+        'REPLICATION_FOLLOWERS': [path.strip() for path in environ.get('REPLICATION_FOLLOWERS', '').split(',')
+                                  if path.strip()],
+        'REPLICATION_MAX_STALENESS': float(environ.get('REPLICATION_MAX_STALENESS', 2.0)),
+        'REPLICATION_SYNC_INTERVAL': float(environ.get('REPLICATION_SYNC_INTERVAL', 0.5)),
+    }
+
+
+def get_principal_cache_settings(environ=os.environ):
+    """Sizing of the X-Principal resolution cache in core/apis/decorators.py; unknown identities expire sooner"""
+    return {
+        'PRINCIPAL_CACHE_SIZE': int(environ.get('PRINCIPAL_CACHE_SIZE', 10000)),
+        'PRINCIPAL_CACHE_TTL': float(environ.get('PRINCIPAL_CACHE_TTL', 60)),
+        'PRINCIPAL_CACHE_NEGATIVE_TTL': float(environ.get('PRINCIPAL_CACHE_NEGATIVE_TTL', 5)),
+    }
+
+
+def get_compression_settings(environ=os.environ):
+    """gzip middleware in core/libs/compression.py; COMPRESSION_ENABLED=0 turns it off, e.g. behind a compressing proxy"""
+    level = int(environ.get('COMPRESSION_LEVEL', 6))
+    if not 1 <= level <= 9:
+        raise ValueError('COMPRESSION_LEVEL should be between 1 and 9, got {0}'.format(level))
+    return {
+        'COMPRESSION_ENABLED': environ.get('COMPRESSION_ENABLED', '1').lower() in ('1', 'true'),
+        'COMPRESSION_MIN_SIZE': int(environ.get('COMPRESSION_MIN_SIZE', 1024)),
+        'COMPRESSION_LEVEL': level,
+    }
+
+
+def get_reports_settings(environ=os.environ):
+    """Snapshot file behind the principal reports (relative to core/) and how often a worker refreshes it"""
+    return {
+        'REPORTS_SNAPSHOT_PATH': environ.get('REPORTS_SNAPSHOT_PATH', 'assignments.snapshot'),
+        'REPORTS_REFRESH_INTERVAL': float(environ.get('REPORTS_REFRESH_INTERVAL', 1.0)),
+    }
+
+
+def get_metrics_settings(environ=os.environ):
+    """Server-Timing and the per-route histograms in core/libs/metrics.py, kept under METRICS_DIR (relative to core/)"""
+    return {
+        'METRICS_ENABLED': environ.get('METRICS_ENABLED', '1').lower() in ('1', 'true'),
+        'METRICS_DIR': environ.get('METRICS_DIR', 'metrics'),
+    }
+
+
+def get_sql_profiler_settings(environ=os.environ):
+    """Statement profiler in core/libs/sql_profiler.py: the share of statements counted and what counts as slow"""
+    sample_rate = float(environ.get('SQL_PROFILER_SAMPLE_RATE', 0.1))
+    if not 0 <= sample_rate <= 1:
+        raise ValueError('SQL_PROFILER_SAMPLE_RATE should be between 0 and 1, got {0}'.format(sample_rate))
+    return {
+        'SQL_PROFILER_ENABLED': environ.get('SQL_PROFILER_ENABLED', '1').lower() in ('1', 'true'),
+        'SQL_PROFILER_SAMPLE_RATE': sample_rate,
+        'SQL_PROFILER_SLOW_MS': float(environ.get('SQL_PROFILER_SLOW_MS', 100)),
+        'SQL_PROFILER_MAX_TEMPLATES': int(environ.get('SQL_PROFILER_MAX_TEMPLATES', 500)),
+        'SQL_PROFILER_SLOW_LOG_SIZE': int(environ.get('SQL_PROFILER_SLOW_LOG_SIZE', 100)),
+    }
+
+
+def get_warmup_settings(environ=os.environ):
+    """WARMUP_ENABLED holds the readiness route at 503 until the worker warmed up, see core/libs/lifecycle.py"""
+    return {
+        'WARMUP_ENABLED': environ.get('WARMUP_ENABLED', '0').lower() in ('1', 'true'),
+    }
+
+
+def get_threadpool_size(environ=os.environ):
+    """Native threads per gevent worker running sqlite3 calls, see core/libs/cooperative.py"""
+    size = int(environ.get('DB_THREADPOOL_SIZE', 10))
+    if size < 1:
+        raise ValueError('DB_THREADPOOL_SIZE should be at least 1, got {0}'.format(size))
+    return size
+
+
+def load(environ=os.environ):
+    """Flask config for the storage layer"""
+    settings = get_settings(environ)
+    return {
+        'DB_PROFILE': settings['profile'],
+        'SQLALCHEMY_DATABASE_URI': settings['database_url'],
+        'SQLALCHEMY_ENGINE_OPTIONS': get_engine_options(settings),
+        'SQLITE_PRAGMAS': get_sqlite_pragmas(settings),
+        **get_replication_settings(environ),
+        **get_principal_cache_settings(environ),
+        **get_compression_settings(environ),
+        **get_reports_settings(environ),
+        **get_metrics_settings(environ),
+        **get_sql_profiler_settings(environ),
+        **get_warmup_settings(environ),
+    }
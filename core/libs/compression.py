@@ -0,0 +1,102 @@
+import zlib
+
+from werkzeug.http import parse_accept_header
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+# compressing a body smaller than this costs more than it saves
+DEFAULT_MINIMUM_SIZE = 1024
+DEFAULT_LEVEL = 6
+
+
+def accepts_gzip(environ):
+    return parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING')).quality('gzip') > 0
+
+
+def weaken(etag):
+    """A gzipped body is not byte-for-byte the entity the strong validator was computed for"""
+    return etag if etag.startswith('W/') else 'W/' + etag
+
+
+def add_vary(headers):
+    """Vary: Accept-Encoding, merged into a Vary header the app already sent"""
+    for index, (name, value) in enumerate(headers):
+        if name.lower() == 'vary':
+            if 'accept-encoding' not in value.lower():
+                headers[index] = (name, value + ', Accept-Encoding')
+            return
+    headers.append(('Vary', 'Accept-Encoding'))
+
+
+class GzipMiddleware:
+    """
+    WSGI middleware gzipping JSON and text responses for clients that accept it. Responses with a
+    Content-Length below `minimum_size` are left alone; responses without one (streams) are
+    compressed chunk by chunk, flushing after each so clients still receive rows as they are
+    produced. ETags are sent weak whenever gzip was negotiated, so a 304 carries the same validator
+    as the compressed 200 it confirms. Since body and ETag both depend on Accept-Encoding, every
+    response of a compressible type (and every 304) says so in Vary, compressed or not.
+    """
+
+    def __init__(self, app, minimum_size=DEFAULT_MINIMUM_SIZE, level=DEFAULT_LEVEL):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+
+    def __call__(self, environ, start_response):
+        captured = {}
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured.update(status=status, headers=headers, exc_info=exc_info)
+            return lambda data: None
+
+        app_iter = self.app(environ, capture_start_response)
+        status, headers = captured['status'], captured['headers']
+
+        negotiated = accepts_gzip(environ)
+        compress = negotiated and self.should_compress(environ, status, headers)
+        if negotiated:
+            headers = [
+                (name, weaken(value) if name.lower() == 'etag' else value) for name, value in headers
+                if not (compress and name.lower() == 'content-length')
+            ]
+        if compress:
+            headers.append(('Content-Encoding', 'gzip'))
+        if status.startswith('304') or self.is_compressible(headers):
+            add_vary(headers)
+
+        start_response(status, headers, captured['exc_info'])
+        if not compress:
+            return app_iter
+        return self.compressed(app_iter)
+
+    def should_compress(self, environ, status, headers):
+        if not status.startswith('200') or environ['REQUEST_METHOD'] == 'HEAD':
+            return False
+
+        lowered = {name.lower(): value for name, value in headers}
+        if 'content-encoding' in lowered or 'no-transform' in lowered.get('cache-control', ''):
+            return False
+        if not self.is_compressible(headers):
+            return False
+
+        content_length = lowered.get('content-length')
+        return content_length is None or int(content_length) >= self.minimum_size
+
+    @staticmethod
+    def is_compressible(headers):
+        return any(name.lower() == 'content-type' and value.startswith(COMPRESSIBLE_TYPES) for name, value in headers)
+
+    def compressed(self, app_iter):
+        # wbits 31: gzip container rather than raw zlib
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        try:
+            for chunk in app_iter:
+                data = compressor.compress(chunk)
+                data += compressor.flush(zlib.Z_SYNC_FLUSH)
+                if data:
+                    yield data
+            yield compressor.flush(zlib.Z_FINISH)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
@@ -0,0 +1,121 @@
+"""
+Support for gevent workers (GUNICORN_WORKER_CLASS=gevent).
+
+gunicorn_config.py monkey-patches the standard library before anything else is imported. Once
+that has happened, sessions are scoped to the current greenlet and every sqlite3 call runs on a
+bounded pool of native threads: the sqlite3 module releases the GIL but not the gevent hub, so
+without this one slow query would stall every other connection of the worker.
+"""
+import functools
+import os
+import sqlite3
+import sys
+
+from core import config
+
+_threadpool = None
+_threadpool_pid = None
+
+# rows fetched per trip to the thread pool when a cursor is iterated
+ITER_BATCH_SIZE = 256
+
+
+def is_patched():
+    """Whether gevent has monkey-patched this process"""
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+def get_threadpool():
+    """Native threads sqlite3 calls are run on, one pool per worker process"""
+    global _threadpool, _threadpool_pid
+    if _threadpool is None or _threadpool_pid != os.getpid():
+        from gevent.threadpool import ThreadPool
+
+        _threadpool, _threadpool_pid = ThreadPool(maxsize=config.get_threadpool_size()), os.getpid()
+    return _threadpool
+
+
+def offload(func, *args):
+    """Runs `func` on the thread pool; the calling greenlet yields to the hub until it returns"""
+    return get_threadpool().apply(func, args)
+
+
+class OffloadedCursor(sqlite3.Cursor):
+    """sqlite3 cursor whose statements and fetches, iteration included, run on the thread pool"""
+
+    def __iter__(self):
+        # a batch of rows per trip to the pool rather than a row
+        while True:
+            rows = self.fetchmany(ITER_BATCH_SIZE)
+            if not rows:
+                return
+            yield from rows
+
+    def __next__(self):
+        return offload(super().__next__)
+
+    def execute(self, *args):
+        return offload(super().execute, *args)
+
+    def executemany(self, *args):
+        return offload(super().executemany, *args)
+
+    def executescript(self, *args):
+        return offload(super().executescript, *args)
+
+    def fetchone(self):
+        return offload(super().fetchone)
+
+    def fetchmany(self, *args):
+        return offload(super().fetchmany, *args)
+
+    def fetchall(self):
+        return offload(super().fetchall)
+
+
+class OffloadedConnection(sqlite3.Connection):
+    """sqlite3 connection whose statements, commits and rollbacks run on the thread pool"""
+
+    def cursor(self, factory=OffloadedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def commit(self):
+        return offload(super().commit)
+
+    def rollback(self):
+        return offload(super().rollback)
+
+    def backup(self, *args, **kwargs):
+        return offload(functools.partial(super().backup, *args, **kwargs))
+
+
+def sqlite_factory():
+    """`factory` for sqlite3.connect: offloading under gevent, the plain connection otherwise"""
+    return OffloadedConnection if is_patched() else sqlite3.Connection
+
+
+def engine_options(options):
+    """SQLALCHEMY_ENGINE_OPTIONS with the offloading connection factory when running under gevent"""
+    if not is_patched():
+        return options
+
+    connect_args = dict(options.get('connect_args', {}))
+    # a connection is handed from the greenlet to whichever pool thread runs the statement
+    connect_args.update(factory=OffloadedConnection, check_same_thread=False)
+    return dict(options, connect_args=connect_args)
+
+
+def session_options():
+    """Flask-SQLAlchemy session options: one session per greenlet under gevent"""
+    if not is_patched():
+        return {}
+
+    from greenlet import getcurrent
+    return {'scopefunc': getcurrent}
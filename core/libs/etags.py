@@ -0,0 +1,18 @@
+import hashlib
+
+from flask import request
+
+
+def make_etag(*parts):
+    """
+    Validator for a representation fully determined by `parts` and the request URL. The URL
+    carries the route, the page and the field set, `parts` the principal's scope and the version
+    of the data.
+    """
+    key = '|'.join(str(part) for part in (request.full_path, *parts))
+    return hashlib.sha1(key.encode('utf8')).hexdigest()[:32]
+
+
+def is_fresh(etag):
+    """Whether If-None-Match already names `etag`. Weak comparison, as required for If-None-Match"""
+    return request.if_none_match.contains_weak(etag)
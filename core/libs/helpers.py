@@ -1,5 +1,7 @@
+import fcntl
 import random
 import string
+from contextlib import contextmanager
 from datetime import datetime
 
 TIMESTAMP_WITH_TIMEZONE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f%z'
@@ -13,3 +15,14 @@ class GeneralObject:
 
 def get_utc_now():
     return datetime.utcnow()
+
+
+@contextmanager
+def file_lock(path, operation):
+    """flock on a side file, `path` + '.lock', so that `path` itself can be replaced"""
+    with open(path + '.lock', 'a') as lock:
+        fcntl.flock(lock, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
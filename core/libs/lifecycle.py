@@ -0,0 +1,115 @@
+"""
+Worker lifecycle under the production gunicorn profile (gunicorn_config.py).
+
+The master preloads the app, so a forked worker first drops the connection pools it inherited,
+then warms itself up: opens its pool, runs the queries and serializers of the list routes once,
+and loads the directory and report snapshot. With WARMUP_ENABLED the readiness route answers 503
+until that is done, so a load balancer only sends traffic to warm workers.
+"""
+import threading
+import time
+
+from core import db
+
+
+class Warmup:
+    def __init__(self, required):
+        self.done = threading.Event()
+        self.duration = None
+        self.error = None
+        if not required:
+            self.done.set()
+
+    @property
+    def ready(self):
+        return self.done.is_set()
+
+
+def get_warmup(app):
+    return app.extensions['warmup']
+
+
+def after_fork(app):
+    """
+    New pools for the primary and follower engines. Connections opened before the fork are the
+    master's: closing them from a worker would break them for the master, so they are left alone.
+    """
+    engines = [db.get_engine(app), *app.extensions['replication'].engines]
+    for engine in engines:
+        engine.pool = engine.pool.recreate()
+
+
+def warm_pool(engine):
+    """Opens as many connections as the pool keeps, each with the storage profile's pragmas applied"""
+    size = getattr(engine.pool, 'size', None)
+    if size is None:
+        return
+    connections = [engine.connect() for _ in range(size())]
+    for connection in connections:
+        connection.exec_driver_sql('SELECT 1')
+        connection.close()
+
+
+def warm_queries():
+    """The statements, compiled serializers and worker-local caches the read routes use"""
+    from core.apis.assignments.schema import ASSIGNMENT_SUMMARY_FIELDS, AssignmentSchema, TeacherSchema, \
+        assignment_serializer
+    from core.models.assignments import Assignment
+    from core.models.counters import AssignmentCounter, AssignmentVersion
+    from core.models.directory import directory
+    from core.models.reports import assignment_snapshot
+
+    teachers, students = directory.get_teachers(), directory.get_students()
+    TeacherSchema().dump(teachers, many=True)
+
+    pages = [Assignment.get_all_graded_and_submitted_assignments()[0]]
+    AssignmentVersion.get(AssignmentVersion.REVIEWABLE)
+    if students:
+        pages.append(Assignment.get_assignments_by_student(students[0].id)[0])
+        pages.append(Assignment.get_submitted_assignments_by_student(students[0].id)[0])
+        AssignmentCounter.summarize(student_id=students[0].id)
+    if teachers:
+        pages.append(Assignment.get_assignments_by_teacher(teachers[0].id)[0])
+        AssignmentCounter.summarize(teacher_id=teachers[0].id)
+
+    for page in pages:
+        assignment_serializer.dump(page, many=True)
+        assignment_serializer.only(ASSIGNMENT_SUMMARY_FIELDS).dump(page, many=True)
+    AssignmentSchema().dump(pages[0][:1], many=True)
+    assignment_snapshot.graded_per_student()
+
+
+def warm(app):
+    """Runs every warmup step, then marks the worker ready; a failed step is logged and does not keep it out"""
+    warmup = get_warmup(app)
+    started = time.perf_counter()
+    try:
+        with app.app_context():
+            try:
+                warm_pool(db.get_engine(app))
+                followers = app.extensions['replication']
+                if followers.configure():
+                    followers.ensure_syncing()
+                warm_queries()
+            finally:
+                db.session.remove()
+    except Exception as err:
+        warmup.error = repr(err)
+        app.logger.exception('warmup failed')
+    finally:
+        warmup.duration = time.perf_counter() - started
+        warmup.done.set()
+
+
+def start_warmup(app):
+    """Warms up in the background while the worker already answers the readiness route"""
+    if get_warmup(app).ready:
+        return None
+    thread = threading.Thread(target=warm, args=(app,), name='warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def init_app(app):
+    """WARMUP_ENABLED keeps the readiness route at 503 until `warm` has run"""
+    app.extensions['warmup'] = Warmup(required=app.config['WARMUP_ENABLED'])
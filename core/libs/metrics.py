@@ -0,0 +1,303 @@
+"""
+Request phase timing and per-route latency histograms.
+
+Code on the request path marks its phases with `phase(name)`; database time is what
+query_accounting measured. Every response reports them in a Server-Timing header, and they are
+added to fixed-bucket histograms in a file per worker process under METRICS_DIR, mapped into
+memory. `/metrics` sums the files of all workers into the Prometheus text format.
+
+A file holds one slot per route, phase and bucket, so its size is fixed by the url map. Files of
+workers that exited are folded into one by whoever collects next, so restarts do not pile them up.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import g, request
+
+from core.libs import query_accounting
+
+# db overlaps whichever phases issued the queries; total is the whole request up to the response
+PHASES = ('auth', 'validation', 'db', 'serialization', 'encoding', 'total')
+
+# upper bounds in seconds, +Inf comes on top
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+
+# requests no route matched, e.g. 404s
+UNMATCHED = '<unmatched>'
+
+MAGIC = b'FMET'
+FORMAT_VERSION = 1
+
+# magic, format version, layout signature
+HEADER = struct.Struct('<4sII')
+HEADER_SIZE = 16
+
+# per histogram: a count per bucket including +Inf, then the sum in nanoseconds
+HISTOGRAM_SLOTS = len(BUCKETS) + 2
+ROUTE_SLOTS = len(PHASES) * HISTOGRAM_SLOTS + len(STATUS_CLASSES)
+
+WORKER_PREFIX = 'worker-'
+SUFFIX = '.metrics'
+MERGED_NAME = 'merged' + SUFFIX
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# seconds per phase of the request being timed; None when metrics are off or outside a request.
+# A context variable rather than `g`, whose proxy lookup costs more than most timed blocks
+phase_times = ContextVar('phase_times', default=None)
+
+
+class phase:
+    """Adds the time spent in the block to `name` in the current request; a no-op when nothing is timed"""
+
+    __slots__ = ('name', 'timings', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.timings = phase_times.get()
+        if self.timings is not None:
+            self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.timings is not None:
+            self.timings[self.name] = self.timings.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+class Layout:
+    """Where each route's histograms and status counters live in a metrics file"""
+
+    def __init__(self, endpoints):
+        self.endpoints = tuple(sorted(endpoints)) + (UNMATCHED,)
+        self.positions = {endpoint: position for position, endpoint in enumerate(self.endpoints)}
+        self.slots = len(self.endpoints) * ROUTE_SLOTS
+        # files written by a different url map or bucket set are not summed with this one
+        self.signature = zlib.crc32(repr((self.endpoints, PHASES, BUCKETS, STATUS_CLASSES)).encode('utf8'))
+
+    @property
+    def file_size(self):
+        return HEADER_SIZE + 8 * self.slots
+
+    def route_offset(self, endpoint):
+        return self.positions.get(endpoint, self.positions[UNMATCHED]) * ROUTE_SLOTS
+
+    @staticmethod
+    def histogram_offset(phase_name):
+        return PHASES.index(phase_name) * HISTOGRAM_SLOTS
+
+    @staticmethod
+    def status_offset(status_code):
+        return len(PHASES) * HISTOGRAM_SLOTS + min(max(status_code // 100, 1), len(STATUS_CLASSES)) - 1
+
+
+def map_values(path, layout):
+    """Writable view of the slots in the file at `path`, zeroed first unless it already has this layout"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if os.fstat(fd).st_size != layout.file_size or \
+                HEADER.unpack(os.pread(fd, HEADER.size, 0)) != (MAGIC, FORMAT_VERSION, layout.signature):
+            os.ftruncate(fd, 0)
+            os.ftruncate(fd, layout.file_size)
+            os.pwrite(fd, HEADER.pack(MAGIC, FORMAT_VERSION, layout.signature), 0)
+        buffer = mmap.mmap(fd, layout.file_size)
+    finally:
+        os.close(fd)
+    return memoryview(buffer)[HEADER_SIZE:].cast('Q')
+
+
+def read_values(path, layout):
+    """Slots of the file at `path`, None when it is gone or was written with another layout"""
+    try:
+        with open(path, 'rb') as metrics_file:
+            data = metrics_file.read()
+    except FileNotFoundError:
+        return None
+    if len(data) != layout.file_size or HEADER.unpack_from(data) != (MAGIC, FORMAT_VERSION, layout.signature):
+        return None
+    values = array('Q')
+    values.frombytes(data[HEADER_SIZE:])
+    return values
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextmanager
+def directory_lock(directory):
+    """Held while collecting, so two workers never fold the same exited worker's file twice"""
+    with open(os.path.join(directory, '.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class MetricsStore:
+    """This worker's file, written on every request; opened again after a fork or a change of METRICS_DIR"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.key = None
+        self.values = None
+
+    def _values(self, directory, layout):
+        key = (os.getpid(), directory, layout.signature)
+        if key != self.key:
+            os.makedirs(directory, exist_ok=True)
+            # a file left by an exited worker with the same pid is simply carried on
+            path = os.path.join(directory, '{0}{1}{2}'.format(WORKER_PREFIX, os.getpid(), SUFFIX))
+            self.values, self.key = map_values(path, layout), key
+        return self.values
+
+    def record(self, directory, layout, endpoint, status_code, timings):
+        with self.lock:
+            values = self._values(directory, layout)
+            route = layout.route_offset(endpoint)
+            for phase_name, seconds in timings.items():
+                offset = route + layout.histogram_offset(phase_name)
+                values[offset + bisect_left(BUCKETS, seconds)] += 1
+                values[offset + HISTOGRAM_SLOTS - 1] += int(seconds * 1e9)
+            values[route + layout.status_offset(status_code)] += 1
+
+    @staticmethod
+    def collect(directory, layout):
+        """Slots summed over every worker, live or exited"""
+        os.makedirs(directory, exist_ok=True)
+        totals = [0] * layout.slots
+        with directory_lock(directory):
+            names = [name for name in os.listdir(directory) if name.endswith(SUFFIX)]
+            for name in names:
+                pid = name[len(WORKER_PREFIX):-len(SUFFIX)]
+                if not name.startswith(WORKER_PREFIX) or not pid.isdigit() or is_alive(int(pid)):
+                    continue
+                path = os.path.join(directory, name)
+                values = read_values(path, layout)
+                if values is not None:
+                    merged = map_values(os.path.join(directory, MERGED_NAME), layout)
+                    for slot, value in enumerate(values):
+                        merged[slot] += value
+                    merged.release()
+                os.unlink(path)
+
+            for name in os.listdir(directory):
+                values = read_values(os.path.join(directory, name), layout) if name.endswith(SUFFIX) else None
+                if values is not None:
+                    totals = [total + value for total, value in zip(totals, values)]
+        return totals
+
+
+metrics_store = MetricsStore()
+
+
+def get_layout(app):
+    # built on first use, once every blueprint is registered
+    layout = app.extensions.get('metrics_layout')
+    if layout is None:
+        layout = app.extensions['metrics_layout'] = Layout(app.view_functions)
+    return layout
+
+
+def get_directory(app):
+    return os.path.join(app.root_path, app.config['METRICS_DIR'])
+
+
+def get_request_timings():
+    """Seconds per phase of the current request so far"""
+    timings = dict(phase_times.get() or {})
+    query_time = query_accounting.get_request_stats()[1]
+    if query_time:
+        timings['db'] = query_time
+    if 'request_started' in g:
+        timings['total'] = time.perf_counter() - g.request_started
+    return timings
+
+
+def format_server_timing(timings):
+    return ', '.join('{0};dur={1:.3f}'.format(name, timings[name] * 1000) for name in PHASES if name in timings)
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(app):
+    """Prometheus text exposition of the histograms and counters of every worker"""
+    layout = get_layout(app)
+    totals = metrics_store.collect(get_directory(app), layout)
+    histograms = [
+        '# HELP http_request_phase_seconds Time spent in each phase of a request, by route',
+        '# TYPE http_request_phase_seconds histogram',
+    ]
+    requests = [
+        '# HELP http_requests_total Responses sent, by route and status class',
+        '# TYPE http_requests_total counter',
+    ]
+    for endpoint in layout.endpoints:
+        route = layout.route_offset(endpoint)
+        for phase_name in PHASES:
+            offset = route + layout.histogram_offset(phase_name)
+            counts = totals[offset:offset + len(BUCKETS) + 1]
+            if not any(counts):
+                continue
+            labels = 'endpoint="{0}",phase="{1}"'.format(escape(endpoint), phase_name)
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += count
+                histograms.append('http_request_phase_seconds_bucket{{{0},le="{1}"}} {2}'.format(
+                    labels, bound, cumulative))
+            histograms.append('http_request_phase_seconds_sum{{{0}}} {1}'.format(
+                labels, totals[offset + HISTOGRAM_SLOTS - 1] / 1e9))
+            histograms.append('http_request_phase_seconds_count{{{0}}} {1}'.format(labels, cumulative))
+
+        for status_class in STATUS_CLASSES:
+            count = totals[route + layout.status_offset(int(status_class[0]) * 100)]
+            if count:
+                requests.append('http_requests_total{{endpoint="{0}",status="{1}"}} {2}'.format(
+                    escape(endpoint), status_class, count))
+    return '\n'.join(histograms + requests) + '\n'
+
+
+def init_app(app):
+    """
+    Server-Timing on every response and the per-route histograms behind `/metrics`, unless
+    METRICS_ENABLED is off. Register after the blueprints.
+    """
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    @app.before_request
+    def start_timing():
+        g.request_started = time.perf_counter()
+        phase_times.set({})
+
+    @app.teardown_request
+    def stop_timing(exc):
+        # workers reuse threads and greenlets, whose context outlives the request
+        phase_times.set(None)
+
+    @app.after_request
+    def record_timing(response):
+        timings = get_request_timings()
+        response.headers['Server-Timing'] = format_server_timing(timings)
+        metrics_store.record(get_directory(app), get_layout(app), request.endpoint, response.status_code, timings)
+        return response
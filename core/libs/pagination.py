@@ -0,0 +1,40 @@
+import base64
+import binascii
+from datetime import datetime
+
+from core.libs import assertions
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+CURSOR_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def encode_cursor(created_at, _id):
+    """Opaque cursor pointing just after the row keyed (created_at, id)"""
+    raw = '{0}|{1}'.format(created_at.strftime(CURSOR_TIMESTAMP_FORMAT), _id)
+    return base64.urlsafe_b64encode(raw.encode('utf8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, _id = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf8').split('|')
+        return datetime.strptime(created_at, CURSOR_TIMESTAMP_FORMAT), int(_id)
+    except (ValueError, UnicodeError, binascii.Error):
+        assertions.assert_valid(False, 'invalid cursor')
+
+
+def get_page_args(args):
+    """Reads `limit` and `cursor` from the query string"""
+    limit = args.get('limit', str(DEFAULT_PAGE_SIZE))
+    assertions.assert_valid(limit.isdigit() and 0 < int(limit) <= MAX_PAGE_SIZE,
+                            'limit should be between 1 and {0}'.format(MAX_PAGE_SIZE))
+
+    cursor = args.get('cursor')
+    return int(limit), (decode_cursor(cursor) if cursor else None)
+
+
+def is_stream_requested(args):
+    """`?stream=true` asks for the whole result set as a streamed response instead of one page"""
+    return args.get('stream', '').lower() in ('1', 'true')
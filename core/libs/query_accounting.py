@@ -0,0 +1,79 @@
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# a SELECT issued this many times by one request is almost always a lazy load in a loop
+N_PLUS_ONE_THRESHOLD = 3
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised at the end of a request that broke its route's budget, when QUERY_BUDGET_STRICT is on"""
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+    if not has_request_context():
+        return
+
+    if 'query_count' not in g:
+        g.query_count, g.query_time, g.query_statements = 0, 0.0, Counter()
+    g.query_count += 1
+    g.query_time += elapsed
+    g.query_statements[statement] += 1
+
+
+def get_request_stats():
+    """(statement count, seconds spent in the database, Counter of statements) of the current request"""
+    return g.get('query_count', 0), g.get('query_time', 0.0), g.get('query_statements', Counter())
+
+
+def repeated_selects(statements, threshold=N_PLUS_ONE_THRESHOLD):
+    return {
+        statement: count for statement, count in statements.items()
+        if count >= threshold and statement.lstrip().upper().startswith('SELECT')
+    }
+
+
+def get_query_budget(app):
+    """Budget declared with `decorators.query_budget` on the view serving the current request, if any"""
+    view = app.view_functions.get(request.endpoint)
+    return getattr(view, 'query_budget', None)
+
+
+def init_app(app):
+    """
+    Counts statements and database time per request. QUERY_ACCOUNTING_HEADERS (on by default in
+    debug) reports them as X-Query-Count / X-Query-Time; QUERY_BUDGET_STRICT fails requests that
+    go over their route's budget or repeat a SELECT.
+    """
+    app.config.setdefault('QUERY_ACCOUNTING_HEADERS', False)
+    app.config.setdefault('QUERY_BUDGET_STRICT', False)
+
+    @app.after_request
+    def account_queries(response):
+        count, elapsed, statements = get_request_stats()
+        if app.debug or app.config['QUERY_ACCOUNTING_HEADERS']:
+            response.headers['X-Query-Count'] = str(count)
+            response.headers['X-Query-Time'] = '{0:.3f}ms'.format(elapsed * 1000)
+
+        if app.config['QUERY_BUDGET_STRICT']:
+            budget = get_query_budget(app)
+            if budget is not None and count > budget:
+                raise QueryBudgetExceeded('{0} {1} issued {2} queries, budget is {3}'.format(
+                    request.method, request.path, count, budget))
+
+            repeated = repeated_selects(statements)
+            if repeated:
+                raise QueryBudgetExceeded('{0} {1} repeated a SELECT, likely N+1: {2}'.format(
+                    request.method, request.path, repeated))
+
+        return response
@@ -0,0 +1,383 @@
+"""
+Read replicas for the SQLite primary.
+
+Triggers on the replicated tables append (table, row id) to `change_log`; they only exist while
+followers are configured, so nothing is logged when replication is off. Followers are copies of
+the primary file that remember the last change log position they applied; `sync` brings one up to
+date by copying the current version of every changed row out of the primary. Any schema change on
+the primary, the triggers coming and going included, makes the followers rebuild. GET requests on
+the blueprints are served by a follower that is fresh enough for the requesting principal.
+"""
+import fcntl
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event, orm, text
+from sqlalchemy.pool import QueuePool
+
+from core.libs import cooperative, helpers
+
+REPLICATED_TABLES = ('assignments', 'teachers', 'students', 'principals')
+
+# row ids per DELETE / INSERT .. SELECT while applying changes, below SQLite's bound parameter limit
+APPLY_CHUNK_SIZE = 500
+
+# how far every follower has to get past the last prune before the primary's change log is trimmed again
+PRUNE_EVERY = 1000
+
+BUSY_TIMEOUT = 15
+
+CHANGE_LOG_EVENTS = (('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD'))
+
+CHANGE_LOG_TRIGGER = """
+CREATE TRIGGER change_log_{table}_{event} AFTER {event_upper} ON {table}
+BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('{table}', {row}.id);
+END
+"""
+
+CHANGE_LOG_TRIGGERS = {
+    'change_log_{0}_{1}'.format(table, event): CHANGE_LOG_TRIGGER.format(
+        table=table, event=event, event_upper=event.upper(), row=row)
+    for table in REPLICATED_TABLES for event, row in CHANGE_LOG_EVENTS
+}
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends a request routed to a follower (see `route_request`) to the follower's engine"""
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        engine = g.get('read_engine') if has_request_context() else None
+        if engine is not None:
+            return engine
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, isolation_level=None, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                                 factory=cooperative.sqlite_factory())
+    connection.execute('PRAGMA busy_timeout={0}'.format(BUSY_TIMEOUT * 1000))
+    return connection
+
+
+def _schema_version(connection, schema='main'):
+    """SQLite's schema cookie, changed by every CREATE, DROP and ALTER"""
+    return connection.execute('PRAGMA {0}.schema_version'.format(schema)).fetchone()[0]
+
+
+def set_change_log(primary_path, enabled):
+    """
+    Creates the change log triggers on the primary, or drops them and empties the log and the
+    principals' write positions; a no-op when they already are as asked.
+    """
+    connection = _connect(primary_path)
+    try:
+        existing = {name for (name,) in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'change_log_%'")}
+        if existing == (set(CHANGE_LOG_TRIGGERS) if enabled else set()):
+            return
+
+        connection.execute('BEGIN IMMEDIATE')
+        for name, trigger in CHANGE_LOG_TRIGGERS.items():
+            if name in existing:
+                connection.execute('DROP TRIGGER {0}'.format(name))
+            if enabled:
+                connection.execute(trigger)
+        if not enabled:
+            connection.execute('DELETE FROM change_log')
+            connection.execute('DELETE FROM replication_writes')
+        connection.execute('COMMIT')
+    except Exception:
+        if connection.in_transaction:
+            connection.execute('ROLLBACK')
+        raise
+    finally:
+        connection.close()
+
+
+def bootstrap(primary_path, follower_path):
+    """
+    (Re)creates a follower as a consistent copy of the primary, without the change log triggers.
+    Callers hold the follower's file lock (see `Followers.sync_all`).
+    """
+    staging_path = '{0}.{1}.bootstrap'.format(follower_path, os.getpid())
+    for path in (staging_path, staging_path + '-journal'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    synced_at = time.time()
+    source, target = _connect(primary_path), _connect(staging_path)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+
+    try:
+        # the primary's, as of the copy
+        schema_version = _schema_version(target)
+        triggers = target.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'change_log_%'")
+        for (name,) in triggers.fetchall():
+            target.execute('DROP TRIGGER {0}'.format(name))
+
+        applied_seq = target.execute('SELECT coalesce(max(seq), 0) FROM change_log').fetchone()[0]
+        target.execute('DELETE FROM change_log')
+        target.execute('DELETE FROM replication_writes')
+        target.execute('CREATE TABLE replication_state (applied_seq INTEGER NOT NULL, synced_at REAL NOT NULL, '
+                       'schema_version INTEGER)')
+        target.execute('INSERT INTO replication_state VALUES (?, ?, ?)', (applied_seq, synced_at, schema_version))
+        target.execute('PRAGMA journal_mode=WAL')
+    finally:
+        target.close()
+
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(follower_path + suffix):
+            os.remove(follower_path + suffix)
+    os.replace(staging_path, follower_path)
+    return applied_seq, synced_at
+
+
+def sync(primary_path, follower_path):
+    """
+    Applies the primary's change log to a follower. Returns (applied_seq, synced_at), synced_at being
+    a time at which the follower matched the primary, or None when the follower has to be rebuilt
+    because the primary's schema changed or it pruned changes the follower never saw.
+    """
+    connection = _connect(follower_path)
+    try:
+        connection.execute('ATTACH DATABASE ? AS src', (primary_path,))
+        # the write lock on the follower keeps appliers in other workers out until COMMIT
+        connection.execute('BEGIN IMMEDIATE')
+        applied_seq, schema_version = connection.execute(
+            'SELECT applied_seq, schema_version FROM main.replication_state').fetchone()
+
+        # taken before the first read of src, which pins the snapshot of the primary for this transaction
+        synced_at = time.time()
+        if _schema_version(connection, 'src') != schema_version:
+            connection.execute('ROLLBACK')
+            return None
+
+        first_seq, last_seq = connection.execute('SELECT min(seq), max(seq) FROM src.change_log').fetchone()
+        if first_seq is not None and first_seq > applied_seq + 1:
+            connection.execute('ROLLBACK')
+            return None
+
+        if last_seq is not None and last_seq > applied_seq:
+            for table in REPLICATED_TABLES:
+                row_ids = [row_id for (row_id,) in connection.execute(
+                    'SELECT DISTINCT row_id FROM src.change_log WHERE seq > ? AND seq <= ? AND table_name = ?',
+                    (applied_seq, last_seq, table))]
+                for start in range(0, len(row_ids), APPLY_CHUNK_SIZE):
+                    chunk = row_ids[start:start + APPLY_CHUNK_SIZE]
+                    placeholders = ', '.join('?' * len(chunk))
+                    # deleted rows are simply not copied back
+                    connection.execute('DELETE FROM main.{0} WHERE id IN ({1})'.format(table, placeholders), chunk)
+                    connection.execute('INSERT INTO main.{0} SELECT * FROM src.{0} WHERE id IN ({1})'.format(
+                        table, placeholders), chunk)
+            applied_seq = last_seq
+
+        connection.execute('UPDATE main.replication_state SET applied_seq = ?, synced_at = ?', (applied_seq, synced_at))
+        connection.execute('COMMIT')
+        return applied_seq, synced_at
+    except Exception:
+        if connection.in_transaction:
+            connection.execute('ROLLBACK')
+        raise
+    finally:
+        connection.close()
+
+
+def prune(primary_path, upto_seq):
+    """Drops change log entries every follower has applied"""
+    connection = _connect(primary_path)
+    try:
+        connection.execute('DELETE FROM change_log WHERE seq <= ?', (upto_seq,))
+    finally:
+        connection.close()
+
+
+def principal_user_id():
+    """user_id of the X-Principal header, or None; rejecting bad headers is left to the route"""
+    try:
+        return int(json.loads(request.headers['X-Principal'])['user_id'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class Followers:
+    """
+    Worker-local view of the configured followers: their engines, how far each one is known to be
+    applied and the background thread keeping them in sync.
+    """
+
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+        self.lock = threading.Lock()
+        # None until the first `configure`, which brings the change log triggers in line with the settings
+        self.paths = None
+        self.engines = []
+        self.positions = []
+        # of the follower files the engines' connections were opened on
+        self.inodes = []
+        self.pruned_seq = 0
+        self.thread = None
+        self.local = threading.local()
+
+    @property
+    def primary_path(self):
+        return self.db.get_engine(self.app).url.database
+
+    def configure(self):
+        """
+        Picks up REPLICATION_FOLLOWERS, so it can be changed at runtime (tests do). Every worker is
+        expected to have the same followers: one without any turns the change log off for all.
+        """
+        paths = tuple(os.path.join(self.app.root_path, path) for path in self.app.config['REPLICATION_FOLLOWERS'])
+        if paths == self.paths:
+            return bool(paths)
+
+        with self.lock:
+            set_change_log(self.primary_path, enabled=bool(paths))
+            self.dispose()
+            self.paths = paths
+            self.engines = [self._create_engine(path) for path in paths]
+            # unknown until the first sync: nothing is routed to a follower before that
+            self.positions = [(-1, 0.0)] * len(paths)
+            self.inodes = [None] * len(paths)
+        return bool(paths)
+
+    def _create_engine(self, path):
+        pragmas = self.app.config['SQLITE_PRAGMAS']
+        engine = create_engine('sqlite:///' + path, **cooperative.engine_options({
+            'poolclass': QueuePool, 'connect_args': {'check_same_thread': False, 'timeout': BUSY_TIMEOUT}}))
+
+        @event.listens_for(engine, 'connect')
+        def _query_only(dbapi_connection, connection_record):
+            # the primary's storage profile, then read only
+            for pragma in pragmas:
+                dbapi_connection.execute(pragma)
+            dbapi_connection.execute('PRAGMA query_only=ON;')
+
+        return engine
+
+    def dispose(self):
+        for engine in self.engines:
+            engine.dispose()
+        self.engines = []
+
+    def sync_all(self):
+        if not self.configure():
+            return
+
+        primary_path = self.primary_path
+        for index, path in enumerate(self.paths):
+            # one worker at a time: a bootstrap replaces the file under the others
+            with helpers.file_lock(path, fcntl.LOCK_EX):
+                position = sync(primary_path, path) if os.path.exists(path) else None
+                if position is None:
+                    position = bootstrap(primary_path, path)
+                inode = os.stat(path).st_ino
+
+            if inode != self.inodes[index]:
+                # rebuilt, by this worker or another: pooled connections still read the old file
+                self.engines[index].dispose()
+                self.inodes[index] = inode
+            self.positions[index] = position
+
+        lowest_seq = min(applied_seq for applied_seq, _ in self.positions)
+        if lowest_seq - self.pruned_seq >= PRUNE_EVERY:
+            prune(primary_path, lowest_seq)
+            self.pruned_seq = lowest_seq
+
+    def run(self):
+        while True:
+            try:
+                self.sync_all()
+            except Exception:
+                self.app.logger.exception('replication sync failed')
+            time.sleep(self.app.config['REPLICATION_SYNC_INTERVAL'])
+
+    def ensure_syncing(self):
+        """Started lazily, so that every forked worker runs its own thread"""
+        if self.app.config['REPLICATION_SYNC_INTERVAL'] <= 0 or (self.thread and self.thread.is_alive()):
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='replication-sync', daemon=True)
+                self.thread.start()
+
+    def written_seq(self, user_id):
+        """Change log position a follower must have reached to show `user_id` their own writes"""
+        connection = getattr(self.local, 'primary', None)
+        if connection is None:
+            connection = self.local.primary = _connect(self.primary_path)
+        row = connection.execute('SELECT seq FROM replication_writes WHERE user_id = ?', (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def pick(self, required_seq):
+        """Index of a follower at least at `required_seq` and within the staleness bound, or None"""
+        oldest = time.time() - self.app.config['REPLICATION_MAX_STALENESS']
+        eligible = [
+            index for index, (applied_seq, synced_at) in enumerate(self.positions)
+            if applied_seq >= required_seq and synced_at >= oldest
+        ]
+        return random.choice(eligible) if eligible else None
+
+
+def route_request():
+    """Serves GET requests on the blueprints from a follower when one is fresh enough"""
+    followers = current_app.extensions['replication']
+    if request.method != 'GET' or request.blueprint is None or not followers.configure():
+        return
+
+    followers.ensure_syncing()
+    user_id = principal_user_id()
+    index = followers.pick(0 if user_id is None else followers.written_seq(user_id))
+    if index is not None:
+        g.read_engine = followers.engines[index]
+        g.read_replica = index
+
+
+def tag_response(response):
+    if g.get('read_replica') is not None:
+        response.headers['X-Read-Replica'] = str(g.read_replica)
+    return response
+
+
+@event.listens_for(RoutingSession, 'before_commit')
+def _record_principal_write(session):
+    """Remembers, in the same transaction, how far followers need to be for this principal to see the write"""
+    if not has_request_context() or request.method == 'GET' or not current_app.config['REPLICATION_FOLLOWERS']:
+        return
+
+    user_id = principal_user_id()
+    if user_id is not None:
+        session.execute(text(
+            'INSERT INTO replication_writes (user_id, seq) SELECT :user_id, coalesce(max(seq), 0) FROM change_log '
+            'WHERE true ON CONFLICT (user_id) DO UPDATE SET seq = excluded.seq'
+        ), {'user_id': user_id})
+
+
+def init_app(app, db):
+    """
+    Followers are off unless REPLICATION_FOLLOWERS lists their files. REPLICATION_MAX_STALENESS bounds
+    how old a follower's data may be, in seconds; REPLICATION_SYNC_INTERVAL is how often each worker
+    syncs them (0 leaves syncing to `Followers.sync_all` callers).
+    """
+    app.config.setdefault('REPLICATION_FOLLOWERS', [])
+    app.config.setdefault('REPLICATION_MAX_STALENESS', 2.0)
+    app.config.setdefault('REPLICATION_SYNC_INTERVAL', 0.5)
+    app.extensions['replication'] = Followers(app, db)
+    app.before_request(route_request)
+    app.after_request(tag_response)
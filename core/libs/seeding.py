@@ -0,0 +1,172 @@
+"""
+Synthetic data for capacity tests: users with their student, teacher or principal row, and
+assignments drawn from configurable state, grade, owner and timestamp distributions. Rows go in
+through executemany in chunks, many chunks per transaction. The same seed and options always
+produce the same rows on the same starting database.
+"""
+import random
+from datetime import datetime, timedelta
+
+from core.models.assignments import AssignmentStateEnum, GradeEnum
+
+VALID_STATES = tuple(state.value for state in AssignmentStateEnum)
+VALID_GRADES = tuple(grade.value for grade in GradeEnum)
+
+DEFAULT_STATES = {'DRAFT': 0.2, 'SUBMITTED': 0.2, 'GRADED': 0.6}
+DEFAULT_GRADES = {'A': 0.25, 'B': 0.35, 'C': 0.3, 'D': 0.1}
+
+ROLES = ('student', 'teacher', 'principal')
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+ASSIGNMENTS_INSERT = ('INSERT INTO assignments (student_id, teacher_id, content, grade, state, created_at, updated_at) '
+                      'VALUES (?, ?, ?, ?, ?, ?, ?)')
+
+# how long after creation an assignment was last touched, in seconds, by state
+UPDATE_DELAYS = {
+    AssignmentStateEnum.DRAFT.value: 2 * 3600,
+    AssignmentStateEnum.SUBMITTED.value: 3 * 24 * 3600,
+    AssignmentStateEnum.GRADED.value: 14 * 24 * 3600,
+}
+
+
+def parse_distribution(value, allowed):
+    """'A=0.5,B=0.3,C=0.2' -> {'A': 0.5, ...}; weights are relative and need not add up to 1"""
+    distribution = {}
+    for part in value.split(','):
+        key, _, weight = part.partition('=')
+        key = key.strip().upper()
+        if key not in allowed:
+            raise ValueError('{0!r} should be one of {1}'.format(key, ', '.join(allowed)))
+        try:
+            distribution[key] = float(weight)
+        except ValueError:
+            raise ValueError('weight of {0} should be a number, got {1!r}'.format(key, weight))
+        if distribution[key] < 0:
+            raise ValueError('weight of {0} should not be negative'.format(key))
+
+    if not any(distribution.values()):
+        raise ValueError('at least one weight should be positive')
+    return distribution
+
+
+def skewed_weights(count, skew):
+    """Zipf-like weights: the i-th owner is 1/i**skew as active as the first; 0 is uniform"""
+    return [1 / rank ** skew for rank in range(1, count + 1)]
+
+
+def insert_users(connection, role, count, created_at):
+    """Creates `count` users, each with a `role` row; returns the new role ids"""
+    if not count:
+        return []
+
+    first_id = connection.exec_driver_sql('SELECT coalesce(max(id), 0) + 1 FROM users').scalar()
+    user_ids = range(first_id, first_id + count)
+    timestamp = created_at.strftime(TIMESTAMP_FORMAT)
+    connection.exec_driver_sql(
+        'INSERT INTO users (id, username, email, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+        [(user_id, '{0}{1}'.format(role, user_id), '{0}{1}@fylebe.com'.format(role, user_id), timestamp, timestamp)
+         for user_id in user_ids])
+    connection.exec_driver_sql(
+        'INSERT INTO {0}s (user_id, created_at, updated_at) VALUES (?, ?, ?)'.format(role),
+        [(user_id, timestamp, timestamp) for user_id in user_ids])
+    return [row[0] for row in connection.exec_driver_sql(
+        'SELECT id FROM {0}s WHERE user_id >= ? ORDER BY id'.format(role), (first_id,))]
+
+
+def generate_assignments(rng, count, students, teachers, options):
+    """Yields lists of at most `options['chunk_size']` assignment rows for ASSIGNMENTS_INSERT"""
+    states, state_weights = zip(*options['states'].items())
+    grades, grade_weights = zip(*options['grades'].items())
+    student_weights = skewed_weights(len(students), options['student_skew'])
+    teacher_weights = skewed_weights(len(teachers), options['teacher_skew'])
+    start, step = options['start'], (options['end'] - options['start']).total_seconds() / max(count, 1)
+
+    generated = 0
+    while generated < count:
+        size = min(options['chunk_size'], count - generated)
+        # drawn a chunk at a time: choices() with k does the weighted sampling in one call
+        chunk_states = rng.choices(states, state_weights, k=size)
+        chunk_grades = rng.choices(grades, grade_weights, k=size)
+        chunk_students = rng.choices(students, student_weights, k=size)
+        chunk_teachers = rng.choices(teachers, teacher_weights, k=size) if teachers else [None] * size
+
+        chunk = []
+        for offset in range(size):
+            state = chunk_states[offset]
+            # spread evenly over the period and in id order, as rows arrive in production; that also
+            # keeps index inserts on created_at appends
+            created_at = start + timedelta(seconds=(generated + offset + rng.random()) * step)
+            updated_at = min(created_at + timedelta(seconds=rng.random() * UPDATE_DELAYS[state]), options['end'])
+            draft = state == AssignmentStateEnum.DRAFT.value
+            chunk.append((
+                chunk_students[offset],
+                None if draft else chunk_teachers[offset],
+                'assignment {0}'.format(generated + offset + 1),
+                chunk_grades[offset] if state == AssignmentStateEnum.GRADED.value else None,
+                state,
+                created_at.strftime(TIMESTAMP_FORMAT),
+                updated_at.strftime(TIMESTAMP_FORMAT),
+            ))
+        generated += size
+        yield chunk
+
+
+def seed(engine, assignments, students=0, teachers=0, principals=0, states=None, grades=None, start=None,
+         end=None, student_skew=0.0, teacher_skew=0.0, chunk_size=10000, transaction_size=200000, seed=0,
+         progress=None):
+    """
+    Adds the given numbers of users and assignments. Assignments belong to every student and (unless
+    drafts) teacher in the database, new or not. `progress(rows_done)` is called after every chunk.
+    Returns {role: new ids}.
+    """
+    rng = random.Random(seed)
+    end = end or datetime(2025, 6, 30)
+    options = {
+        'states': states or DEFAULT_STATES,
+        'grades': grades or DEFAULT_GRADES,
+        'start': start or end - timedelta(days=300),
+        'end': end,
+        'student_skew': student_skew,
+        'teacher_skew': teacher_skew,
+        'chunk_size': chunk_size,
+    }
+    if options['start'] >= end:
+        raise ValueError('start should be before end')
+
+    with engine.begin() as connection:
+        created = {
+            role: insert_users(connection, role, count, options['start'])
+            for role, count in zip(ROLES, (students, teachers, principals))
+        }
+        student_ids = [row[0] for row in connection.exec_driver_sql('SELECT id FROM students ORDER BY id')]
+        teacher_ids = [row[0] for row in connection.exec_driver_sql('SELECT id FROM teachers ORDER BY id')]
+
+    if assignments and not student_ids:
+        raise ValueError('assignments need at least one student')
+    if assignments and not teacher_ids and any(options['states'].get(state) for state in ('SUBMITTED', 'GRADED')):
+        raise ValueError('submitted and graded assignments need at least one teacher')
+
+    done = 0
+    connection = engine.connect()
+    cache_size = connection.exec_driver_sql('PRAGMA cache_size').scalar()
+    try:
+        # room for the index pages a large transaction dirties, instead of spilling them mid-transaction
+        connection.exec_driver_sql('PRAGMA cache_size=-262144')
+        transaction = connection.begin()
+        in_transaction = 0
+        for chunk in generate_assignments(rng, assignments, student_ids, teacher_ids, options):
+            connection.exec_driver_sql(ASSIGNMENTS_INSERT, chunk)
+            done += len(chunk)
+            in_transaction += len(chunk)
+            if in_transaction >= transaction_size:
+                transaction.commit()
+                transaction, in_transaction = connection.begin(), 0
+            if progress is not None:
+                progress(done)
+        transaction.commit()
+    finally:
+        # back to the profile's setting before the connection returns to the pool
+        connection.exec_driver_sql('PRAGMA cache_size={0}'.format(cache_size))
+        connection.close()
+    return created
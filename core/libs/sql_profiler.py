@@ -0,0 +1,239 @@
+"""
+Statement profiler for the SQLAlchemy engines.
+
+Statements are grouped by fingerprint, their SQL with literals and IN lists normalized away, and a
+sample of them (SQL_PROFILER_SAMPLE_RATE) is counted per template: calls, total and max time, and
+rows returned or changed. Every statement is timed, sampled or not, so any that takes longer than
+SQL_PROFILER_SLOW_MS is written to the `core.sql.slow` log with its EXPLAIN QUERY PLAN and the
+route it ran for. Stats are kept per worker process, in memory, for a bounded number of templates.
+"""
+import json
+import logging
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import deque
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from core.libs import helpers
+
+slow_query_logger = logging.getLogger('core.sql.slow')
+
+# order matters: strings before numbers, then lists of placeholders
+NORMALIZATIONS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?+)'),
+    (re.compile(r'\(\?\+\)(?:\s*,\s*\(\?\+\))+'), '(?+), ...'),
+    (re.compile(r'\s+'), ' '),
+)
+
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+# templates past the limit are counted together under this one
+OTHER = '<other>'
+
+# statement text -> (fingerprint, template); statements come from a small set of compiled queries
+MAX_CACHED_STATEMENTS = 5000
+
+
+def normalize(statement):
+    template = statement.strip()
+    for pattern, replacement in NORMALIZATIONS:
+        template = pattern.sub(replacement, template)
+    return template
+
+
+def explain(dbapi_connection, statement, parameters):
+    """EXPLAIN QUERY PLAN of `statement` as indented lines, None where it cannot be explained"""
+    if not isinstance(dbapi_connection, sqlite3.Connection) or \
+            not statement.lstrip()[:6].upper().startswith(EXPLAINABLE):
+        return None
+    try:
+        rows = dbapi_connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters or ()).fetchall()
+    except (sqlite3.Error, ValueError):
+        return None
+
+    depths, plan = {0: -1}, []
+    for node_id, parent_id, _, detail in rows:
+        depths[node_id] = depths.get(parent_id, -1) + 1
+        plan.append('  ' * depths[node_id] + detail)
+    return plan
+
+
+def get_route():
+    if not has_request_context():
+        return None
+    return '{0} {1} ({2})'.format(request.method, request.path, request.endpoint)
+
+
+class RowCountingCursor:
+    """Stands in for the DBAPI cursor behind a sampled SELECT's result, adding up the rows fetched"""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+
+class TemplateStats:
+    __slots__ = ('fingerprint', 'template', 'calls', 'total_time', 'max_time', 'rows')
+
+    def __init__(self, fingerprint, template):
+        self.fingerprint = fingerprint
+        self.template = template
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+
+    def to_dict(self):
+        return {
+            'fingerprint': self.fingerprint,
+            'template': self.template,
+            'calls': self.calls,
+            'total_ms': self.total_time * 1000,
+            'mean_ms': self.total_time * 1000 / self.calls if self.calls else None,
+            'max_ms': self.max_time * 1000,
+            'rows': self.rows,
+        }
+
+
+class SQLProfiler:
+    """Per-process statement stats and recent slow statements, see the module docstring"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.slow_threshold = None
+        self.max_templates = 0
+        self.fingerprints = {}
+        self.stats = {}
+        self.slow_log = deque()
+
+    def configure(self, settings):
+        self.enabled = settings['SQL_PROFILER_ENABLED']
+        self.sample_rate = settings['SQL_PROFILER_SAMPLE_RATE']
+        self.slow_threshold = settings['SQL_PROFILER_SLOW_MS'] / 1000
+        self.max_templates = settings['SQL_PROFILER_MAX_TEMPLATES']
+        self.slow_log = deque(self.slow_log, maxlen=settings['SQL_PROFILER_SLOW_LOG_SIZE'])
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self.slow_log.clear()
+
+    def fingerprint(self, statement):
+        cached = self.fingerprints.get(statement)
+        if cached is None:
+            template = normalize(statement)
+            cached = ('{0:08x}'.format(zlib.crc32(template.encode('utf8'))), template)
+            if len(self.fingerprints) >= MAX_CACHED_STATEMENTS:
+                self.fingerprints.clear()
+            self.fingerprints[statement] = cached
+        return cached
+
+    def _template_stats(self, fingerprint, template):
+        stats = self.stats.get(fingerprint)
+        if stats is None:
+            if len(self.stats) >= self.max_templates:
+                fingerprint, template = OTHER, OTHER
+                stats = self.stats.get(OTHER)
+            if stats is None:
+                stats = self.stats[fingerprint] = TemplateStats(fingerprint, template)
+        return stats
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.enabled:
+            sampled = self.sample_rate >= 1 or random.random() < self.sample_rate
+            conn.info.setdefault('profiler_start', []).append((time.perf_counter(), sampled))
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not self.enabled or not conn.info.get('profiler_start'):
+            return
+        start, sampled = conn.info['profiler_start'].pop()
+        elapsed = time.perf_counter() - start
+        slow = elapsed >= self.slow_threshold
+        if not sampled and not slow:
+            return
+
+        fingerprint, template = self.fingerprint(statement)
+        if sampled:
+            with self.lock:
+                stats = self._template_stats(fingerprint, template)
+                stats.calls += 1
+                stats.total_time += elapsed
+                stats.max_time = max(stats.max_time, elapsed)
+                if cursor.description is None:
+                    stats.rows += max(cursor.rowcount, 0)
+            if cursor.description is not None and context is not None:
+                context.cursor = RowCountingCursor(cursor, stats)
+
+        if slow:
+            self.log_slow(cursor.connection, statement, parameters[0] if executemany else parameters,
+                          fingerprint, template, elapsed)
+
+    def log_slow(self, dbapi_connection, statement, parameters, fingerprint, template, elapsed):
+        entry = {
+            'at': helpers.get_utc_now().isoformat(),
+            'fingerprint': fingerprint,
+            'template': template,
+            'duration_ms': round(elapsed * 1000, 3),
+            'route': get_route(),
+            'plan': explain(dbapi_connection, statement, parameters),
+        }
+        with self.lock:
+            self.slow_log.append(entry)
+        slow_query_logger.warning('slow query %s', json.dumps(entry))
+
+    def report(self, limit=50):
+        """The `limit` templates with the most total time, and the slow log, newest last"""
+        with self.lock:
+            templates = sorted(self.stats.values(), key=lambda stats: stats.total_time, reverse=True)[:limit]
+            return {
+                'enabled': self.enabled,
+                'sample_rate': self.sample_rate,
+                'slow_ms': self.slow_threshold * 1000,
+                'templates': [stats.to_dict() for stats in templates],
+                'slow': list(self.slow_log),
+            }
+
+
+sql_profiler = SQLProfiler()
+
+
+def init_app(app):
+    """Profiles every engine of the process with the SQL_PROFILER_* settings of `app`"""
+    sql_profiler.configure(app.config)
+    for name in ('before_cursor_execute', 'after_cursor_execute'):
+        listener = getattr(sql_profiler, name)
+        if not event.contains(Engine, name, listener):
+            event.listen(Engine, name, listener)
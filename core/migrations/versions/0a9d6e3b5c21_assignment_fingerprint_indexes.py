@@ -0,0 +1,30 @@
+"""assignment fingerprint indexes
+
+Revision ID: 0a9d6e3b5c21
+Revises: f2b8d4e61c07
+Create Date: 2026-10-18 21:02:17.640195
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a9d6e3b5c21'
+down_revision = 'f2b8d4e61c07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_assignments_student_id_state_updated_at', 'assignments',
+                    ['student_id', 'state', 'updated_at'], unique=False)
+    op.create_index('ix_assignments_teacher_id_updated_at', 'assignments', ['teacher_id', 'updated_at'], unique=False)
+    op.create_index('ix_assignments_reviewable_updated_at', 'assignments', ['updated_at', 'state'], unique=False,
+                    sqlite_where=sa.text("state IN ('SUBMITTED', 'GRADED')"))
+
+
+def downgrade():
+    op.drop_index('ix_assignments_reviewable_updated_at', table_name='assignments')
+    op.drop_index('ix_assignments_teacher_id_updated_at', table_name='assignments')
+    op.drop_index('ix_assignments_student_id_state_updated_at', table_name='assignments')
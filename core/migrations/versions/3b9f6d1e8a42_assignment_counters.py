@@ -0,0 +1,67 @@
+"""assignment counters
+
+Revision ID: 3b9f6d1e8a42
+Revises: 7c4e2a9f1d36
+Create Date: 2026-10-18 22:48:31.907216
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9f6d1e8a42'
+down_revision = '7c4e2a9f1d36'
+branch_labels = None
+depends_on = None
+
+# NULL teacher_id / grade are counted under 0 / '' so that they can be part of the key
+KEY = "coalesce({row}.teacher_id, 0), {row}.state, coalesce({row}.grade, ''), {row}.student_id"
+
+MATCH = """teacher_id = coalesce({row}.teacher_id, 0) AND state = {row}.state
+        AND grade = coalesce({row}.grade, '') AND student_id = {row}.student_id"""
+
+INCREMENT = """
+    INSERT INTO assignment_counters (teacher_id, state, grade, student_id, count) VALUES ({key}, 1)
+        ON CONFLICT (teacher_id, state, grade, student_id) DO UPDATE SET count = count + 1;
+""".format(key=KEY.format(row='NEW'))
+
+DECREMENT = """
+    UPDATE assignment_counters SET count = count - 1 WHERE {match};
+    DELETE FROM assignment_counters WHERE {match} AND count = 0;
+""".format(match=MATCH.format(row='OLD'))
+
+TRIGGERS = {
+    'insert': 'AFTER INSERT ON assignments BEGIN {0} END'.format(INCREMENT),
+    'delete': 'AFTER DELETE ON assignments BEGIN {0} END'.format(DECREMENT),
+    'update': """AFTER UPDATE OF teacher_id, state, grade, student_id ON assignments
+    WHEN OLD.teacher_id IS NOT NEW.teacher_id OR OLD.state IS NOT NEW.state OR OLD.grade IS NOT NEW.grade
+        OR OLD.student_id IS NOT NEW.student_id
+    BEGIN {0} {1} END""".format(DECREMENT, INCREMENT),
+}
+
+
+def upgrade():
+    op.create_table('assignment_counters',
+    sa.Column('teacher_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('state', sa.String(length=16), nullable=False),
+    sa.Column('grade', sa.String(length=1), nullable=False),
+    sa.Column('student_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('teacher_id', 'state', 'grade', 'student_id')
+    )
+    op.create_index('ix_assignment_counters_student_id', 'assignment_counters', ['student_id'], unique=False)
+
+    op.execute("INSERT INTO assignment_counters (teacher_id, state, grade, student_id, count) "
+               "SELECT {0}, count(*) FROM assignments GROUP BY 1, 2, 3, 4".format(KEY.format(row='assignments')))
+
+    for event, body in TRIGGERS.items():
+        op.execute('CREATE TRIGGER assignment_counters_{0} {1}'.format(event, body))
+
+
+def downgrade():
+    for event in TRIGGERS:
+        op.execute('DROP TRIGGER assignment_counters_{0}'.format(event))
+
+    op.drop_index('ix_assignment_counters_student_id', table_name='assignment_counters')
+    op.drop_table('assignment_counters')
@@ -0,0 +1,42 @@
+"""assignment deletions
+
+Revision ID: 6e1a8c4d2f93
+Revises: 9d2f4b7a1c58
+Create Date: 2026-10-19 11:03:27.904152
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e1a8c4d2f93'
+down_revision = '9d2f4b7a1c58'
+branch_labels = None
+depends_on = None
+
+# tombstones kept; a reader further behind than this rebuilds from the table
+KEEP = 10000
+
+TRIGGER = """
+CREATE TRIGGER assignment_deletions_delete AFTER DELETE ON assignments
+BEGIN
+    INSERT INTO assignment_deletions (assignment_id) VALUES (OLD.id);
+    DELETE FROM assignment_deletions WHERE seq <= (SELECT max(seq) FROM assignment_deletions) - {keep};
+END
+""".format(keep=KEEP)
+
+
+def upgrade():
+    op.create_table('assignment_deletions',
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('assignment_id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('seq'),
+    sqlite_autoincrement=True
+    )
+    op.execute(TRIGGER)
+
+
+def downgrade():
+    op.execute('DROP TRIGGER assignment_deletions_delete')
+    op.drop_table('assignment_deletions')
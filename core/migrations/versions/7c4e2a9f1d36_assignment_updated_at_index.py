@@ -0,0 +1,23 @@
+"""assignment updated_at index
+
+Revision ID: 7c4e2a9f1d36
+Revises: 0a9d6e3b5c21
+Create Date: 2026-10-18 22:10:05.318467
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7c4e2a9f1d36'
+down_revision = '0a9d6e3b5c21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_assignments_updated_at', 'assignments', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_assignments_updated_at', table_name='assignments')
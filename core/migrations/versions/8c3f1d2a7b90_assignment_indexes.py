@@ -0,0 +1,31 @@
+"""assignment indexes
+
+Revision ID: 8c3f1d2a7b90
+Revises: 52a401750a76
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c3f1d2a7b90'
+down_revision = '52a401750a76'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_assignments_student_id_state', 'assignments', ['student_id', 'state'], unique=False)
+    op.create_index('ix_assignments_teacher_id_state', 'assignments', ['teacher_id', 'state'], unique=False)
+    op.create_index('ix_assignments_state', 'assignments', ['state'], unique=False)
+    op.create_index('ix_assignments_submitted_teacher_id', 'assignments', ['teacher_id'], unique=False,
+                    sqlite_where=sa.text("state = 'SUBMITTED'"))
+
+
+def downgrade():
+    op.drop_index('ix_assignments_submitted_teacher_id', table_name='assignments')
+    op.drop_index('ix_assignments_state', table_name='assignments')
+    op.drop_index('ix_assignments_teacher_id_state', table_name='assignments')
+    op.drop_index('ix_assignments_student_id_state', table_name='assignments')
@@ -0,0 +1,41 @@
+"""replication change log on demand
+
+Revision ID: 9d2f4b7a1c58
+Revises: 3b9f6d1e8a42
+Create Date: 2026-10-19 10:12:44.530871
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2f4b7a1c58'
+down_revision = '3b9f6d1e8a42'
+branch_labels = None
+depends_on = None
+
+REPLICATED_TABLES = ('assignments', 'teachers', 'students', 'principals')
+
+TRIGGER = """
+CREATE TRIGGER change_log_{table}_{event} AFTER {event_upper} ON {table}
+BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('{table}', {row}.id);
+END
+"""
+
+
+def upgrade():
+    # created by core/libs/replication.py when followers are configured
+    for table in REPLICATED_TABLES:
+        for event in ('insert', 'update', 'delete'):
+            op.execute('DROP TRIGGER IF EXISTS change_log_{0}_{1}'.format(table, event))
+
+    op.execute('DELETE FROM change_log')
+    op.execute('DELETE FROM replication_writes')
+
+
+def downgrade():
+    for table in REPLICATED_TABLES:
+        for event, row in (('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD')):
+            op.execute('DROP TRIGGER IF EXISTS change_log_{0}_{1}'.format(table, event))
+            op.execute(TRIGGER.format(table=table, event=event, event_upper=event.upper(), row=row))
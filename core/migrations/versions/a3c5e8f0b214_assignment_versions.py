@@ -0,0 +1,74 @@
+"""assignment versions
+
+Revision ID: a3c5e8f0b214
+Revises: b47d0e9c3a16
+Create Date: 2026-10-19 14:06:52.381907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c5e8f0b214'
+down_revision = 'b47d0e9c3a16'
+branch_labels = None
+depends_on = None
+
+REVIEWABLE = "{row}.state IN ('SUBMITTED', 'GRADED')"
+
+# the SELECT form with a WHERE, so that a row outside the scope (no teacher yet) bumps nothing
+BUMP = """
+    INSERT INTO assignment_versions (scope, scope_id, version) SELECT '{scope}', {scope_id}, 1 WHERE {when}
+        ON CONFLICT (scope, scope_id) DO UPDATE SET version = version + 1;"""
+
+
+def bumps(row):
+    """Every scope the row `row` (NEW or OLD) belongs to"""
+    return (BUMP.format(scope='student', scope_id=row + '.student_id', when='1')
+            + BUMP.format(scope='teacher', scope_id=row + '.teacher_id', when=row + '.teacher_id IS NOT NULL')
+            + BUMP.format(scope='reviewable', scope_id=0, when=REVIEWABLE.format(row=row)))
+
+
+TRIGGERS = {
+    'insert': 'AFTER INSERT ON assignments BEGIN {0} END'.format(bumps('NEW')),
+    'delete': 'AFTER DELETE ON assignments BEGIN {0} END'.format(bumps('OLD')),
+    # scopes the row leaves are bumped as well as those it is in
+    'update': 'AFTER UPDATE ON assignments BEGIN {0} {1} {2} {3} END'.format(
+        bumps('NEW'),
+        BUMP.format(scope='student', scope_id='OLD.student_id', when='OLD.student_id IS NOT NEW.student_id'),
+        BUMP.format(scope='teacher', scope_id='OLD.teacher_id',
+                    when='OLD.teacher_id IS NOT NULL AND OLD.teacher_id IS NOT NEW.teacher_id'),
+        BUMP.format(scope='reviewable', scope_id=0,
+                    when='{0} AND NOT {1}'.format(REVIEWABLE.format(row='OLD'), REVIEWABLE.format(row='NEW')))),
+}
+
+
+def upgrade():
+    op.create_table('assignment_versions',
+    sa.Column('scope', sa.String(length=16), nullable=False),
+    sa.Column('scope_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('scope', 'scope_id')
+    )
+
+    for event, body in TRIGGERS.items():
+        op.execute('CREATE TRIGGER assignment_versions_{0} {1}'.format(event, body))
+
+    # list validators come from assignment_versions now, nothing else reads these
+    op.drop_index('ix_assignments_reviewable_updated_at', table_name='assignments')
+    op.drop_index('ix_assignments_teacher_id_updated_at', table_name='assignments')
+    op.drop_index('ix_assignments_student_id_state_updated_at', table_name='assignments')
+
+
+def downgrade():
+    op.create_index('ix_assignments_student_id_state_updated_at', 'assignments',
+                    ['student_id', 'state', 'updated_at'], unique=False)
+    op.create_index('ix_assignments_teacher_id_updated_at', 'assignments', ['teacher_id', 'updated_at'], unique=False)
+    op.create_index('ix_assignments_reviewable_updated_at', 'assignments', ['updated_at', 'state'], unique=False,
+                    sqlite_where=sa.text("state IN ('SUBMITTED', 'GRADED')"))
+
+    for event in TRIGGERS:
+        op.execute('DROP TRIGGER assignment_versions_{0}'.format(event))
+
+    op.drop_table('assignment_versions')
@@ -0,0 +1,28 @@
+"""drop unused assignment indexes
+
+Revision ID: b47d0e9c3a16
+Revises: 6e1a8c4d2f93
+Create Date: 2026-10-19 11:41:08.217653
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b47d0e9c3a16'
+down_revision = '6e1a8c4d2f93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # grading updates by primary key, and teacher listings use ix_assignments_teacher_id_created_at
+    op.drop_index('ix_assignments_submitted_teacher_id', table_name='assignments')
+    op.drop_index('ix_assignments_teacher_id_state', table_name='assignments')
+
+
+def downgrade():
+    op.create_index('ix_assignments_teacher_id_state', 'assignments', ['teacher_id', 'state'], unique=False)
+    op.create_index('ix_assignments_submitted_teacher_id', 'assignments', ['teacher_id'], unique=False,
+                    sqlite_where=sa.text("state = 'SUBMITTED'"))
@@ -0,0 +1,38 @@
+"""assignment pagination indexes
+
+Revision ID: d41e6b0c9a53
+Revises: 8c3f1d2a7b90
+Create Date: 2026-10-18 11:40:03.927516
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41e6b0c9a53'
+down_revision = '8c3f1d2a7b90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('ix_assignments_student_id_state', table_name='assignments')
+    op.drop_index('ix_assignments_state', table_name='assignments')
+
+    op.create_index('ix_assignments_student_id_created_at', 'assignments', ['student_id', 'created_at'], unique=False)
+    op.create_index('ix_assignments_student_id_state_created_at', 'assignments',
+                    ['student_id', 'state', 'created_at'], unique=False)
+    op.create_index('ix_assignments_teacher_id_created_at', 'assignments', ['teacher_id', 'created_at'], unique=False)
+    op.create_index('ix_assignments_reviewable_created_at', 'assignments', ['created_at'], unique=False,
+                    sqlite_where=sa.text("state IN ('SUBMITTED', 'GRADED')"))
+
+
+def downgrade():
+    op.drop_index('ix_assignments_reviewable_created_at', table_name='assignments')
+    op.drop_index('ix_assignments_teacher_id_created_at', table_name='assignments')
+    op.drop_index('ix_assignments_student_id_state_created_at', table_name='assignments')
+    op.drop_index('ix_assignments_student_id_created_at', table_name='assignments')
+
+    op.create_index('ix_assignments_state', 'assignments', ['state'], unique=False)
+    op.create_index('ix_assignments_student_id_state', 'assignments', ['student_id', 'state'], unique=False)
@@ -0,0 +1,53 @@
+"""replication change log
+
+Revision ID: e5a7c3f19b24
+Revises: d41e6b0c9a53
+Create Date: 2026-10-18 19:05:12.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a7c3f19b24'
+down_revision = 'd41e6b0c9a53'
+branch_labels = None
+depends_on = None
+
+REPLICATED_TABLES = ('assignments', 'teachers', 'students', 'principals')
+
+TRIGGER = """
+CREATE TRIGGER change_log_{table}_{event} AFTER {event_upper} ON {table}
+BEGIN
+    INSERT INTO change_log (table_name, row_id) VALUES ('{table}', {row}.id);
+END
+"""
+
+
+def upgrade():
+    op.create_table('change_log',
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('table_name', sa.String(length=32), nullable=False),
+    sa.Column('row_id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('seq'),
+    sqlite_autoincrement=True
+    )
+    op.create_table('replication_writes',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    for table in REPLICATED_TABLES:
+        for event, row in (('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD')):
+            op.execute(TRIGGER.format(table=table, event=event, event_upper=event.upper(), row=row))
+
+
+def downgrade():
+    for table in REPLICATED_TABLES:
+        for event in ('insert', 'update', 'delete'):
+            op.execute('DROP TRIGGER change_log_{0}_{1}'.format(table, event))
+
+    op.drop_table('replication_writes')
+    op.drop_table('change_log')
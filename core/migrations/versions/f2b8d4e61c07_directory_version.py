@@ -0,0 +1,46 @@
+"""directory version stamp
+
+Revision ID: f2b8d4e61c07
+Revises: e5a7c3f19b24
+Create Date: 2026-10-18 20:12:41.503318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b8d4e61c07'
+down_revision = 'e5a7c3f19b24'
+branch_labels = None
+depends_on = None
+
+DIRECTORY_TABLES = ('teachers', 'students')
+
+TRIGGER = """
+CREATE TRIGGER directory_version_{table}_{event} AFTER {event_upper} ON {table}
+BEGIN
+    UPDATE directory_version SET version = version + 1;
+END
+"""
+
+
+def upgrade():
+    op.create_table('directory_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute('INSERT INTO directory_version (id, version) VALUES (1, 1)')
+
+    for table in DIRECTORY_TABLES:
+        for event in ('insert', 'update', 'delete'):
+            op.execute(TRIGGER.format(table=table, event=event, event_upper=event.upper()))
+
+
+def downgrade():
+    for table in DIRECTORY_TABLES:
+        for event in ('insert', 'update', 'delete'):
+            op.execute('DROP TRIGGER directory_version_{0}_{1}'.format(table, event))
+
+    op.drop_table('directory_version')
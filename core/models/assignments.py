@@ -1,11 +1,39 @@
 import enum
 from core import db
 from core.apis.decorators import AuthPrincipal
-from core.libs import helpers, assertions
+from core.libs import helpers, assertions, pagination
+from core.models.directory import directory
 from core.models.teachers import Teacher
 from core.models.students import Student
+from sqlalchemy import bindparam, insert, select, tuple_, update
+from sqlalchemy.orm import load_only
 from sqlalchemy.types import Enum as BaseEnum
 
+STREAM_BATCH_SIZE = 500
+
+CONCURRENT_MODIFICATION = (409, 'Assignment was modified concurrently')
+
+DUPLICATE_ITEM = (400, 'Assignment appears more than once in the batch')
+
+
+def bulk_result(_id, status_code=200, message=None, assignment=None):
+    """Outcome of one item of a bulk operation"""
+    return helpers.GeneralObject(id=_id, status_code=status_code, message=message, assignment=assignment)
+
+
+def proceed_with_batch(results, atomic):
+    """
+    Whether the accepted items of a batch may be written. In atomic mode a single refusal holds
+    back the whole batch, and the items that would have gone through are reported as such.
+    """
+    if not atomic or all(result.status_code == 200 for result in results):
+        return True
+
+    for result in results:
+        if result.status_code == 200:
+            result.status_code, result.message = 424, 'not applied, another item of the batch failed'
+    return False
+
 
 class GradeEnum(str, enum.Enum):
     A = 'A'
@@ -31,76 +59,390 @@ class Assignment(db.Model):
     created_at = db.Column(db.TIMESTAMP(timezone=True), default=helpers.get_utc_now, nullable=False)
     updated_at = db.Column(db.TIMESTAMP(timezone=True), default=helpers.get_utc_now, nullable=False, onupdate=helpers.get_utc_now)
 
+    __table_args__ = (
+        # listings are keyset paginated on (created_at, id); id rides along as the rowid
+        db.Index('ix_assignments_student_id_created_at', 'student_id', 'created_at'),
+        db.Index('ix_assignments_student_id_state_created_at', 'student_id', 'state', 'created_at'),
+        db.Index('ix_assignments_teacher_id_created_at', 'teacher_id', 'created_at'),
+        # only usable when the query repeats this predicate verbatim, see `reviewable_states`
+        db.Index('ix_assignments_reviewable_created_at', 'created_at',
+                 sqlite_where=db.text("state IN ('SUBMITTED', 'GRADED')")),
+        # incremental refresh of the report snapshot, see core/models/reports.py
+        db.Index('ix_assignments_updated_at', 'updated_at'),
+    )
+
     def __repr__(self):
         return '<Assignment %r>' % self.id
 
     @classmethod
-    def filter(cls, *criterion):
+    def filter(cls, *criterion, fields=None):
         db_query = db.session.query(cls)
+        if fields is not None:
+            # columns outside `fields` stay out of the SELECT; created_at is kept as the pagination key
+            columns = {'created_at', *fields}
+            db_query = db_query.options(load_only(*[getattr(cls, column) for column in columns]))
         return db_query.filter(*criterion)
 
     @classmethod
     def get_by_id(cls, _id):
         return cls.filter(cls.id == _id).first()
 
+    @classmethod
+    def get_row(cls, _id):
+        """Plain row rather than an instance, so it is not expired (and reloaded) by the commit"""
+        return db.session.execute(select(cls.__table__).where(cls.id == _id)).first()
+
+    @classmethod
+    def get_transition_row(cls, _id):
+        """Just enough of the row to explain why a guarded UPDATE matched nothing"""
+        return db.session.execute(
+            select(cls.id, cls.student_id, cls.teacher_id, cls.state, cls.content).where(cls.id == _id)
+        ).first()
+
+    @classmethod
+    def get_transition_rows(cls, ids):
+        """`get_transition_row` for many ids at once, keyed by id"""
+        rows = db.session.execute(
+            select(cls.id, cls.student_id, cls.teacher_id, cls.state, cls.content).where(cls.id.in_(list(set(ids))))
+        )
+        return {row.id: row for row in rows}
+
+    @classmethod
+    def get_rows(cls, ids):
+        """`get_row` for many ids at once, keyed by id"""
+        return {row.id: row for row in db.session.execute(select(cls.__table__).where(cls.id.in_(list(set(ids)))))}
+
+    @classmethod
+    def edit_refusal(cls, current, student_id):
+        """(status_code, message) explaining why `current` (a transition row, or None) cannot be edited, or None"""
+        if current is None or current.student_id != student_id:
+            return 404, 'No assignment with this id was found'
+        if current.state != AssignmentStateEnum.DRAFT:
+            return 400, 'only assignment in draft state can be edited'
+        return None
+
     @classmethod
     def upsert(cls, assignment_new: 'Assignment'):
+        """
+        Creates a draft, or edits the content of a draft owned by the same student, in one statement.
+        A new draft is returned from the inserted values without reading it back.
+        """
+        table = cls.__table__
         if assignment_new.id is not None:
-            assignment = Assignment.get_by_id(assignment_new.id)
-            assertions.assert_found(assignment, 'No assignment with this id was found')
-            assertions.assert_valid(assignment.state == AssignmentStateEnum.DRAFT,
-                                    'only assignment in draft state can be edited')
+            result = db.session.execute(
+                update(table)
+                .where(cls.id == assignment_new.id, cls.student_id == assignment_new.student_id,
+                       cls.state == AssignmentStateEnum.DRAFT)
+                .values(content=assignment_new.content)
+            )
+            if result.rowcount == 0:
+                refusal = cls.edit_refusal(cls.get_transition_row(assignment_new.id), assignment_new.student_id)
+                assertions.base_assert(*(refusal or CONCURRENT_MODIFICATION))
+            return cls.get_row(assignment_new.id)
+
+        result = db.session.execute(
+            insert(table).values(student_id=assignment_new.student_id, content=assignment_new.content,
+                                 state=AssignmentStateEnum.DRAFT)
+        )
+        inserted = dict.fromkeys(table.columns.keys())
+        inserted.update(result.last_inserted_params(), id=result.inserted_primary_key[0])
+        return helpers.GeneralObject(**inserted)
+
+    @classmethod
+    def bulk_upsert(cls, assignments, student_id, atomic=False, refusals=None):
+        """
+        `upsert` for many drafts of one student: new drafts go in with a single executemany INSERT,
+        edits with a single executemany of the guarded UPDATE. `refusals` maps the index of items
+        the caller already rejected to their (status_code, message). Unless `atomic`, each item
+        succeeds or fails on its own; returns one result per item, in order.
+        """
+        refusals = refusals or {}
+        current = cls.get_transition_rows(
+            [assignment.id for index, assignment in enumerate(assignments)
+             if index not in refusals and assignment.id is not None]
+        )
+
+        results, edited = [], {}
+        for index, assignment in enumerate(assignments):
+            refusal = refusals.get(index)
+            if refusal is None and assignment.content is None:
+                refusal = (400, 'Content cannot be null.')
+            if refusal is None and assignment.id is not None:
+                refusal = cls.edit_refusal(current.get(assignment.id), student_id)
+                if refusal is None and assignment.id in edited:
+                    refusal = DUPLICATE_ITEM
+                if refusal is None:
+                    edited[assignment.id] = assignment.content
+            results.append(bulk_result(None if index in refusals else assignment.id, *(refusal or ())))
+
+        if not proceed_with_batch(results, atomic):
+            return results
 
-            assignment.content = assignment_new.content
-        else:
-            assignment = assignment_new
-            db.session.add(assignment_new)
+        accepted = [(result, assignment) for result, assignment in zip(results, assignments) if result.status_code == 200]
+        created = [(result, assignment) for result, assignment in accepted if assignment.id is None]
 
-        db.session.flush()
-        return assignment
+        if created:
+            now = helpers.get_utc_now()
+            rows = [
+                dict(student_id=student_id, teacher_id=None, content=assignment.content, grade=None,
+                     state=AssignmentStateEnum.DRAFT, created_at=now, updated_at=now)
+                for _, assignment in created
+            ]
+            db.session.execute(insert(cls.__table__), rows)
+            # the write lock is held for the whole executemany, so the new rowids are consecutive
+            last_id = db.session.execute(db.text('SELECT last_insert_rowid()')).scalar()
+            for _id, (result, _), row in zip(range(last_id - len(rows) + 1, last_id + 1), created, rows):
+                result.id = _id
+                result.assignment = helpers.GeneralObject(id=_id, **row)
+
+        if edited:
+            db.session.execute(
+                update(cls.__table__)
+                .where(cls.id == bindparam('_id'), cls.student_id == student_id, cls.state == AssignmentStateEnum.DRAFT)
+                .values(content=bindparam('_content')),
+                [{'_id': _id, '_content': content} for _id, content in edited.items()]
+            )
+            rows = cls.get_rows(edited)
+            for result, assignment in accepted:
+                if assignment.id is not None:
+                    row = rows.get(assignment.id)
+                    if row is None or row.state != AssignmentStateEnum.DRAFT or row.content != edited[assignment.id]:
+                        result.status_code, result.message = CONCURRENT_MODIFICATION
+                    else:
+                        result.assignment = row
+
+        return results
+
+    @classmethod
+    def submit_refusal(cls, current, auth_principal: AuthPrincipal):
+        """(status_code, message) explaining why `current` (a transition row, or None) cannot be submitted, or None"""
+        if current is None or current.student_id != auth_principal.student_id:
+            return 404, 'Assignment not found or access denied.'
+        if current.state != AssignmentStateEnum.DRAFT:
+            return 400, 'only a draft assignment can be submitted'
+        if current.content is None:
+            return 400, 'assignment with empty content cannot be submitted'
+        return None
 
     @classmethod
     def submit(cls, _id, teacher_id, auth_principal: AuthPrincipal):
-        assignment = Assignment.get_by_id(_id)
-        assertions.assert_found(assignment, 'No assignment with this id was found')
-        assertions.assert_valid(assignment.student_id == auth_principal.student_id, 'This assignment belongs to some other student')
-        assertions.assert_valid(assignment.content is not None, 'assignment with empty content cannot be submitted')
+        """
+        DRAFT -> SUBMITTED as a single UPDATE guarded on id, owner and state, so two concurrent
+        submits cannot both win. The teacher foreign key is left to the database to enforce.
+        """
+        result = db.session.execute(
+            update(cls.__table__)
+            .where(cls.id == _id, cls.student_id == auth_principal.student_id,
+                   cls.state == AssignmentStateEnum.DRAFT, cls.content.isnot(None))
+            .values(state=AssignmentStateEnum.SUBMITTED, teacher_id=teacher_id)
+        )
+        if result.rowcount == 0:
+            refusal = cls.submit_refusal(cls.get_transition_row(_id), auth_principal)
+            assertions.base_assert(*(refusal or CONCURRENT_MODIFICATION))
+
+        return cls.get_row(_id)
+
+    @classmethod
+    def bulk_submit(cls, submissions, auth_principal: AuthPrincipal, atomic=False, refusals=None):
+        """
+        `submit` for many drafts: teachers are checked against the directory (a foreign key failure
+        would abort the executemany half way), then the guarded UPDATE runs once for the whole batch.
+        `submissions` is a list of (id, teacher_id); see `bulk_upsert` for `atomic` and `refusals`.
+        """
+        refusals = refusals or {}
+        pending = [submission for index, submission in enumerate(submissions) if index not in refusals]
+        current = cls.get_transition_rows([_id for _id, _ in pending])
+
+        results, accepted = [], {}
+        for index, (_id, teacher_id) in enumerate(submissions):
+            refusal = refusals.get(index)
+            if refusal is None:
+                refusal = cls.submit_refusal(current.get(_id), auth_principal)
+            if refusal is None and directory.get_teacher(teacher_id) is None:
+                refusal = (404, 'Teacher not found')
+            if refusal is None and _id in accepted:
+                refusal = DUPLICATE_ITEM
+            if refusal is None:
+                accepted[_id] = teacher_id
+            results.append(bulk_result(_id, *(refusal or ())))
+
+        if not accepted or not proceed_with_batch(results, atomic):
+            return results
+
+        db.session.execute(
+            update(cls.__table__)
+            .where(cls.id == bindparam('_id'), cls.student_id == auth_principal.student_id,
+                   cls.state == AssignmentStateEnum.DRAFT, cls.content.isnot(None))
+            .values(state=AssignmentStateEnum.SUBMITTED, teacher_id=bindparam('_teacher_id')),
+            [{'_id': _id, '_teacher_id': teacher_id} for _id, teacher_id in accepted.items()]
+        )
+        rows = cls.get_rows(accepted)
+        for result in results:
+            if result.status_code == 200:
+                row = rows.get(result.id)
+                if row is None or row.state != AssignmentStateEnum.SUBMITTED or row.teacher_id != accepted[result.id]:
+                    result.status_code, result.message = CONCURRENT_MODIFICATION
+                else:
+                    result.assignment = row
 
-        assignment.teacher_id = teacher_id
-        db.session.flush()
+        return results
 
-        return assignment
+    @classmethod
+    def gradable_criteria(cls, auth_principal: AuthPrincipal):
+        """
+        Teachers grade what was submitted to them, once. Principals grade any submitted
+        assignment and re-grade graded ones.
+        """
+        if auth_principal.principal_id is not None:
+            return [cls.state.in_([AssignmentStateEnum.SUBMITTED, AssignmentStateEnum.GRADED])]
+        return [cls.teacher_id == auth_principal.teacher_id, cls.state == AssignmentStateEnum.SUBMITTED]
 
+    @classmethod
+    def grade_refusal(cls, current, auth_principal: AuthPrincipal):
+        """
+        Python mirror of `gradable_criteria`: (status_code, message) explaining why `current`
+        (a transition row, or None) cannot be graded by `auth_principal`, or None if it can
+        """
+        if current is None:
+            return 404, 'Assignment not found'
+        if current.state == AssignmentStateEnum.DRAFT:
+            return 400, 'Draft assignment cannot be graded'
+        if auth_principal.principal_id is None:
+            if current.teacher_id != auth_principal.teacher_id:
+                return 400, 'You cannot grade this assignment'
+            if current.state != AssignmentStateEnum.SUBMITTED:
+                return 400, 'only a submitted assignment can be graded'
+        return None
 
     @classmethod
     def mark_grade(cls, _id, grade, auth_principal: AuthPrincipal):
-        assignment = Assignment.get_by_id(_id)
-        assertions.assert_found(assignment, 'No assignment with this id was found')
+        """SUBMITTED (or GRADED, for principals) -> GRADED as a single guarded UPDATE"""
         assertions.assert_valid(grade is not None, 'assignment with empty grade cannot be graded')
 
-        assignment.grade = grade
-        assignment.state = AssignmentStateEnum.GRADED
-        db.session.flush()
+        result = db.session.execute(
+            update(cls.__table__)
+            .where(cls.id == _id, *cls.gradable_criteria(auth_principal))
+            .values(grade=grade, state=AssignmentStateEnum.GRADED)
+        )
+        if result.rowcount == 0:
+            refusal = cls.grade_refusal(cls.get_transition_row(_id), auth_principal)
+            assertions.base_assert(*(refusal or CONCURRENT_MODIFICATION))
+
+        return cls.get_row(_id)
 
-        return assignment
+    @classmethod
+    def bulk_mark_grade(cls, grades, auth_principal: AuthPrincipal, atomic=False, refusals=None):
+        """
+        Grades many assignments under the rules of `mark_grade`: one SELECT to sort out refusals,
+        one executemany of the same guarded UPDATE and one SELECT for the graded rows. `grades` is
+        a list of (id, grade); see `bulk_upsert` for `atomic` and `refusals`. Returns one result
+        per item, in order.
+        """
+        refusals = refusals or {}
+        pending = [grade for index, grade in enumerate(grades) if index not in refusals]
+        current = cls.get_transition_rows([_id for _id, _ in pending])
+
+        results, accepted = [], {}
+        for index, (_id, grade) in enumerate(grades):
+            refusal = refusals.get(index)
+            if refusal is None:
+                refusal = cls.grade_refusal(current.get(_id), auth_principal)
+            if refusal is None and _id in accepted:
+                refusal = DUPLICATE_ITEM
+            if refusal is None:
+                accepted[_id] = grade
+            results.append(bulk_result(_id, *(refusal or ())))
+
+        if not accepted or not proceed_with_batch(results, atomic):
+            return results
+
+        db.session.execute(
+            update(cls.__table__)
+            .where(cls.id == bindparam('_id'), *cls.gradable_criteria(auth_principal))
+            .values(grade=bindparam('_grade'), state=AssignmentStateEnum.GRADED),
+            [{'_id': _id, '_grade': grade} for _id, grade in accepted.items()]
+        )
+        rows = cls.get_rows(accepted)
+        for result in results:
+            if result.status_code == 200:
+                row = rows.get(result.id)
+                # the guarded update skips rows whose state changed after the first read
+                if row is None or row.state != AssignmentStateEnum.GRADED or row.grade != accepted[result.id]:
+                    result.status_code, result.message = CONCURRENT_MODIFICATION
+                else:
+                    result.assignment = row
+
+        return results
 
     @classmethod
-    def get_assignments_by_student(cls, student_id):
-        return cls.filter(cls.student_id == student_id).all()
+    def paginate(cls, query, limit, cursor=None):
+        """Seeks past `cursor` on (created_at, id) and returns one page plus the cursor for the next"""
+        if cursor is not None:
+            query = query.filter(tuple_(cls.created_at, cls.id) > tuple_(*cursor))
+
+        assignments = query.order_by(cls.created_at, cls.id).limit(limit + 1).all()
+        if len(assignments) <= limit:
+            return assignments, None
+
+        assignments = assignments[:limit]
+        last = assignments[-1]
+        return assignments, pagination.encode_cursor(last.created_at, last.id)
 
     @classmethod
-    def get_assignments_by_teacher(cls, teacher_id):
-        return cls.filter(cls.teacher_id == teacher_id).all() or []
+    def stream(cls, query, cursor=None, batch_size=STREAM_BATCH_SIZE):
+        """Yields every row past `cursor` in (created_at, id) order, fetching `batch_size` rows at a time"""
+        if cursor is not None:
+            query = query.filter(tuple_(cls.created_at, cls.id) > tuple_(*cursor))
+
+        query = query.order_by(cls.created_at, cls.id).execution_options(stream_results=True)
+        return query.yield_per(batch_size)
 
     @classmethod
-    def get_all_graded_and_submitted_assignments(cls):
-        query = cls.query
-        return query.filter(cls.state.in_([AssignmentStateEnum.SUBMITTED, AssignmentStateEnum.GRADED]))
+    def filter_by_student(cls, student_id, fields=None):
+        return cls.filter(cls.student_id == student_id, fields=fields)
 
+    @classmethod
+    def filter_by_teacher(cls, teacher_id, fields=None):
+        return cls.filter(cls.teacher_id == teacher_id, fields=fields)
+
+    @classmethod
+    def filter_graded_and_submitted(cls, fields=None):
+        return cls.filter(cls.reviewable_states(), fields=fields)
+
+    @classmethod
+    def filter_submitted_by_student(cls, student_id, fields=None):
+        return cls.filter(cls.student_id == student_id, cls.state == AssignmentStateEnum.SUBMITTED, fields=fields)
+
+    @classmethod
+    def get_assignments_by_student(cls, student_id, limit=pagination.DEFAULT_PAGE_SIZE, cursor=None, fields=None):
+        return cls.paginate(cls.filter_by_student(student_id, fields), limit, cursor)
+
+    @classmethod
+    def get_assignments_by_teacher(cls, teacher_id, limit=pagination.DEFAULT_PAGE_SIZE, cursor=None, fields=None):
+        return cls.paginate(cls.filter_by_teacher(teacher_id, fields), limit, cursor)
+
+    @classmethod
+    def get_all_graded_and_submitted_assignments(cls, limit=pagination.DEFAULT_PAGE_SIZE, cursor=None, fields=None):
+        return cls.paginate(cls.filter_graded_and_submitted(fields), limit, cursor)
+
+    @classmethod
+    def get_submitted_assignments_by_student(cls, student_id, limit=pagination.DEFAULT_PAGE_SIZE, cursor=None,
+                                             fields=None):
+        return cls.paginate(cls.filter_submitted_by_student(student_id, fields), limit, cursor)
+
+    @classmethod
+    def get_version(cls, _id):
+        """Owner columns and updated_at of one assignment, enough to answer a conditional GET"""
+        return db.session.execute(
+            select(cls.student_id, cls.teacher_id, cls.updated_at).where(cls.id == _id)
+        ).first()
 
     @classmethod
-    def get_submitted_assignments_by_student(cls, student_id):
-        return cls.filter(cls.student_id == student_id, cls.state == AssignmentStateEnum.SUBMITTED).all()
+    def reviewable_states(cls):
+        # rendered inline so sqlite can match it against the partial index predicate
+        states = bindparam('reviewable_states', [AssignmentStateEnum.SUBMITTED, AssignmentStateEnum.GRADED],
+                           expanding=True, literal_execute=True)
+        return cls.state.in_(states)
 
 
     @classmethod
@@ -0,0 +1,123 @@
+from core import db
+from core.models.assignments import Assignment, AssignmentStateEnum, GradeEnum
+from sqlalchemy import func, insert
+
+# how a NULL teacher_id / grade is counted, so that it can be part of the key
+NO_TEACHER = 0
+NO_GRADE = ''
+
+REVIEWABLE_STATES = (AssignmentStateEnum.SUBMITTED.value, AssignmentStateEnum.GRADED.value)
+
+
+class AssignmentVersion(db.Model):
+    """
+    Version of the assignments of one scope: a student's, a teacher's, or every reviewable one
+    (scope_id 0). Bumped by triggers (see the assignment_versions migration) on every write to a row
+    in the scope or leaving it, so the list routes validate with a primary key lookup.
+    """
+    __tablename__ = 'assignment_versions'
+    scope = db.Column(db.String(16), primary_key=True)
+    scope_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False)
+
+    STUDENT = 'student'
+    TEACHER = 'teacher'
+    REVIEWABLE = 'reviewable'
+
+    def __repr__(self):
+        return '<AssignmentVersion %r>' % ((self.scope, self.scope_id, self.version),)
+
+    @classmethod
+    def get(cls, scope, scope_id=0):
+        """Current version of the scope, 0 until something is written to it"""
+        return db.session.query(cls.version).filter(cls.scope == scope, cls.scope_id == scope_id).scalar() or 0
+
+
+class AssignmentCounter(db.Model):
+    """
+    Number of assignments per (teacher_id, state, grade, student_id). Kept in step with
+    `assignments` by triggers (see the assignment_counters migration), in the same transaction as
+    every insert, update and delete, whichever code path issues it.
+    """
+    __tablename__ = 'assignment_counters'
+    teacher_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    state = db.Column(db.String(16), primary_key=True)
+    grade = db.Column(db.String(1), primary_key=True)
+    student_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    count = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_assignment_counters_student_id', 'student_id'),
+    )
+
+    def __repr__(self):
+        return '<AssignmentCounter %r>' % ((self.teacher_id, self.state, self.grade, self.student_id),)
+
+    @classmethod
+    def summarize(cls, teacher_id=None, student_id=None, states=REVIEWABLE_STATES):
+        """Totals by state and by grade over the counters matching the given keys"""
+        query = db.session.query(cls.state, cls.grade, func.sum(cls.count)).filter(cls.state.in_(states))
+        if teacher_id is not None:
+            query = query.filter(cls.teacher_id == teacher_id)
+        if student_id is not None:
+            query = query.filter(cls.student_id == student_id)
+
+        by_state = {state: 0 for state in states}
+        by_grade = {grade.value: 0 for grade in GradeEnum}
+        for state, grade, count in query.group_by(cls.state, cls.grade):
+            by_state[state] += count
+            if grade != NO_GRADE:
+                by_grade[grade] += count
+        return {'total': sum(by_state.values()), 'by_state': by_state, 'by_grade': by_grade}
+
+    @classmethod
+    def graded_per_student(cls):
+        """(student_id, count) of assignments with a grade, by student_id"""
+        return db.session.query(cls.student_id, func.sum(cls.count)).filter(
+            cls.grade != NO_GRADE
+        ).group_by(cls.student_id).order_by(cls.student_id).all()
+
+    @classmethod
+    def grade_a_for_top_grader(cls):
+        """Grade A count of the teacher with the most GRADED assignments (the lowest teacher_id among equals)"""
+        top_grader = db.session.query(cls.teacher_id).filter(
+            cls.state == AssignmentStateEnum.GRADED.value
+        ).group_by(cls.teacher_id).order_by(func.sum(cls.count).desc(), cls.teacher_id).limit(1).scalar()
+        # assignments graded without a teacher match no teacher_id, as NULL does in SQL
+        if top_grader is None or top_grader == NO_TEACHER:
+            return 0
+        return db.session.query(func.coalesce(func.sum(cls.count), 0)).filter(
+            cls.teacher_id == top_grader, cls.grade == GradeEnum.A.value
+        ).scalar()
+
+    @classmethod
+    def recount(cls):
+        """What the counters should hold, counted from `assignments`"""
+        teacher_id = func.coalesce(Assignment.teacher_id, NO_TEACHER)
+        grade = func.coalesce(Assignment.grade, NO_GRADE, type_=db.String)
+        return db.session.query(teacher_id, Assignment.state, grade, Assignment.student_id, func.count()).group_by(
+            teacher_id, Assignment.state, grade, Assignment.student_id
+        )
+
+    @classmethod
+    def find_mismatches(cls):
+        """[(key, stored count, counted count)] wherever the counters disagree with `assignments`"""
+        counted = {
+            (teacher_id, state.value, grade, student_id): count
+            for teacher_id, state, grade, student_id, count in cls.recount()
+        }
+        stored = {
+            (row.teacher_id, row.state, row.grade, row.student_id): row.count for row in db.session.query(cls)
+        }
+        return sorted(
+            (key, stored.get(key, 0), counted.get(key, 0))
+            for key in stored.keys() | counted.keys() if stored.get(key, 0) != counted.get(key, 0)
+        )
+
+    @classmethod
+    def rebuild(cls):
+        """Recounts every counter from `assignments`; the caller commits"""
+        db.session.query(cls).delete(synchronize_session=False)
+        db.session.execute(insert(cls.__table__).from_select(
+            ['teacher_id', 'state', 'grade', 'student_id', 'count'], cls.recount().statement
+        ))
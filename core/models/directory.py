@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import threading
+
+from core import db
+from core.libs import cooperative
+from core.models.students import Student
+from core.models.teachers import Teacher
+from sqlalchemy import select
+
+
+class DirectoryVersion(db.Model):
+    """Single row bumped by triggers whenever teachers or students change"""
+    __tablename__ = 'directory_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return '<DirectoryVersion %r>' % self.version
+
+
+class Directory:
+    """
+    Worker-local copy of the teachers and students tables. Every lookup first asks SQLite for the
+    `data_version` of a dedicated connection, which only moves when another connection commits; only
+    then is the version stamp read, and a table reloaded only when the stamp moved too. Writes to
+    other tables cost one extra query, writes to these tables a reload, and nothing is ever served
+    stale by a fixed TTL.
+    """
+
+    def __init__(self, models):
+        self.models = models
+        self.lock = threading.Lock()
+        self.connection = None
+        self.pid = None
+        self.data_version = None
+        self.stamp = None
+        self.rows = {}
+
+    def _connection(self):
+        # sqlite connections must not cross a fork
+        if self.pid != os.getpid():
+            self.connection = sqlite3.connect(db.engine.url.database, isolation_level=None, check_same_thread=False,
+                                              factory=cooperative.sqlite_factory())
+            self.pid = os.getpid()
+            self.data_version = None
+        return self.connection
+
+    def _validate(self):
+        connection = self._connection()
+        data_version = connection.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self.data_version:
+            return
+
+        stamp = connection.execute('SELECT version FROM directory_version').fetchone()[0]
+        if stamp != self.stamp:
+            # read after the stamp: a change in between only makes the next lookup reload again
+            self.rows = {}
+            self.stamp = stamp
+        self.data_version = data_version
+
+    def _rows(self, name):
+        with self.lock:
+            self._validate()
+            rows = self.rows.get(name)
+            if rows is None:
+                model = self.models[name]
+                # always from the primary, never from a follower a GET may be routed to
+                with db.engine.connect() as connection:
+                    rows = self.rows[name] = {
+                        row.id: row for row in connection.execute(select(model.__table__).order_by(model.id))
+                    }
+            return rows
+
+    def get_teachers(self):
+        return list(self._rows('teachers').values())
+
+    def get_teacher(self, _id):
+        return self._rows('teachers').get(_id)
+
+    def get_students(self):
+        return list(self._rows('students').values())
+
+    def get_student(self, _id):
+        return self._rows('students').get(_id)
+
+    def clear(self):
+        with self.lock:
+            self.rows = {}
+            self.data_version = self.stamp = None
+
+
+directory = Directory({'teachers': Teacher, 'students': Student})
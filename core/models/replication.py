@@ -0,0 +1,26 @@
+from core import db
+
+
+class ChangeLog(db.Model):
+    """
+    Ordered log of changed rows of the replicated tables, appended by triggers that
+    core/libs/replication.py creates while followers are configured, and shipped to them from there
+    """
+    __tablename__ = 'change_log'
+    __table_args__ = {'sqlite_autoincrement': True}
+    seq = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(32), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return '<ChangeLog %r>' % self.seq
+
+
+class ReplicationWrite(db.Model):
+    """Change log position of the last write of each user, for read-your-writes routing"""
+    __tablename__ = 'replication_writes'
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    seq = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return '<ReplicationWrite %r>' % self.user_id
@@ -0,0 +1,263 @@
+"""
+Columnar snapshot of the assignments table for principal reports.
+
+One file, shared by every worker through mmap: a header followed by one fixed-width integer column
+per attribute, the row of assignment `id` at position id - 1. Refreshing only copies rows updated
+since the watermark in the header, and clears the rows of the tombstones a trigger leaves in
+`assignment_deletions` past the one last applied. The file is rebuilt from scratch when ids outgrow
+its capacity, or when the live row count still differs from the table's (tombstones pruned before
+they were applied, inserts an update raced past), into a new inode that replaces the old one, so
+mappings other workers still hold stay valid.
+"""
+import fcntl
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import compress, repeat
+from operator import eq
+
+from flask import current_app
+
+from core import db
+from core.libs import cooperative, helpers
+from core.models.assignments import AssignmentStateEnum, GradeEnum
+
+MAGIC = b'ASNP'
+FORMAT_VERSION = 2
+
+# magic, format version, capacity, watermark, live rows, highest id, last applied tombstone
+HEADER = struct.Struct('<4sIQqQQq')
+HEADER_SIZE = 64
+
+# the 8 byte column first, so every column starts aligned
+COLUMNS = (('updated_at', 'q'), ('student_id', 'i'), ('teacher_id', 'i'), ('grade', 'i'), ('state', 'i'))
+
+# 0 stands for NULL, and in `state` for an id with no row
+GRADE_CODES = {grade.value: code for code, grade in enumerate(GradeEnum, 1)}
+STATE_CODES = {state.value: code for code, state in enumerate(AssignmentStateEnum, 1)}
+
+MIN_CAPACITY = 1024
+
+# rows committed late with an older updated_at (the timestamp is taken at flush) are picked up as
+# long as they land within this many microseconds of the watermark
+REFRESH_OVERLAP = 5 * 1000 * 1000
+
+EPOCH = datetime(1970, 1, 1)
+
+ROWS_QUERY = 'SELECT id, updated_at, student_id, teacher_id, grade, state FROM assignments'
+
+DELETIONS_QUERY = 'SELECT seq, assignment_id FROM assignment_deletions WHERE seq > ? ORDER BY seq'
+
+
+def to_micros(timestamp):
+    delta = datetime.fromisoformat(timestamp) - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def from_micros(micros):
+    # the text form SQLAlchemy stores, so the comparison in SQL stays a string comparison
+    return str(EPOCH + timedelta(microseconds=micros))
+
+
+def file_size(capacity):
+    return HEADER_SIZE + sum(struct.calcsize(typecode) * capacity for _, typecode in COLUMNS)
+
+
+def column_views(buffer, capacity):
+    views, offset = [], HEADER_SIZE
+    for _, typecode in COLUMNS:
+        size = struct.calcsize(typecode) * capacity
+        views.append(buffer[offset:offset + size].cast(typecode))
+        offset += size
+    return views
+
+
+def write_row(columns, row):
+    _id, updated_at, student_id, teacher_id, grade, state = row
+    position = _id - 1
+    columns[0][position] = to_micros(updated_at)
+    columns[1][position] = student_id
+    columns[2][position] = teacher_id or 0
+    columns[3][position] = GRADE_CODES.get(grade, 0)
+    columns[4][position] = STATE_CODES[state]
+    return columns[0][position]
+
+
+class AssignmentDeletion(db.Model):
+    """Tombstone of a deleted assignment, left by a trigger (see the assignment_deletions migration)"""
+    __tablename__ = 'assignment_deletions'
+    __table_args__ = {'sqlite_autoincrement': True}
+    seq = db.Column(db.Integer, primary_key=True)
+    assignment_id = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return '<AssignmentDeletion %r>' % self.seq
+
+
+class AssignmentSnapshot:
+    """
+    Worker-side handle on the snapshot file. Reports refresh it at most every
+    REPORTS_REFRESH_INTERVAL seconds, and only when `data_version` says someone committed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.connection = None
+        self.data_version = None
+        self.checked_at = None
+        self.path = None
+        self.inode = None
+        self.buffer = None
+        self.columns = None
+
+    def _connection(self):
+        # sqlite connections must not cross a fork
+        if self.pid != os.getpid():
+            self.connection = sqlite3.connect(db.engine.url.database, isolation_level=None, check_same_thread=False,
+                                              factory=cooperative.sqlite_factory())
+            self.pid = os.getpid()
+            self.data_version = self.checked_at = None
+        return self.connection
+
+    def _map(self, path):
+        """Maps the file at `path` unless already mapped; False when missing or not a valid snapshot"""
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            return False
+        if (path, inode) == (self.path, self.inode):
+            return True
+
+        # mappings are never closed explicitly: a reader may still iterate the previous one
+        self.path = self.inode = self.buffer = self.columns = None
+        with open(path, 'r+b') as snapshot_file:
+            buffer = memoryview(mmap.mmap(snapshot_file.fileno(), 0))
+        magic, version, capacity = HEADER.unpack_from(buffer)[:3]
+        if magic != MAGIC or version != FORMAT_VERSION or len(buffer) != file_size(capacity):
+            return False
+
+        self.path, self.inode, self.buffer = path, inode, buffer
+        self.columns = column_views(buffer, capacity)
+        return True
+
+    def _header(self):
+        return HEADER.unpack_from(self.buffer)[2:]
+
+    def _rebuild(self, connection, path, max_id):
+        capacity = MIN_CAPACITY
+        while capacity < max_id * 2:
+            capacity *= 2
+
+        staging_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(staging_path, 'w+b') as staging_file:
+            staging_file.truncate(file_size(capacity))
+            staging = mmap.mmap(staging_file.fileno(), 0)
+            buffer = memoryview(staging)
+            columns = column_views(buffer, capacity)
+            watermark = live = 0
+            for row in connection.execute(ROWS_QUERY):
+                watermark = max(watermark, write_row(columns, row))
+                live += 1
+            deleted_seq = connection.execute('SELECT coalesce(max(seq), 0) FROM assignment_deletions').fetchone()[0]
+            HEADER.pack_into(buffer, 0, MAGIC, FORMAT_VERSION, capacity, watermark, live, max_id, deleted_seq)
+            for view in columns:
+                view.release()
+            buffer.release()
+            staging.flush()
+            staging.close()
+        os.replace(staging_path, path)
+        self._map(path)
+
+    def _apply_changes(self, connection, total, max_id):
+        """
+        Clears deleted rows, then copies rows changed since the watermark (an id deleted and taken
+        again comes back with its new row); False when the snapshot needs a rebuild instead
+        """
+        capacity, watermark, live, _, deleted_seq = self._header()
+        if max_id > capacity:
+            return False
+
+        state = self.columns[4]
+        for deleted_seq, assignment_id in connection.execute(DELETIONS_QUERY, (deleted_seq,)):
+            if assignment_id <= capacity and state[assignment_id - 1]:
+                for column in self.columns:
+                    column[assignment_id - 1] = 0
+                live -= 1
+
+        since = from_micros(max(watermark - REFRESH_OVERLAP, 0))
+        for row in connection.execute(ROWS_QUERY + ' WHERE updated_at >= ?', (since,)):
+            if not state[row[0] - 1]:
+                live += 1
+            watermark = max(watermark, write_row(self.columns, row))
+
+        HEADER.pack_into(self.buffer, 0, MAGIC, FORMAT_VERSION, capacity, watermark, live, max_id, deleted_seq)
+        return live == total
+
+    def refresh(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        connection = self._connection()
+        with helpers.file_lock(path, fcntl.LOCK_EX):
+            data_version = connection.execute('PRAGMA data_version').fetchone()[0]
+            mapped = self._map(path)
+            if mapped and data_version == self.data_version:
+                return
+
+            # one read transaction, so the totals and the changed rows agree
+            connection.execute('BEGIN')
+            try:
+                total, max_id = connection.execute('SELECT count(*), coalesce(max(id), 0) FROM assignments').fetchone()
+                if not mapped or not self._apply_changes(connection, total, max_id):
+                    self._rebuild(connection, path, max_id)
+            finally:
+                connection.execute('COMMIT')
+            self.data_version = data_version
+
+    @contextmanager
+    def _read(self):
+        """Columns cut to the highest id, fresh within REPORTS_REFRESH_INTERVAL and held still by a shared lock"""
+        config = current_app.config
+        path = os.path.join(current_app.root_path, config['REPORTS_SNAPSHOT_PATH'])
+        with self.lock:
+            now = time.monotonic()
+            if self.checked_at is None or now - self.checked_at >= config['REPORTS_REFRESH_INTERVAL'] \
+                    or not self._map(path):
+                self.refresh(path)
+                self.checked_at = now
+
+            with helpers.file_lock(path, fcntl.LOCK_SH):
+                # a rebuild in another worker may have replaced the file since
+                self._map(path)
+                max_id = self._header()[3]
+                yield [column[:max_id] for column in self.columns]
+
+    def graded_per_student(self):
+        """(student_id, count) of assignments with a grade, by student_id"""
+        with self._read() as (_, student_id, _, grade, _):
+            return sorted(Counter(compress(student_id, grade)).items())
+
+    def grade_a_for_top_grader(self):
+        """
+        (teacher_id, graded count, grade A count) for the teacher with the most GRADED assignments,
+        the lowest teacher_id among equals; (None, 0, 0) when nothing is graded.
+        """
+        with self._read() as (_, _, teacher_id, grade, state):
+            graded = Counter(compress(teacher_id, map(eq, state, repeat(STATE_CODES['GRADED']))))
+            if not graded:
+                return None, 0, 0
+
+            top_teacher_id, graded_count = max(graded.items(), key=lambda item: (item[1], -item[0]))
+            grade_a = Counter(compress(teacher_id, map(eq, grade, repeat(GRADE_CODES['A']))))
+            # graded without a teacher: the NULL group matches no teacher_id, as in SQL
+            if not top_teacher_id:
+                return None, graded_count, 0
+            return top_teacher_id, graded_count, grade_a[top_teacher_id]
+
+
+assignment_snapshot = AssignmentSnapshot()
@@ -1,5 +1,9 @@
 from core import db
 from core.libs import helpers
+from core.models.principals import Principal
+from core.models.students import Student
+from core.models.teachers import Teacher
+from sqlalchemy import and_, select
 
 
 class User(db.Model):
@@ -25,3 +29,19 @@ class User(db.Model):
     @classmethod
     def get_by_email(cls, email):
         return cls.filter(cls.email == email).first()
+
+    @classmethod
+    def resolve_principal(cls, user_id, student_id=None, teacher_id=None, principal_id=None):
+        """
+        One query for the user and each role id it claims; a claimed role id only resolves when it
+        belongs to that user. Returns None for unknown users. Always read from the primary: users
+        are not replicated, and a GET may be routed to a follower.
+        """
+        roles = {'student_id': (Student, student_id), 'teacher_id': (Teacher, teacher_id),
+                 'principal_id': (Principal, principal_id)}
+        query = select(cls.id.label('user_id'), cls.username, *[model.id.label(key) for key, (model, _) in roles.items()])
+        source = cls.__table__
+        for model, _id in roles.values():
+            source = source.outerjoin(model, and_(model.id == _id, model.user_id == cls.id))
+        with db.engine.connect() as connection:
+            return connection.execute(query.select_from(source).where(cls.id == user_id)).first()
@@ -1,44 +1,4 @@
-from flask import jsonify
-from marshmallow.exceptions import ValidationError
-from core import app
-from core.apis.assignments import student_assignments_resources, teacher_assignments_resources, principal_assignments_resources
-from core.libs import helpers
-from core.libs.exceptions import FyleError
-from werkzeug.exceptions import HTTPException
+"""The app gunicorn serves (core.server:app) and the flask command loads (FLASK_APP=core/server.py)"""
+from core import create_app
 
-from sqlalchemy.exc import IntegrityError
-
-app.register_blueprint(student_assignments_resources, url_prefix='/student')
-app.register_blueprint(teacher_assignments_resources, url_prefix='/teacher')
-app.register_blueprint(principal_assignments_resources, url_prefix='/principal')
-
-@app.route('/')
-def ready():
-    response = jsonify({
-        'status': 'ready',
-        'time': helpers.get_utc_now()
-    })
-
-    return response
-
-
-@app.errorhandler(Exception)
-def handle_error(err):
-    if isinstance(err, FyleError):
-        return jsonify(
-            error=err.__class__.__name__, message=err.message
-        ), err.status_code
-    elif isinstance(err, ValidationError):
-        return jsonify(
-            error=err.__class__.__name__, message=err.messages
-        ), 400
-    elif isinstance(err, IntegrityError):
-        return jsonify(
-            error=err.__class__.__name__, message=str(err.orig)
-        ), 400
-    elif isinstance(err, HTTPException):
-        return jsonify(
-            error=err.__class__.__name__, message=str(err)
-        ), err.code
-
-    raise err
+app = create_app()
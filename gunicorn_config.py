@@ -1,5 +1,27 @@
+import gc
 import os
 
+# development: each worker imports the app itself and code changes reload it.
+# production: the app is loaded once in the master and shared copy-on-write with the workers,
+# which warm up before the readiness route reports them ready (core/libs/lifecycle.py).
+profile = os.environ.get('GUNICORN_PROFILE', 'development')
+if profile not in ('development', 'production'):
+    raise ValueError('GUNICORN_PROFILE should be development or production, got {0!r}'.format(profile))
+
+if profile == 'production':
+    os.environ.setdefault('WARMUP_ENABLED', '1')
+    # no collections in the master while the app loads: freed objects would leave holes in pages
+    # the workers share. Enabled again in when_ready, once everything loaded is frozen.
+    gc.disable()
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+if worker_class == 'gevent':
+    # before anything imports socket, ssl or threading. gunicorn patches again in each gevent worker,
+    # but by then a preloaded app has already created its locks and connections unpatched.
+    # core/libs/cooperative.py takes it from here.
+    from gevent import monkey
+    monkey.patch_all()
+
 # https://docs.gunicorn.org/en/stable/settings.html
 
 proc_name = 'fyle-interview-be'
@@ -14,12 +36,12 @@ timeout      = int(os.environ.get('GUNICORN_WORKER_TIMEOUT', 60))
 keepalive    = int(os.environ.get('GUNICORN_KEEPALIVE', 2))
 
 loglevel     = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
-worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
 max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
 max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 20))
 graceful_timeout = int(os.environ.get('GUNICORN_WORKER_GRACEFUL_TIMEOUT', 5))
 
-reload = True
+preload_app = profile == 'production'
+reload = profile == 'development'
 
 limit_request_line = 0
 
@@ -40,6 +62,16 @@ access_log_format = '%({X-Real-IP}i)s - - - %(t)s.%(T)s "%(r)s" "%(f)s" "%(a)s"
 
 def post_fork(server, worker):
     server.log.info("Worker spawned (pid: %s)", worker.pid)
+    if preload_app:
+        from core.libs import lifecycle
+
+        lifecycle.after_fork(server.app.wsgi())
+
+
+def post_worker_init(worker):
+    from core.libs import lifecycle
+
+    lifecycle.start_warmup(worker.wsgi)
 
 
 def pre_fork(server, worker):
@@ -52,6 +84,11 @@ def pre_exec(server):
 
 def when_ready(server):
     server.log.info("Server is ready. Spawning workers")
+    if preload_app:
+        # what the preloaded app allocated is never scanned by a worker's collections, which would
+        # otherwise write to those objects and copy their pages
+        gc.freeze()
+        gc.enable()
 
 
 def worker_int(worker):
@@ -0,0 +1,89 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from core import db
+from core.libs import helpers
+from core.models.assignments import Assignment
+from core.models.counters import AssignmentVersion
+
+# a cursor far in the past, so the seek predicate is part of the planned statement
+CURSOR = (helpers.get_utc_now().replace(year=2000), 0)
+
+
+@contextmanager
+def capture_selects(table):
+    """Collects every SELECT on `table` issued inside the block"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'FROM ' + table in statement:
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def capture_assignment_selects():
+    return capture_selects('assignments')
+
+
+def query_plan(statement, parameters):
+    rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, tuple(parameters))
+    return [row[-1] for row in rows]
+
+
+def assert_no_table_scan(call):
+    """
+    Fails on full table scans and on sorts. Walking an index in order is fine: every
+    listing is LIMITed, so an ordered index scan stops after one page.
+    """
+    with capture_assignment_selects() as statements:
+        call()
+
+    assert statements, 'no query on assignments was issued'
+    for statement, parameters in statements:
+        for detail in query_plan(statement, parameters):
+            # 'SCAN TABLE assignments' before SQLite 3.36
+            assert not detail.startswith('SCAN') or 'USING' in detail, '{0}\n  -> {1}'.format(statement, detail)
+            assert 'TEMP B-TREE' not in detail, '{0}\n  -> {1}'.format(statement, detail)
+
+
+def test_get_by_id_uses_primary_key():
+    assert_no_table_scan(lambda: Assignment.get_by_id(1))
+
+
+def test_get_assignments_by_student_uses_index():
+    assert_no_table_scan(lambda: Assignment.get_assignments_by_student(1))
+    assert_no_table_scan(lambda: Assignment.get_assignments_by_student(1, cursor=CURSOR))
+
+
+def test_get_assignments_by_teacher_uses_index():
+    assert_no_table_scan(lambda: Assignment.get_assignments_by_teacher(1))
+    assert_no_table_scan(lambda: Assignment.get_assignments_by_teacher(1, cursor=CURSOR))
+
+
+def test_get_submitted_assignments_by_student_uses_index():
+    assert_no_table_scan(lambda: Assignment.get_submitted_assignments_by_student(1))
+    assert_no_table_scan(lambda: Assignment.get_submitted_assignments_by_student(1, cursor=CURSOR))
+
+
+def test_get_all_graded_and_submitted_assignments_uses_index():
+    assert_no_table_scan(lambda: Assignment.get_all_graded_and_submitted_assignments())
+    assert_no_table_scan(lambda: Assignment.get_all_graded_and_submitted_assignments(cursor=CURSOR))
+
+
+def test_list_versions_do_not_read_assignments():
+    for scope, scope_id in ((AssignmentVersion.STUDENT, 1), (AssignmentVersion.TEACHER, 1),
+                            (AssignmentVersion.REVIEWABLE, 0)):
+        with capture_assignment_selects() as statements, capture_selects('assignment_versions') as version_statements:
+            AssignmentVersion.get(scope, scope_id)
+
+        assert statements == []
+        assert version_statements
+        for statement, parameters in version_statements:
+            for detail in query_plan(statement, parameters):
+                assert detail.startswith('SEARCH') and 'scope_id=?' in detail, '{0}\n  -> {1}'.format(statement, detail)
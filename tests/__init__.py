@@ -1,2 +1,23 @@
-from core.server import app
+import os
+import tempfile
+
+from flask_migrate import upgrade
+
+from core import create_app
+
+app = create_app(migrations=True)
 app.testing = True
+app.config['QUERY_ACCOUNTING_HEADERS'] = True
+app.config['QUERY_BUDGET_STRICT'] = True
+# histograms of test requests stay out of core/metrics/
+app.config['METRICS_DIR'] = tempfile.mkdtemp(prefix='metrics-')
+
+# core/store.sqlite3 is not versioned: it is created, or brought up to the latest migration, here
+with app.app_context():
+    upgrade(directory=os.path.join(app.root_path, 'migrations'))
+
+
+def read_sql(name):
+    """Contents of tests/SQL/<name>.sql"""
+    with open(os.path.join(os.path.dirname(__file__), 'SQL', name + '.sql'), encoding='utf8') as fo:
+        return fo.read()
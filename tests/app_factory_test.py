@@ -0,0 +1,36 @@
+import subprocess
+import sys
+
+from core import create_app, db
+from tests import app
+
+NO_SIDE_EFFECTS = '''
+import sys
+import core
+assert not hasattr(core, 'app')
+assert 'core.apis.assignments' not in sys.modules
+assert 'flask_migrate' not in sys.modules
+assert 'marshmallow' not in sys.modules
+'''
+
+
+def test_importing_core_builds_nothing():
+    subprocess.run([sys.executable, '-c', NO_SIDE_EFFECTS], check=True)
+
+
+def test_create_app_registers_everything():
+    other = create_app(migrations=False)
+
+    assert other is not app
+    assert set(other.view_functions) == set(app.view_functions)
+    assert 'migrate' not in other.extensions
+    # code outside an app context keeps using the first app
+    assert db.app is app
+
+    response = other.test_client().get('/')
+    assert response.status_code == 200
+    assert response.json['status'] == 'ready'
+
+
+def test_create_app_with_migrations():
+    assert 'migrate' in create_app(migrations=True).extensions
@@ -0,0 +1,21 @@
+from core.libs.cache import MISSING, TTLCache
+
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is MISSING
+    assert cache.get('a') == 1
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', None, ttl=-1)
+
+    assert cache.get('a') is MISSING
+    assert cache.stats()['size'] == 0
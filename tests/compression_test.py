@@ -0,0 +1,60 @@
+import gzip
+import json
+
+
+def test_large_response_is_compressed(client, h_principal):
+    plain = client.get('/principal/assignments', headers=h_principal)
+    response = client.get('/principal/assignments', headers={**h_principal, 'Accept-Encoding': 'gzip, deflate'})
+
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert len(response.data) < len(plain.data)
+    assert json.loads(gzip.decompress(response.data)) == plain.json
+
+
+def test_gzip_not_accepted(client, h_principal):
+    for accept_encoding in ('identity', 'gzip;q=0, deflate'):
+        response = client.get('/principal/assignments', headers={**h_principal, 'Accept-Encoding': accept_encoding})
+        assert 'Content-Encoding' not in response.headers
+        assert response.json['status_code'] == 200
+
+
+def test_small_response_is_not_compressed(client):
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.json['status'] == 'ready'
+
+
+def test_stream_is_compressed(client, h_principal):
+    plain = client.get('/principal/assignments?stream=true', headers=h_principal)
+    response = client.get('/principal/assignments?stream=true', headers={**h_principal, 'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == plain.data
+
+
+def test_etags_are_weak_when_gzip_is_negotiated(client, h_principal):
+    headers = {**h_principal, 'Accept-Encoding': 'gzip'}
+    response = client.get('/principal/assignments', headers=headers)
+    etag = response.headers['ETag']
+    assert etag.startswith('W/"')
+
+    response = client.get('/principal/assignments', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_vary_is_sent_whether_compressed_or_not(client, h_principal):
+    for headers in ({'Accept-Encoding': 'gzip'}, {'Accept-Encoding': 'identity'}, {}):
+        large = client.get('/principal/assignments', headers={**h_principal, **headers})
+        small = client.get('/', headers=headers)
+        assert 'Accept-Encoding' in large.headers['Vary']
+        assert 'Accept-Encoding' in small.headers['Vary']
+
+    etag = client.get('/principal/assignments', headers=h_principal).headers['ETag']
+    response = client.get('/principal/assignments', headers={**h_principal, 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert 'Accept-Encoding' in response.headers['Vary']
@@ -0,0 +1,35 @@
+import pytest
+
+from core import config, db
+
+
+def test_default_profile_pragmas_are_applied():
+    connection = db.session.connection()
+
+    assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+    assert connection.exec_driver_sql('PRAGMA busy_timeout').scalar() == 5000
+    assert connection.exec_driver_sql('PRAGMA foreign_keys').scalar() == 1
+
+
+def test_environment_overrides_profile():
+    settings = config.get_settings({'APP_DB_PROFILE': 'durable', 'SQLITE_SYNCHRONOUS': 'extra', 'DB_POOL_SIZE': '2'})
+
+    assert settings['synchronous'] == 'EXTRA'
+    assert settings['pool_size'] == 2
+    assert settings['busy_timeout'] == config.PROFILES['durable']['busy_timeout']
+    assert 'PRAGMA synchronous=EXTRA;' in config.get_sqlite_pragmas(settings)
+
+
+def test_legacy_profile_does_not_pool():
+    options = config.get_engine_options(config.get_settings({'APP_DB_PROFILE': 'legacy'}))
+
+    assert options['poolclass'].__name__ == 'NullPool'
+
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        config.get_settings({'APP_DB_PROFILE': 'fastest'})
+    with pytest.raises(ValueError):
+        config.get_settings({'SQLITE_JOURNAL_MODE': 'wal2'})
+    with pytest.raises(ValueError):
+        config.get_settings({'SQLITE_MMAP_SIZE': 'lots'})
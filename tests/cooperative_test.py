@@ -0,0 +1,65 @@
+import sqlite3
+
+from core.libs import cooperative
+
+
+class InlinePool:
+    """Runs calls in place, recording them, like gevent's ThreadPool.apply minus the threads"""
+
+    def __init__(self):
+        self.calls = []
+
+    def apply(self, func, args=()):
+        self.calls.append(func.__name__)
+        return func(*args)
+
+
+def test_plain_sqlite_without_gevent():
+    options = {'connect_args': {'timeout': 5}}
+
+    assert not cooperative.is_patched()
+    assert cooperative.sqlite_factory() is sqlite3.Connection
+    assert cooperative.engine_options(options) is options
+    assert cooperative.session_options() == {}
+
+
+def test_engine_options_under_gevent(monkeypatch):
+    monkeypatch.setattr(cooperative, 'is_patched', lambda: True)
+    options = {'connect_args': {'timeout': 5}}
+
+    patched = cooperative.engine_options(options)
+
+    assert patched['connect_args'] == {
+        'timeout': 5, 'factory': cooperative.OffloadedConnection, 'check_same_thread': False
+    }
+    assert options == {'connect_args': {'timeout': 5}}
+
+
+def test_statements_run_on_the_pool(monkeypatch):
+    pool = InlinePool()
+    monkeypatch.setattr(cooperative, 'get_threadpool', lambda: pool)
+
+    connection = sqlite3.connect(':memory:', factory=cooperative.OffloadedConnection)
+    connection.execute('CREATE TABLE t (x INTEGER)')
+    connection.executemany('INSERT INTO t VALUES (?)', [(1,), (2,)])
+    connection.commit()
+    rows = connection.cursor().execute('SELECT x FROM t ORDER BY x').fetchall()
+    connection.close()
+
+    assert rows == [(1,), (2,)]
+    assert pool.calls == ['execute', 'executemany', 'commit', 'execute', 'fetchall']
+
+
+def test_iteration_runs_on_the_pool(monkeypatch):
+    pool = InlinePool()
+    monkeypatch.setattr(cooperative, 'get_threadpool', lambda: pool)
+    monkeypatch.setattr(cooperative, 'ITER_BATCH_SIZE', 2)
+
+    connection = sqlite3.connect(':memory:', factory=cooperative.OffloadedConnection)
+    cursor = connection.execute('SELECT value FROM (SELECT 1 AS value UNION ALL SELECT 2 UNION ALL SELECT 3) ORDER BY value')
+    first = next(cursor)
+    rest = [row for row in cursor]
+    connection.close()
+
+    assert [first, *rest] == [(1,), (2,), (3,)]
+    assert pool.calls == ['execute', '__next__', 'fetchmany', 'fetchmany']
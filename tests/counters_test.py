@@ -0,0 +1,112 @@
+from sqlalchemy import text
+
+from core import db
+from core.cli import counters_cli
+from core.models.counters import AssignmentCounter, AssignmentVersion
+from tests import app, read_sql
+
+
+def test_counters_follow_the_assignment_lifecycle(client, h_student_1, h_teacher_1):
+    before = client.get('/teacher/assignments/counts', headers=h_teacher_1).json['data']
+
+    draft = client.post('/student/assignments', headers=h_student_1, json={'content': 'counted'}).json['data']
+    submitted = client.post('/student/assignments/submit', headers=h_student_1,
+                            json={'id': draft['id'], 'teacher_id': 1})
+    assert submitted.status_code == 200
+    after_submit = client.get('/teacher/assignments/counts', headers=h_teacher_1).json['data']
+    assert after_submit['by_state']['SUBMITTED'] == before['by_state']['SUBMITTED'] + 1
+
+    graded = client.post('/teacher/assignments/grade/bulk', headers=h_teacher_1,
+                         json=[{'id': draft['id'], 'grade': 'A'}])
+    assert graded.status_code == 200
+    after_grade = client.get('/teacher/assignments/counts', headers=h_teacher_1).json['data']
+    assert after_grade['by_state']['SUBMITTED'] == before['by_state']['SUBMITTED']
+    assert after_grade['by_state']['GRADED'] == before['by_state']['GRADED'] + 1
+    assert after_grade['by_grade']['A'] == before['by_grade']['A'] + 1
+    assert after_grade['total'] == before['total'] + 1
+
+    assert AssignmentCounter.find_mismatches() == []
+
+
+def test_deleting_a_draft_keeps_counters_consistent(client, h_student_1):
+    draft = client.post('/student/assignments', headers=h_student_1, json={'content': 'short lived'}).json['data']
+    client.delete('/student/assignments/{0}'.format(draft['id']), headers=h_student_1)
+
+    assert AssignmentCounter.find_mismatches() == []
+
+
+def test_versions_follow_the_assignment_lifecycle(client, h_student_1, h_teacher_1):
+    scopes = ((AssignmentVersion.STUDENT, 1), (AssignmentVersion.TEACHER, 1), (AssignmentVersion.TEACHER, 2),
+              (AssignmentVersion.REVIEWABLE, 0))
+
+    def bumped(since):
+        now = [AssignmentVersion.get(scope, scope_id) for scope, scope_id in scopes]
+        return now, [scope for scope, before, after in zip(scopes, since, now) if after != before]
+
+    versions, _ = bumped([None] * len(scopes))
+    draft = client.post('/student/assignments', headers=h_student_1, json={'content': 'versioned'}).json['data']
+    versions, changed = bumped(versions)
+    assert changed == [(AssignmentVersion.STUDENT, 1)]
+
+    client.post('/student/assignments/submit', headers=h_student_1, json={'id': draft['id'], 'teacher_id': 1})
+    versions, changed = bumped(versions)
+    assert changed == [(AssignmentVersion.STUDENT, 1), (AssignmentVersion.TEACHER, 1), (AssignmentVersion.REVIEWABLE, 0)]
+
+    # a row leaving a scope bumps it too
+    db.session.execute(text('UPDATE assignments SET teacher_id = 2 WHERE id = :id'), {'id': draft['id']})
+    versions, changed = bumped(versions)
+    assert changed == [(AssignmentVersion.STUDENT, 1), (AssignmentVersion.TEACHER, 1), (AssignmentVersion.TEACHER, 2),
+                       (AssignmentVersion.REVIEWABLE, 0)]
+    db.session.rollback()
+
+
+def test_teacher_counts_match_listing(client, h_teacher_1):
+    counts = client.get('/teacher/assignments/counts', headers=h_teacher_1)
+    listing = client.get('/teacher/assignments', headers=h_teacher_1, query_string={'stream': 'true'})
+
+    assert counts.status_code == 200
+    assert counts.json['data']['total'] == len(listing.json['data'])
+
+
+def test_principal_counts(client, h_principal):
+    everything = client.get('/principal/assignments/counts', headers=h_principal).json['data']
+    per_teacher = [
+        client.get('/principal/assignments/counts', headers=h_principal,
+                   query_string={'teacher_id': teacher_id}).json['data']['total']
+        for teacher_id in (1, 2)
+    ]
+
+    assert everything['total'] == db.session.execute(text(
+        "SELECT count(*) FROM assignments WHERE state IN ('SUBMITTED', 'GRADED')")).scalar()
+    assert sum(per_teacher) <= everything['total']
+
+
+def test_principal_counts_invalid_filter(client, h_principal):
+    response = client.get('/principal/assignments/counts', headers=h_principal, query_string={'student_id': 'x'})
+
+    assert response.status_code == 400
+    assert response.json['error'] == 'FyleError'
+
+
+def test_sql_reports_from_counters():
+    graded_per_student = db.session.execute(text(read_sql('number_of_graded_assignments_for_each_student')))
+    assert AssignmentCounter.graded_per_student() == [tuple(row) for row in graded_per_student]
+
+    grade_a_count = db.session.execute(text(read_sql('count_grade_A_assignments_by_teacher_with_max_grading')))
+    assert AssignmentCounter.grade_a_for_top_grader() == grade_a_count.scalar()
+
+
+def test_check_and_rebuild_commands():
+    runner = app.test_cli_runner()
+    assert runner.invoke(counters_cli, ['check']).exit_code == 0
+
+    # triggers only watch assignments, so this drift goes unnoticed until checked
+    db.session.execute(text('UPDATE assignment_counters SET count = count + 1 WHERE rowid = '
+                            '(SELECT min(rowid) FROM assignment_counters)'))
+    db.session.commit()
+    result = runner.invoke(counters_cli, ['check'])
+    assert result.exit_code == 1
+    assert 'stored' in result.output
+
+    assert runner.invoke(counters_cli, ['rebuild']).exit_code == 0
+    assert runner.invoke(counters_cli, ['check']).exit_code == 0
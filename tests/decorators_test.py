@@ -0,0 +1,48 @@
+import json
+
+from core.apis.decorators import principal_cache
+
+
+def principal_header(**claims):
+    return {'X-Principal': json.dumps(claims)}
+
+
+def test_unknown_principals_are_rejected(client):
+    for headers in (
+        principal_header(user_id=99, student_id=1),
+        principal_header(user_id=1, student_id=2),
+        principal_header(user_id=3, student_id=1),
+        principal_header(user_id='1', student_id=1),
+        {'X-Principal': 'not json'},
+        {'X-Principal': 'x' * 2000},
+    ):
+        response = client.get('/student/assignments', headers=headers)
+        assert response.status_code == 401
+        assert response.json['message'] == 'principal not found'
+
+
+def test_principal_is_cached(client, h_teacher_1):
+    principal_cache.clear()
+    client.get('/teacher/assignments', headers=h_teacher_1)
+    hits = principal_cache.hits
+
+    response = client.get('/teacher/assignments', headers=h_teacher_1)
+    assert response.status_code == 200
+    assert response.headers['X-Query-Count'] == '2'
+    assert principal_cache.hits == hits + 1
+
+
+def test_unknown_principal_is_cached(client):
+    headers = principal_header(user_id=1, teacher_id=1)
+    client.get('/teacher/assignments', headers=headers)
+
+    response = client.get('/teacher/assignments', headers=headers)
+    assert response.status_code == 401
+    assert response.headers['X-Query-Count'] == '0'
+
+
+def test_cache_stats_are_exposed(client):
+    response = client.get('/')
+
+    assert response.status_code == 200
+    assert set(response.json['principal_cache']) >= {'hits', 'misses', 'hit_rate', 'size'}
@@ -0,0 +1,57 @@
+import sqlite3
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from core import db
+from core.models.directory import directory
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def test_teacher_lookup():
+    assert directory.get_teacher(1).user_id == 3
+    assert directory.get_teacher(9999) is None
+    assert [teacher.id for teacher in directory.get_teachers()][:2] == [1, 2]
+    assert directory.get_student(2).user_id == 2
+
+
+def test_lookups_are_cached(client, h_student_1):
+    directory.get_teachers()
+
+    # a write to another table moves data_version but not the directory stamp
+    client.post('/student/assignments', headers=h_student_1, json={'content': 'unrelated write'})
+    with count_statements() as statements:
+        directory.get_teacher(1)
+        directory.get_teachers()
+
+    assert statements == []
+
+
+def test_changes_from_other_connections_invalidate():
+    assert directory.get_teacher(9999) is None
+
+    connection = sqlite3.connect(db.engine.url.database)
+    with connection:
+        connection.execute("INSERT INTO teachers (id, user_id, created_at, updated_at) "
+                           "VALUES (9999, 3, '2026-01-01 00:00:00', '2026-01-01 00:00:00')")
+    try:
+        assert directory.get_teacher(9999).user_id == 3
+    finally:
+        with connection:
+            connection.execute('DELETE FROM teachers WHERE id = 9999')
+        connection.close()
+
+    assert directory.get_teacher(9999) is None
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from core import create_app, db
+from core.libs import lifecycle
+from tests import app
+
+
+@pytest.fixture
+def cold_app(tmp_path, monkeypatch):
+    monkeypatch.setenv('WARMUP_ENABLED', '1')
+    monkeypatch.setenv('REPORTS_SNAPSHOT_PATH', str(tmp_path / 'assignments.snapshot'))
+    monkeypatch.setenv('METRICS_DIR', str(tmp_path / 'metrics'))
+    return create_app(migrations=False)
+
+
+def test_ready_without_warmup(client):
+    response = client.get('/')
+
+    assert response.status_code == 200
+    assert response.json['status'] == 'ready'
+
+
+def test_not_ready_until_warm(cold_app):
+    client = cold_app.test_client()
+
+    response = client.get('/')
+    assert response.status_code == 503
+    assert response.json['status'] == 'warming'
+
+    lifecycle.start_warmup(cold_app).join()
+
+    warmup = lifecycle.get_warmup(cold_app)
+    assert warmup.error is None
+    assert warmup.duration > 0
+    assert client.get('/').status_code == 200
+
+
+def test_failed_warmup_still_gets_ready(cold_app, monkeypatch):
+    def fail():
+        raise RuntimeError('no database')
+    monkeypatch.setattr(lifecycle, 'warm_queries', fail)
+
+    lifecycle.warm(cold_app)
+
+    assert lifecycle.get_warmup(cold_app).error == "RuntimeError('no database')"
+    assert cold_app.test_client().get('/').status_code == 200
+
+
+def test_after_fork_leaves_inherited_connections_alone():
+    engine = db.get_engine(app)
+    with engine.connect() as connection:
+        connection.exec_driver_sql('SELECT 1')
+    pool = engine.pool
+
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            lifecycle.after_fork(app)
+            with db.get_engine(app).connect() as connection:
+                count = connection.exec_driver_sql('SELECT count(*) FROM assignments').scalar()
+            code = 0 if engine.pool is not pool and count >= 0 else 1
+        finally:
+            os._exit(code)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    # the parent's pooled connection survived the child
+    assert engine.pool is pool
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql('SELECT 1').scalar() == 1
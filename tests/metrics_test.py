@@ -0,0 +1,115 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from core.apis import decorators
+from core.libs import metrics
+from tests import app
+
+LIST_ENDPOINT = 'student_assignments_resources.list_assignments'
+
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_DIR', str(tmp_path))
+    return tmp_path
+
+
+def parse_samples(text):
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+def server_timing(response):
+    return {
+        entry.split(';')[0].strip(): float(entry.split('dur=')[1])
+        for entry in response.headers['Server-Timing'].split(',')
+    }
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_server_timing_phases(client, h_student_1, metrics_dir):
+    decorators.principal_cache.clear()
+    response = client.get('/student/assignments', headers=h_student_1)
+
+    assert response.status_code == 200
+    timings = server_timing(response)
+    assert {'auth', 'db', 'serialization', 'encoding', 'total'} <= set(timings)
+    assert timings['total'] >= timings['encoding']
+
+    # a cached principal is not timed
+    response = client.get('/student/assignments', headers=h_student_1)
+    assert 'auth' not in server_timing(response)
+
+
+def test_phase_outside_timed_request():
+    with app.test_request_context('/student/assignments'):
+        with metrics.phase('serialization'):
+            pass
+        assert metrics.phase_times.get() is None
+
+
+def test_server_timing_validation(client, h_student_1, metrics_dir):
+    response = client.post('/student/assignments', headers=h_student_1, json={'content': 'timed essay'})
+
+    assert response.status_code == 200
+    assert 'validation' in server_timing(response)
+
+
+def test_metrics_histograms_and_counters(client, h_student_1, metrics_dir):
+    for _ in range(3):
+        client.get('/student/assignments', headers=h_student_1)
+    client.get('/student/assignments', headers={'X-Principal': 'not json'})
+    client.get('/no/such/route')
+
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    samples = parse_samples(response.get_data(as_text=True))
+    labels = 'endpoint="{0}",phase="total"'.format(LIST_ENDPOINT)
+    assert samples['http_request_phase_seconds_count{{{0}}}'.format(labels)] == 4
+    assert samples['http_request_phase_seconds_bucket{{{0},le="+Inf"}}'.format(labels)] == 4
+    assert samples['http_requests_total{{endpoint="{0}",status="2xx"}}'.format(LIST_ENDPOINT)] == 3
+    assert samples['http_requests_total{{endpoint="{0}",status="4xx"}}'.format(LIST_ENDPOINT)] == 1
+    assert samples['http_requests_total{{endpoint="{0}",status="4xx"}}'.format(metrics.UNMATCHED)] == 1
+
+
+def test_metrics_sum_across_workers(client, h_student_1, metrics_dir):
+    client.get('/student/assignments', headers=h_student_1)
+    layout = metrics.get_layout(app)
+    # another worker, still running and one that exited
+    for pid in (exited_pid(), 1):
+        values = metrics.map_values(str(metrics_dir / 'worker-{0}.metrics'.format(pid)), layout)
+        values[layout.route_offset(LIST_ENDPOINT) + layout.status_offset(200)] += 2
+
+    first = parse_samples(client.get('/metrics').get_data(as_text=True))
+    second = parse_samples(client.get('/metrics').get_data(as_text=True))
+
+    key = 'http_requests_total{{endpoint="{0}",status="2xx"}}'.format(LIST_ENDPOINT)
+    assert first[key] == 5
+    assert second[key] == 5
+    assert (metrics_dir / metrics.MERGED_NAME).exists()
+    assert sorted(path.name for path in metrics_dir.glob('worker-*')) == \
+        sorted(['worker-1.metrics', 'worker-{0}.metrics'.format(os.getpid())])
+
+
+def test_files_of_another_layout_are_ignored(client, h_student_1, metrics_dir):
+    values = metrics.map_values(str(metrics_dir / 'worker-1.metrics'), metrics.Layout(['some.other_view']))
+    values[0] += 7
+
+    client.get('/student/assignments', headers=h_student_1)
+    samples = parse_samples(client.get('/metrics').get_data(as_text=True))
+
+    assert samples['http_requests_total{{endpoint="{0}",status="2xx"}}'.format(LIST_ENDPOINT)] == 1
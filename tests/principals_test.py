@@ -151,8 +151,7 @@ def test_regrade_assignment_successful(client, h_principal):
     assert response.json['data']['grade'] == GradeEnum.A.value
 
 def test_list_teachers_empty(client, h_principal):
-    with patch('core.models.teachers.Teacher.query') as mock_query:
-        mock_query.all.return_value = []
+    with patch('core.models.directory.directory.get_teachers', return_value=[]):
         response = client.get('/principal/teachers', headers=h_principal)
 
     assert response.status_code == 200
@@ -166,4 +165,34 @@ def test_grade_assignment_missing_id(client, h_principal):
     )
 
     assert response.status_code == 400
-    assert 'id' in str(response.json['message'])
\ No newline at end of file
+    assert 'id' in str(response.json['message'])
+
+def test_bulk_grade_assignments(client, h_principal, h_student_2):
+    response = client.post('/student/assignments', headers=h_student_2, json={'content': 'bulk'})
+    assignment_id = response.json['data']['id']
+    client.post('/student/assignments/submit', headers=h_student_2, json={'id': assignment_id, 'teacher_id': 1})
+    draft_id = client.post('/student/assignments', headers=h_student_2, json={'content': 'draft'}).json['data']['id']
+
+    response = client.post(
+        '/principal/assignments/grade/bulk',
+        json=[{'id': assignment_id, 'grade': 'C'}, {'id': draft_id, 'grade': 'A'}],
+        headers=h_principal
+    )
+    assert response.status_code == 200
+    assert [result['status_code'] for result in response.json['data']] == [200, 400]
+
+    # graded assignments can be re-graded by the principal
+    response = client.post(
+        '/principal/assignments/grade/bulk',
+        json=[{'id': assignment_id, 'grade': 'A'}],
+        headers=h_principal
+    )
+    assert response.json['data'][0]['status_code'] == 200
+    assert response.json['data'][0]['data']['grade'] == GradeEnum.A.value
+
+
+def test_list_assignments_not_modified(client, h_principal):
+    etag = client.get('/principal/assignments', headers=h_principal).headers['ETag']
+
+    response = client.get('/principal/assignments', headers={**h_principal, 'If-None-Match': etag})
+    assert response.status_code == 304
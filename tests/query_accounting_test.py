@@ -0,0 +1,42 @@
+from collections import Counter
+
+import pytest
+
+from core.libs.query_accounting import QueryBudgetExceeded, repeated_selects
+from tests import app
+
+
+def test_every_api_route_declares_a_budget():
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint.startswith(('student_', 'teacher_', 'principal_')):
+            assert getattr(app.view_functions[rule.endpoint], 'query_budget', None) is not None, rule.rule
+
+
+def test_query_headers(client, h_student_1):
+    client.get('/student/assignments', headers=h_student_1)  # resolves and caches the principal
+    response = client.get('/student/assignments', headers=h_student_1)
+
+    assert response.status_code == 200
+    assert response.headers['X-Query-Count'] == '2'
+    assert response.headers['X-Query-Time'].endswith('ms')
+
+
+def test_query_budget_exceeded(client, h_student_1, monkeypatch):
+    """
+    failure case: a route going over its budget fails the request in strict mode
+    """
+    view = app.view_functions['student_assignments_resources.list_assignments']
+    monkeypatch.setattr(view, 'query_budget', 0)
+
+    with pytest.raises(QueryBudgetExceeded):
+        client.get('/student/assignments', headers=h_student_1)
+
+
+def test_repeated_selects():
+    statements = Counter({
+        'SELECT * FROM teachers WHERE id = ?': 3,
+        'SELECT * FROM assignments WHERE id = ?': 1,
+        'UPDATE assignments SET grade = ? WHERE id = ?': 5,
+    })
+
+    assert repeated_selects(statements) == {'SELECT * FROM teachers WHERE id = ?': 3}
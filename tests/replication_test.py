@@ -0,0 +1,166 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from core.libs.replication import Followers
+from tests import app
+
+
+@pytest.fixture
+def followers(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'REPLICATION_FOLLOWERS', [str(tmp_path / 'follower_1.sqlite3'),
+                                                              str(tmp_path / 'follower_2.sqlite3')])
+    monkeypatch.setitem(app.config, 'REPLICATION_SYNC_INTERVAL', 0)
+    # recording the principal's write position is one extra statement per write
+    monkeypatch.setitem(app.config, 'QUERY_BUDGET_STRICT', False)
+
+    followers = app.extensions['replication']
+    followers.sync_all()
+    yield followers
+
+    monkeypatch.setitem(app.config, 'REPLICATION_FOLLOWERS', [])
+    followers.configure()
+
+
+def test_get_served_by_follower(client, h_student_1, followers, monkeypatch):
+    response = client.get('/student/assignments', headers=h_student_1)
+
+    assert response.status_code == 200
+    assert response.headers['X-Read-Replica'] in ('0', '1')
+
+    monkeypatch.setitem(app.config, 'REPLICATION_MAX_STALENESS', -1)
+    primary = client.get('/student/assignments', headers=h_student_1)
+    assert 'X-Read-Replica' not in primary.headers
+    assert response.json['data'] == primary.json['data']
+
+
+def test_writes_are_not_routed(client, h_student_1, followers):
+    response = client.post('/student/assignments', headers=h_student_1, json={'content': 'draft'})
+
+    assert response.status_code == 200
+    assert 'X-Read-Replica' not in response.headers
+
+
+def test_read_your_writes(client, h_student_1, h_student_2, followers):
+    assignment_id = client.post('/student/assignments', headers=h_student_1, json={'content': 'draft'}).json['data']['id']
+
+    # the followers have not seen the draft yet: its author reads from the primary, others may not
+    response = client.get(f'/student/assignments/{assignment_id}', headers=h_student_1)
+    assert response.status_code == 200
+    assert 'X-Read-Replica' not in response.headers
+    assert 'X-Read-Replica' in client.get('/student/assignments', headers=h_student_2).headers
+
+    followers.sync_all()
+    response = client.get(f'/student/assignments/{assignment_id}', headers=h_student_1)
+    assert response.status_code == 200
+    assert 'X-Read-Replica' in response.headers
+    assert response.json['data']['content'] == 'draft'
+
+
+def test_stale_followers_are_skipped(client, h_student_1, followers, monkeypatch):
+    monkeypatch.setitem(app.config, 'REPLICATION_MAX_STALENESS', -1)
+
+    response = client.get('/student/assignments', headers=h_student_1)
+    assert response.status_code == 200
+    assert 'X-Read-Replica' not in response.headers
+
+
+def test_sync_applies_updates_and_deletes(client, h_student_1, followers):
+    assignment_id = client.post('/student/assignments', headers=h_student_1, json={'content': 'draft'}).json['data']['id']
+    followers.sync_all()
+    client.post('/student/assignments', headers=h_student_1, json={'id': assignment_id, 'content': 'edited'})
+    followers.sync_all()
+
+    for path in followers.paths:
+        follower = sqlite3.connect(path)
+        assert follower.execute('SELECT content FROM assignments WHERE id = ?', (assignment_id,)).fetchall() == [('edited',)]
+        follower.close()
+
+    client.delete(f'/student/assignments/{assignment_id}', headers=h_student_1)
+    followers.sync_all()
+
+    for path in followers.paths:
+        follower = sqlite3.connect(path)
+        assert follower.execute('SELECT count(*) FROM assignments WHERE id = ?', (assignment_id,)).fetchone() == (0,)
+        follower.close()
+
+
+def test_new_user_is_resolved_on_the_primary(client, followers):
+    from core import db
+
+    with db.engine.begin() as connection:
+        user_id = connection.exec_driver_sql(
+            "INSERT INTO users (username, email, created_at, updated_at) "
+            "VALUES ('student_new', 'student_new@fylebe.com', datetime('now'), datetime('now'))").lastrowid
+        student_id = connection.exec_driver_sql(
+            "INSERT INTO students (user_id, created_at, updated_at) VALUES (?, datetime('now'), datetime('now'))",
+            (user_id,)).lastrowid
+    headers = {'X-Principal': json.dumps({'user_id': user_id, 'student_id': student_id})}
+
+    try:
+        # the followers have not seen the user: the GET is still served, and not cached as unknown
+        response = client.get('/student/assignments', headers=headers)
+        assert response.status_code == 200
+        assert response.json['data'] == []
+
+        response = client.post('/student/assignments', headers=headers, json={'content': 'draft'})
+        assert response.status_code == 200
+    finally:
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('DELETE FROM assignments WHERE student_id = ?', (student_id,))
+            connection.exec_driver_sql('DELETE FROM students WHERE id = ?', (student_id,))
+            connection.exec_driver_sql('DELETE FROM users WHERE id = ?', (user_id,))
+
+
+def change_log_size(followers):
+    primary = sqlite3.connect(followers.primary_path)
+    try:
+        return primary.execute('SELECT count(*) FROM change_log').fetchone()[0]
+    finally:
+        primary.close()
+
+
+def test_nothing_is_logged_without_followers(client, h_student_1):
+    followers = app.extensions['replication']
+    followers.configure()
+
+    response = client.post('/student/assignments', headers=h_student_1, json={'content': 'draft'})
+    assert response.status_code == 200
+    assert change_log_size(followers) == 0
+
+
+def test_followers_rebuild_after_replication_was_off(client, h_student_1, followers, monkeypatch):
+    assert client.post('/student/assignments', headers=h_student_1, json={'content': 'draft'}).status_code == 200
+    assert change_log_size(followers) > 0
+
+    paths = app.config['REPLICATION_FOLLOWERS']
+    monkeypatch.setitem(app.config, 'REPLICATION_FOLLOWERS', [])
+    followers.configure()
+    assert change_log_size(followers) == 0
+    assignment_id = client.post('/student/assignments', headers=h_student_1, json={'content': 'unlogged'}).json['data']['id']
+
+    monkeypatch.setitem(app.config, 'REPLICATION_FOLLOWERS', paths)
+    followers.sync_all()
+    for path in followers.paths:
+        follower = sqlite3.connect(path)
+        assert follower.execute('SELECT content FROM assignments WHERE id = ?', (assignment_id,)).fetchall() == [('unlogged',)]
+        follower.close()
+
+
+def test_rebuild_by_another_worker_drops_old_connections(followers):
+    engine = followers.engines[0]
+    with engine.connect() as connection:
+        connection.exec_driver_sql('SELECT 1')
+    pool = engine.pool
+
+    # another worker finds the follower gone and bootstraps a new file
+    other = Followers(app, followers.db)
+    os.remove(followers.paths[0])
+    other.sync_all()
+    other.dispose()
+    assert not [name for name in os.listdir(os.path.dirname(followers.paths[0])) if name.endswith('.bootstrap')]
+
+    followers.sync_all()
+    assert engine.pool is not pool
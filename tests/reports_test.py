@@ -0,0 +1,96 @@
+import os
+import sqlite3
+
+import pytest
+from sqlalchemy import text
+
+from core import db
+from core.models.assignments import Assignment, AssignmentStateEnum, GradeEnum
+from tests import app, read_sql
+
+
+@pytest.fixture
+def snapshot_path(tmp_path, monkeypatch):
+    path = tmp_path / 'assignments.snapshot'
+    monkeypatch.setitem(app.config, 'REPORTS_SNAPSHOT_PATH', str(path))
+    monkeypatch.setitem(app.config, 'REPORTS_REFRESH_INTERVAL', 0)
+    return path
+
+
+def test_graded_per_student_matches_sql(client, h_principal, snapshot_path):
+    response = client.get('/principal/reports/graded-per-student', headers=h_principal)
+
+    assert response.status_code == 200
+    expected = db.session.execute(text(read_sql('number_of_graded_assignments_for_each_student'))).fetchall()
+    assert [(row['student_id'], row['graded_assignments_count']) for row in response.json['data']] == \
+        [tuple(row) for row in expected]
+
+
+def test_top_grader_matches_sql(client, h_principal, snapshot_path):
+    response = client.get('/principal/reports/top-grader', headers=h_principal)
+
+    assert response.status_code == 200
+    expected = db.session.execute(text(read_sql('count_grade_A_assignments_by_teacher_with_max_grading'))).scalar()
+    assert response.json['data']['grade_a_count'] == expected
+
+
+def test_changes_are_applied_incrementally(client, h_principal, snapshot_path):
+    before = client.get('/principal/reports/graded-per-student', headers=h_principal).json['data']
+    inode = os.stat(snapshot_path).st_ino
+
+    assignment = Assignment(student_id=2, teacher_id=2, content='report row', grade=GradeEnum.A,
+                            state=AssignmentStateEnum.GRADED)
+    db.session.add(assignment)
+    db.session.commit()
+    try:
+        after = client.get('/principal/reports/graded-per-student', headers=h_principal).json['data']
+    finally:
+        db.session.delete(assignment)
+        db.session.commit()
+
+    assert os.stat(snapshot_path).st_ino == inode
+    graded_before = {row['student_id']: row['graded_assignments_count'] for row in before}
+    graded_after = {row['student_id']: row['graded_assignments_count'] for row in after}
+    assert graded_after[2] == graded_before.get(2, 0) + 1
+
+
+def test_deletes_are_applied_incrementally(client, h_principal, snapshot_path):
+    connection = sqlite3.connect(db.engine.url.database)
+    with connection:
+        assignment_id = connection.execute(
+            "INSERT INTO assignments (student_id, teacher_id, content, grade, state, created_at, updated_at) "
+            "VALUES (2, 2, 'report row', 'A', 'GRADED', '2026-01-01 00:00:00', '2026-01-01 00:00:00')").lastrowid
+    try:
+        counts = client.get('/principal/reports/graded-per-student', headers=h_principal).json['data']
+        inode = os.stat(snapshot_path).st_ino
+    finally:
+        with connection:
+            connection.execute('DELETE FROM assignments WHERE id = ?', (assignment_id,))
+        connection.close()
+
+    recounted = client.get('/principal/reports/graded-per-student', headers=h_principal).json['data']
+    assert os.stat(snapshot_path).st_ino == inode
+    graded = {row['student_id']: row['graded_assignments_count'] for row in recounted}
+    assert {row['student_id']: row['graded_assignments_count'] for row in counts}[2] == graded.get(2, 0) + 1
+
+
+def test_missed_deletes_rebuild_the_snapshot(client, h_principal, snapshot_path):
+    connection = sqlite3.connect(db.engine.url.database)
+    with connection:
+        assignment_id = connection.execute(
+            "INSERT INTO assignments (student_id, teacher_id, content, grade, state, created_at, updated_at) "
+            "VALUES (2, 2, 'report row', 'A', 'GRADED', '2026-01-01 00:00:00', '2026-01-01 00:00:00')").lastrowid
+    try:
+        client.get('/principal/reports/graded-per-student', headers=h_principal)
+        inode = os.stat(snapshot_path).st_ino
+    finally:
+        with connection:
+            connection.execute('DELETE FROM assignments WHERE id = ?', (assignment_id,))
+            # as if pruned before this snapshot saw it
+            connection.execute('DELETE FROM assignment_deletions WHERE assignment_id = ?', (assignment_id,))
+        connection.close()
+
+    recounted = client.get('/principal/reports/graded-per-student', headers=h_principal).json['data']
+    assert os.stat(snapshot_path).st_ino != inode
+    expected = db.session.execute(text(read_sql('number_of_graded_assignments_for_each_student'))).fetchall()
+    assert [(row['student_id'], row['graded_assignments_count']) for row in recounted] == [tuple(row) for row in expected]
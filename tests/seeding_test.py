@@ -0,0 +1,68 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+
+from core import db
+from core.cli import seed_command
+from core.libs import seeding
+from tests import app
+
+
+@pytest.fixture
+def scratch_engine(tmp_path):
+    """Engine on a copy of the test database, so seeded rows stay out of the other tests"""
+    def copy(name):
+        path = str(tmp_path / name)
+        source, target = sqlite3.connect(db.engine.url.database), sqlite3.connect(path)
+        source.backup(target)
+        source.close()
+        target.close()
+        return create_engine('sqlite:///' + path)
+    return copy
+
+
+def assignment_rows(engine):
+    with engine.connect() as connection:
+        return connection.exec_driver_sql(
+            'SELECT student_id, teacher_id, grade, state, created_at, updated_at FROM assignments ORDER BY id'
+        ).fetchall()
+
+
+def test_parse_distribution():
+    assert seeding.parse_distribution('a=1,b=3', ('A', 'B')) == {'A': 1.0, 'B': 3.0}
+
+    for value in ('A=1,E=1', 'A=x', 'A=-1', 'A=0'):
+        with pytest.raises(ValueError):
+            seeding.parse_distribution(value, seeding.VALID_GRADES)
+
+
+def test_seed_is_reproducible(scratch_engine):
+    engines = [scratch_engine(name) for name in ('first.sqlite3', 'second.sqlite3', 'other.sqlite3')]
+    for engine, seed in zip(engines, (7, 7, 8)):
+        created = seeding.seed(engine, 500, students=5, teachers=2, principals=1, chunk_size=64,
+                               transaction_size=200, seed=seed)
+        assert [len(created[role]) for role in seeding.ROLES] == [5, 2, 1]
+
+    first, second, other = [assignment_rows(engine) for engine in engines]
+    assert first == second
+    assert first != other
+
+
+def test_seed_distributions(scratch_engine):
+    engine = scratch_engine('graded.sqlite3')
+    before = len(assignment_rows(engine))
+
+    seeding.seed(engine, 300, students=3, teachers=1, states={'GRADED': 1}, grades={'A': 1, 'B': 0})
+
+    added = assignment_rows(engine)[before:]
+    assert len(added) == 300
+    assert {(grade, state) for _, teacher_id, grade, state, _, _ in added} == {('A', 'GRADED')}
+    assert all(created_at <= updated_at for *_, created_at, updated_at in added)
+
+
+def test_seed_command_rejects_bad_distribution():
+    result = app.test_cli_runner().invoke(seed_command, ['--assignments', '10', '--states', 'DONE=1'])
+
+    assert result.exit_code == 2
+    assert 'should be one of' in result.output
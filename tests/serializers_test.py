@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from flask import json
+
+from core import db
+from core.apis.assignments.schema import AssignmentSchema, assignment_serializer
+from core.models.assignments import Assignment, AssignmentStateEnum, GradeEnum
+from tests import app
+
+
+def assert_same_json(compiled, marshmallow):
+    with app.app_context():
+        assert json.dumps(compiled).encode('utf8') == json.dumps(marshmallow).encode('utf8')
+
+
+def test_compiled_serializer_matches_schema_on_orm_instances():
+    assignments = Assignment.filter().all()
+    assert assignments
+
+    assert_same_json(
+        assignment_serializer.dump(assignments, many=True),
+        AssignmentSchema().dump(assignments, many=True)
+    )
+
+
+def test_compiled_serializer_matches_schema_on_plain_rows():
+    rows = db.session.execute(db.select(Assignment.__table__)).all()
+    assert rows
+
+    for row in rows:
+        assert_same_json(assignment_serializer.dump(row), AssignmentSchema().dump(row))
+
+
+def test_compiled_serializer_matches_schema_on_empty_and_filled_values():
+    timestamp = datetime(2024, 1, 7, 19, 15, 22, 771993)
+    assignments = [
+        Assignment(id=None, student_id=1, content=None, state=AssignmentStateEnum.DRAFT,
+                   created_at=timestamp, updated_at=timestamp),
+        Assignment(id=7, student_id=1, teacher_id=2, content='ünïcode "quoted"', grade=GradeEnum.D,
+                   state=AssignmentStateEnum.GRADED, created_at=timestamp, updated_at=timestamp.replace(microsecond=0)),
+    ]
+
+    for assignment in assignments:
+        assert_same_json(assignment_serializer.dump(assignment), AssignmentSchema().dump(assignment))
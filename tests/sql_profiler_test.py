@@ -0,0 +1,81 @@
+import logging
+
+import pytest
+
+from core.libs import sql_profiler as profiler_module
+from core.libs.sql_profiler import normalize, sql_profiler
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    monkeypatch.setattr(sql_profiler, 'enabled', True)
+    monkeypatch.setattr(sql_profiler, 'sample_rate', 1.0)
+    monkeypatch.setattr(sql_profiler, 'slow_threshold', 60.0)
+    sql_profiler.reset()
+    yield sql_profiler
+    sql_profiler.reset()
+
+
+def assignment_templates(report):
+    return [stats for stats in report['templates'] if 'FROM assignments' in stats['template']]
+
+
+def test_normalize():
+    assert normalize("SELECT *  FROM assignments\n WHERE id IN (1, 2, 3) AND content = 'it''s' LIMIT 10") == \
+        'SELECT * FROM assignments WHERE id IN (?+) AND content = ? LIMIT ?'
+    assert normalize('SELECT anon_1.id FROM t WHERE id IN (?, ?)') == normalize('SELECT anon_1.id FROM t WHERE id IN (?)')
+    assert normalize('INSERT INTO t VALUES (?, ?), (?, ?), (?, ?)') == 'INSERT INTO t VALUES (?+), ...'
+
+
+def test_templates_are_counted(client, h_student_1, profiler):
+    client.get('/student/assignments', headers=h_student_1)
+    client.get('/student/assignments', headers=h_student_1)
+
+    templates = assignment_templates(profiler.report())
+    assert templates
+    assert sum(stats['calls'] for stats in templates) >= 2
+    assert sum(stats['rows'] for stats in templates) > 0
+    assert all(stats['max_ms'] <= stats['total_ms'] for stats in templates)
+
+
+def test_unsampled_statements_are_not_counted(client, h_student_1, profiler, monkeypatch):
+    monkeypatch.setattr(profiler, 'sample_rate', 0.0)
+
+    client.get('/student/assignments', headers=h_student_1)
+
+    assert profiler.report()['templates'] == []
+
+
+def test_slow_statements_are_logged_with_plan_and_route(client, h_student_1, profiler, monkeypatch, caplog):
+    monkeypatch.setattr(profiler, 'sample_rate', 0.0)
+    monkeypatch.setattr(profiler, 'slow_threshold', 0.0)
+
+    with caplog.at_level(logging.WARNING, logger='core.sql.slow'):
+        client.get('/student/assignments', headers=h_student_1)
+
+    slow = [entry for entry in profiler.report()['slow'] if 'FROM assignments' in entry['template']]
+    assert slow
+    assert slow[0]['route'] == 'GET /student/assignments (student_assignments_resources.list_assignments)'
+    assert any('assignments' in line for line in slow[0]['plan'])
+    assert any(record.name == 'core.sql.slow' for record in caplog.records)
+
+
+def test_templates_are_bounded(client, h_student_1, profiler, monkeypatch):
+    monkeypatch.setattr(profiler, 'max_templates', 1)
+
+    client.get('/student/assignments', headers=h_student_1)
+    client.get('/teacher/assignments', headers={'X-Principal': '{"teacher_id": 1, "user_id": 3}'})
+
+    fingerprints = [stats['fingerprint'] for stats in profiler.report()['templates']]
+    assert len(fingerprints) == 2
+    assert profiler_module.OTHER in fingerprints
+
+
+def test_sql_profile_endpoint(client, h_student_1, profiler):
+    client.get('/student/assignments', headers=h_student_1)
+
+    response = client.get('/sql-profile')
+
+    assert response.status_code == 200
+    assert response.json['sample_rate'] == 1.0
+    assert assignment_templates(response.json)
@@ -1,3 +1,6 @@
+from tests.SQL.query_plan_test import capture_assignment_selects
+
+
 def test_get_assignments_student_1(client, h_student_1):
     response = client.get(
         '/student/assignments',
@@ -170,3 +173,247 @@ def test_delete_draft_assignment_error(client, h_student_1):
     assert response.status_code == 400
     error_response = response.json
     assert error_response["message"] == "Only draft assignments can be deleted"
+
+
+def test_list_assignments_paginated(client, h_student_1):
+    """
+    Success case: walking the cursor one row at a time returns every assignment once
+    """
+    response = client.get('/student/assignments', headers=h_student_1)
+    assert response.status_code == 200
+    expected_ids = [assignment['id'] for assignment in response.json['data']]
+    assert response.json['next_cursor'] is None
+
+    seen_ids, cursor = [], None
+    while True:
+        query_string = {'limit': 1} if cursor is None else {'limit': 1, 'cursor': cursor}
+        response = client.get('/student/assignments', headers=h_student_1, query_string=query_string)
+        assert response.status_code == 200
+        assert len(response.json['data']) <= 1
+        seen_ids += [assignment['id'] for assignment in response.json['data']]
+        cursor = response.json['next_cursor']
+        if cursor is None:
+            break
+
+    assert seen_ids == expected_ids
+
+
+def test_list_assignments_invalid_page_args(client, h_student_1):
+    """
+    Failure case: malformed limit and cursor values are rejected
+    """
+    response = client.get('/student/assignments', headers=h_student_1, query_string={'limit': 0})
+    assert response.status_code == 400
+
+    response = client.get('/student/assignments', headers=h_student_1, query_string={'cursor': 'not-a-cursor'})
+    assert response.status_code == 400
+    assert response.json['message'] == 'invalid cursor'
+
+
+def test_list_assignments_streamed(client, h_student_1):
+    """
+    Success case: the streamed listing carries the same rows as the paged one
+    """
+    paged = client.get('/student/assignments', headers=h_student_1, query_string={'limit': 1000})
+    streamed = client.get('/student/assignments', headers=h_student_1, query_string={'stream': 'true'})
+
+    assert streamed.status_code == 200
+    assert streamed.is_streamed
+    assert streamed.json['status_code'] == 200
+    assert streamed.json['data'] == paged.json['data']
+    assert len(streamed.json['data']) > 0
+
+
+def test_list_assignments_sparse_fieldset(client, h_student_1):
+    """
+    Success case: only the requested fields are selected and returned
+    """
+    with capture_assignment_selects() as statements:
+        response = client.get('/student/assignments', headers=h_student_1, query_string={'fields': 'id,state,grade'})
+
+    assert response.status_code == 200
+    assert response.json['data']
+    for assignment in response.json['data']:
+        assert set(assignment) == {'id', 'state', 'grade'}
+    assert all('assignments.content' not in statement for statement, _ in statements)
+
+    response = client.get('/student/assignments', headers=h_student_1, query_string={'fields': ''})
+    assert response.status_code == 200
+    for assignment in response.json['data']:
+        assert 'content' not in assignment
+        assert 'updated_at' in assignment
+
+
+def test_list_assignments_unknown_field(client, h_student_1):
+    """
+    Failure case: unknown fields are rejected
+    """
+    response = client.get('/student/assignments', headers=h_student_1, query_string={'fields': 'id,password'})
+
+    assert response.status_code == 400
+    assert response.json['message'] == 'unknown fields: password'
+
+
+def test_submit_assignment_unknown_teacher(client, h_student_1):
+    """
+    Failure case: a submit to a teacher that does not exist changes nothing
+    """
+    response = client.post('/student/assignments', headers=h_student_1, json={'content': 'to an unknown teacher'})
+    assignment_id = response.json['data']['id']
+
+    response = client.post(
+        '/student/assignments/submit',
+        headers=h_student_1,
+        json={'id': assignment_id, 'teacher_id': 9999})
+
+    assert response.status_code == 404
+    assert response.json['message'] == 'Teacher not found'
+
+    response = client.get(f'/student/assignments/{assignment_id}', headers=h_student_1)
+    assert response.json['data']['state'] == 'DRAFT'
+
+
+def test_edit_other_students_draft(client, h_student_1, h_student_2):
+    """
+    Failure case: a student cannot edit, submit or see another student's draft
+    """
+    response = client.post('/student/assignments', headers=h_student_1, json={'content': 'mine'})
+    assignment_id = response.json['data']['id']
+
+    response = client.post('/student/assignments', headers=h_student_2, json={'id': assignment_id, 'content': 'theirs'})
+    assert response.status_code == 404
+    assert response.json['error'] == 'FyleError'
+
+    response = client.post('/student/assignments/submit', headers=h_student_2, json={'id': assignment_id, 'teacher_id': 1})
+    assert response.status_code == 404
+    assert response.json['message'] == 'Assignment not found or access denied.'
+
+    response = client.post('/student/assignments', headers=h_student_1, json={'id': assignment_id, 'content': 'edited'})
+    assert response.status_code == 200
+    assert response.json['data']['content'] == 'edited'
+    assert response.json['data']['state'] == 'DRAFT'
+
+
+def test_bulk_upsert_assignments(client, h_student_1, h_student_2):
+    """
+    Partial success: new drafts and edits are applied, refused items report why
+    """
+    draft_id = client.post('/student/assignments', headers=h_student_1, json={'content': 'draft'}).json['data']['id']
+    others_draft_id = client.post('/student/assignments', headers=h_student_2, json={'content': 'x'}).json['data']['id']
+
+    response = client.post(
+        '/student/assignments/bulk',
+        headers=h_student_1,
+        json=[
+            {'content': 'first'},
+            {'id': draft_id, 'content': 'edited'},
+            {'content': None},
+            {'id': others_draft_id, 'content': 'stolen'},
+            {'content': 'second'},
+            {'id': 'abc', 'content': 'bad id'},
+        ]
+    )
+
+    assert response.status_code == 200
+    results = response.json['data']
+    assert [result['status_code'] for result in results] == [200, 200, 400, 404, 200, 400]
+    assert results[2]['message'] == {'content': ['Content cannot be null.']}
+    assert list(results[5]['message']) == ['id']
+
+    first, second = results[0]['data'], results[4]['data']
+    assert second['id'] == first['id'] + 1
+    for created, content in ((first, 'first'), (second, 'second')):
+        assert created['state'] == 'DRAFT'
+        assert created['student_id'] == 1
+        response = client.get(f"/student/assignments/{created['id']}", headers=h_student_1)
+        assert response.json['data']['content'] == content
+
+    assert results[1]['data']['content'] == 'edited'
+    response = client.get(f'/student/assignments/{others_draft_id}', headers=h_student_2)
+    assert response.json['data']['content'] == 'x'
+
+
+def test_bulk_submit_assignments(client, h_student_1):
+    """
+    Partial success: each submission is checked on its own, including the teacher
+    """
+    draft_ids = [
+        client.post('/student/assignments', headers=h_student_1, json={'content': content}).json['data']['id']
+        for content in ('one', 'two', 'three')
+    ]
+
+    response = client.post(
+        '/student/assignments/submit/bulk',
+        headers=h_student_1,
+        json=[
+            {'id': draft_ids[0], 'teacher_id': 1},
+            {'id': draft_ids[1], 'teacher_id': 99999},
+            {'id': draft_ids[2], 'teacher_id': 2},
+            {'id': draft_ids[0], 'teacher_id': 1},
+            {'id': 99999, 'teacher_id': 1},
+        ]
+    )
+
+    assert response.status_code == 200
+    results = response.json['data']
+    assert [result['status_code'] for result in results] == [200, 404, 200, 400, 404]
+    assert results[1]['message'] == 'Teacher not found'
+    assert results[3]['message'] == 'Assignment appears more than once in the batch'
+    assert results[2]['data']['state'] == 'SUBMITTED'
+    assert results[2]['data']['teacher_id'] == 2
+
+    response = client.get(f'/student/assignments/{draft_ids[1]}', headers=h_student_1)
+    assert response.json['data']['state'] == 'DRAFT'
+
+
+def test_bulk_submit_assignments_atomic(client, h_student_1):
+    """
+    Failure case: in atomic mode one refusal holds back the whole batch
+    """
+    draft_id = client.post('/student/assignments', headers=h_student_1, json={'content': 'one'}).json['data']['id']
+
+    response = client.post(
+        '/student/assignments/submit/bulk?atomic=true',
+        headers=h_student_1,
+        json=[{'id': draft_id, 'teacher_id': 1}, {'id': draft_id, 'teacher_id': 99999}]
+    )
+
+    assert response.status_code == 400
+    assert [result['status_code'] for result in response.json['data']] == [424, 404]
+
+    response = client.get(f'/student/assignments/{draft_id}', headers=h_student_1)
+    assert response.json['data']['state'] == 'DRAFT'
+
+
+def test_list_assignments_not_modified(client, h_student_1):
+    etags = {path: client.get(path, headers=h_student_1).headers['ETag']
+             for path in ('/student/assignments', '/student/assignments/submitted')}
+    for path, etag in etags.items():
+        assert client.get(path, headers={**h_student_1, 'If-None-Match': etag}).status_code == 304
+
+    draft_id = client.post('/student/assignments', headers=h_student_1, json={'content': 'new'}).json['data']['id']
+    for path, etag in etags.items():
+        assert client.get(path, headers={**h_student_1, 'If-None-Match': etag}).status_code == 200
+
+    etag = client.get('/student/assignments/submitted', headers=h_student_1).headers['ETag']
+    client.post('/student/assignments/submit', headers=h_student_1, json={'id': draft_id, 'teacher_id': 1})
+    response = client.get('/student/assignments/submitted', headers={**h_student_1, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert draft_id in [assignment['id'] for assignment in response.json['data']]
+
+
+def test_view_assignment_not_modified(client, h_student_1, h_student_2):
+    assignment_id = client.post('/student/assignments', headers=h_student_1, json={'content': 'v1'}).json['data']['id']
+    etag = client.get(f'/student/assignments/{assignment_id}', headers=h_student_1).headers['ETag']
+
+    response = client.get(f'/student/assignments/{assignment_id}', headers={**h_student_1, 'If-None-Match': etag})
+    assert response.status_code == 304
+
+    # someone else's assignment is never confirmed, whatever the validator
+    response = client.get(f'/student/assignments/{assignment_id}', headers={**h_student_2, 'If-None-Match': etag})
+    assert response.status_code == 404
+
+    client.post('/student/assignments', headers=h_student_1, json={'id': assignment_id, 'content': 'v2'})
+    response = client.get(f'/student/assignments/{assignment_id}', headers={**h_student_1, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json['data']['content'] == 'v2'
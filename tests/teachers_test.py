@@ -234,3 +234,104 @@ def test_get_assignment_detail_unauthorized(client, h_teacher_2):
     response = client.get('/teacher/assignments/1', headers=h_teacher_2)  # Assume this is teacher 2
     assert response.status_code == 403
     assert response.json['error'] == 'FyleError'
+
+
+def create_submitted_assignment(client, h_student, teacher_id, content='bulk'):
+    response = client.post('/student/assignments', headers=h_student, json={'content': content})
+    assignment_id = response.json['data']['id']
+    response = client.post('/student/assignments/submit', headers=h_student,
+                           json={'id': assignment_id, 'teacher_id': teacher_id})
+    assert response.status_code == 200
+    return assignment_id
+
+
+def test_bulk_grade_assignments_partial_failure(client, h_student_1, h_teacher_1):
+    """
+    Partial success: every item gets its own result and the valid ones are applied
+    """
+    submitted_id = create_submitted_assignment(client, h_student_1, teacher_id=1)
+    other_teachers_id = create_submitted_assignment(client, h_student_1, teacher_id=2)
+    draft_id = client.post('/student/assignments', headers=h_student_1, json={'content': 'draft'}).json['data']['id']
+
+    response = client.post(
+        '/teacher/assignments/grade/bulk',
+        headers=h_teacher_1,
+        json=[
+            {'id': submitted_id, 'grade': 'B'},
+            {'id': other_teachers_id, 'grade': 'A'},
+            {'id': draft_id, 'grade': 'A'},
+            {'id': 99999, 'grade': 'A'},
+        ]
+    )
+
+    assert response.status_code == 200
+    results = response.json['data']
+    assert [result['id'] for result in results] == [submitted_id, other_teachers_id, draft_id, 99999]
+    assert [result['status_code'] for result in results] == [200, 400, 400, 404]
+    assert results[0]['data']['state'] == 'GRADED'
+    assert results[0]['data']['grade'] == 'B'
+    assert results[2]['message'] == 'Draft assignment cannot be graded'
+    assert all(result['data'] is None for result in results[1:])
+
+    response = client.get(f'/teacher/assignments/{submitted_id}', headers=h_teacher_1)
+    assert response.json['data']['grade'] == 'B'
+
+
+def test_bulk_grade_assignments_invalid_item(client, h_student_1, h_teacher_1):
+    """
+    Partial success: a malformed item fails on its own, the rest of the batch is graded
+    """
+    submitted_id = create_submitted_assignment(client, h_student_1, teacher_id=1)
+
+    response = client.post('/teacher/assignments/grade/bulk', headers=h_teacher_1,
+                           json=[{'id': submitted_id, 'grade': 'A'}, {'id': 2, 'grade': 'Z'}])
+    assert response.status_code == 200
+    results = response.json['data']
+    assert [result['status_code'] for result in results] == [200, 400]
+    assert results[0]['data']['grade'] == 'A'
+    assert results[1]['id'] is None
+    assert list(results[1]['message']) == ['grade']
+
+
+def test_bulk_grade_assignments_atomic(client, h_student_1, h_teacher_1):
+    """
+    Failure case: in atomic mode a malformed item holds back the whole batch
+    """
+    submitted_id = create_submitted_assignment(client, h_student_1, teacher_id=1)
+
+    response = client.post('/teacher/assignments/grade/bulk?atomic=true', headers=h_teacher_1,
+                           json=[{'id': submitted_id, 'grade': 'A'}, {'id': 2, 'grade': 'Z'}])
+    assert response.status_code == 400
+    assert [result['status_code'] for result in response.json['data']] == [424, 400]
+
+    response = client.get(f'/teacher/assignments/{submitted_id}', headers=h_teacher_1)
+    assert response.json['data']['state'] == 'SUBMITTED'
+
+
+def test_bulk_grade_assignments_invalid_payload(client, h_teacher_1):
+    """
+    Failure case: the payload must be a list
+    """
+
+    response = client.post('/teacher/assignments/grade/bulk', headers=h_teacher_1, json={'id': 1, 'grade': 'A'})
+    assert response.status_code == 400
+    assert response.json['error'] == 'FyleError'
+
+
+def test_list_assignments_not_modified(client, h_student_1, h_teacher_1):
+    response = client.get('/teacher/assignments', headers=h_teacher_1)
+    etag = response.headers['ETag']
+
+    response = client.get('/teacher/assignments', headers={**h_teacher_1, 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    # another page is another representation
+    response = client.get('/teacher/assignments?limit=1', headers={**h_teacher_1, 'If-None-Match': etag})
+    assert response.status_code == 200
+
+    create_submitted_assignment(client, h_student_1, teacher_id=1)
+    response = client.get('/teacher/assignments', headers={**h_teacher_1, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag